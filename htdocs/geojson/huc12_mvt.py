@@ -0,0 +1,4 @@
+from depbackend.geojson.huc12_mvt import application
+
+# appease linters
+_ = application
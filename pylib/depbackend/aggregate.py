@@ -0,0 +1,275 @@
+"""Period sums of water_results_by_huc12 backed by monthly and yearly rollups.
+
+Summing the daily ``water_results_by_huc12`` rows over a multi-year period
+scans millions of rows.  The ``water_results_by_huc12_monthly`` and
+``water_results_by_huc12_yearly`` materialized views hold per-HUC12 partial
+sums, so that any date range can be answered as whole years plus whole
+months plus the leftover edge days.
+
+The views are created and refreshed by running this module, typically
+nightly after the model run::
+
+    python -m depbackend.aggregate
+
+which records the last date the views include within the
+``water_results_cube_valid`` property.  Days after that date, or all days
+when the property is not set, are summed from the daily table.
+"""
+
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import pandas as pd
+from dailyerosion.reference import KG_M2_TO_TON_ACRE
+from pyiem.database import get_sqlalchemy_conn, sql_helper
+from pyiem.util import logger
+from sqlalchemy.engine import Connection
+
+LOG = logger()
+COLUMNS = [
+    "qc_precip_mm",
+    "avg_runoff_mm",
+    "avg_loss_kgm2",
+    "avg_delivery_kgm2",
+]
+PROPERTY = "water_results_cube_valid"
+CENT = Decimal("0.01")
+ROLLUPS = {
+    "water_results_by_huc12_monthly": "month",
+    "water_results_by_huc12_yearly": "year",
+}
+
+
+def _next_month(dt: date) -> date:
+    """Return the first day of the following month."""
+    return (dt.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _append_range(ranges: list, sdate: date, edate: date, step):
+    """Add the range, merging it with the previous one when contiguous."""
+    if ranges and step(ranges[-1][1]) == sdate:
+        ranges[-1] = (ranges[-1][0], edate)
+    else:
+        ranges.append((sdate, edate))
+
+
+def decompose(
+    sdate: date, edate: date, through: date | None
+) -> tuple[list, list, list]:
+    """Split an inclusive date range into days, months and years.
+
+    Only months and years ending on or before ``through`` are eligible to be
+    answered by the rollups.
+
+    Returns:
+        days, months, years lists of inclusive ``(start, end)`` tuples, with
+        months and years being given by the first date of the period.
+    """
+    days, months, years = [], [], []
+
+    def _nextday(dt):
+        return dt + timedelta(days=1)
+
+    def _nextyear(dt):
+        return dt.replace(year=dt.year + 1)
+
+    limit = edate if through is None else min(edate, through)
+    cur = sdate
+    while through is not None and cur <= limit:
+        if cur.day == 1 and cur.month == 1 and date(cur.year, 12, 31) <= limit:
+            _append_range(years, cur, cur, _nextyear)
+            cur = _nextyear(cur)
+            continue
+        nextmonth = _next_month(cur)
+        if cur.day == 1 and nextmonth - timedelta(days=1) <= limit:
+            _append_range(months, cur, cur, _next_month)
+            cur = nextmonth
+            continue
+        end = min(nextmonth, limit + timedelta(days=1)) - timedelta(days=1)
+        _append_range(days, cur, end, _nextday)
+        cur = _nextday(end)
+    if cur <= edate:
+        _append_range(days, cur, edate, _nextday)
+    return days, months, years
+
+
+def get_cube_through(conn: Connection) -> date | None:
+    """Return the last date included within the rollups, if any."""
+    res = conn.execute(
+        sql_helper("SELECT value from properties WHERE key = :key"),
+        {"key": PROPERTY},
+    ).fetchone()
+    if res is None or res[0] is None:
+        return None
+    return date.fromisoformat(res[0])
+
+
+def get_period_sums(
+    conn: Connection,
+    scenario: int,
+    sdate: date,
+    edate: date,
+    huc12_ids: list[int] | None = None,
+) -> pd.DataFrame:
+    """Sum water_results_by_huc12 between the inclusive dates by huc12_id.
+
+    Args:
+        conn: database connection
+        scenario: the scenario_id
+        sdate: start date
+        edate: inclusive end date
+        huc12_ids: optionally limit to these huc12_ids
+
+    Returns:
+        DataFrame indexed by huc12_id with ``COLUMNS``, only including
+        HUC12s with results within the period.  Like SQL ``sum``, null
+        values are skipped.
+    """
+    if edate < sdate:
+        return pd.DataFrame(
+            columns=COLUMNS, index=pd.Index([], name="huc12_id"), dtype=float
+        )
+    days, months, years = decompose(sdate, edate, get_cube_through(conn))
+    params = {"scenario": scenario}
+    huclimiter = ""
+    if huc12_ids is not None:
+        huclimiter = " and huc12_id = ANY(:ids) "
+        params["ids"] = huc12_ids
+    cols = ", ".join(COLUMNS)
+    parts = []
+    for table, ranges in zip(
+        ["water_results_by_huc12_yearly", "water_results_by_huc12_monthly"],
+        [years, months],
+        strict=True,
+    ):
+        for sts, ets in ranges:
+            key = f"p{len(params)}"
+            params[f"{key}s"] = sts
+            params[f"{key}e"] = ets
+            parts.append(
+                f"SELECT huc12_id, {cols} from {table} "
+                f"WHERE scenario_id = :scenario and valid >= :{key}s and "
+                f"valid <= :{key}e {huclimiter}"
+            )
+    if days:
+        limits = []
+        for sts, ets in days:
+            key = f"p{len(params)}"
+            params[f"{key}s"] = sts
+            params[f"{key}e"] = ets
+            limits.append(f"(valid >= :{key}s and valid <= :{key}e)")
+        parts.append(
+            f"SELECT huc12_id, {cols} from water_results_by_huc12 "
+            f"WHERE scenario_id = :scenario and ({' or '.join(limits)}) "
+            f"{huclimiter}"
+        )
+    sums = ", ".join(f"sum({col}) as {col}" for col in COLUMNS)
+    return pd.read_sql(
+        sql_helper(
+            "WITH parts as ({parts}) "
+            "SELECT huc12_id, {sums} from parts GROUP by huc12_id",
+            parts=" UNION ALL ".join(parts),
+            sums=sums,
+        ),
+        conn,
+        params=params,
+        index_col="huc12_id",
+    )
+
+
+def english_units(obs: pd.DataFrame) -> pd.DataFrame:
+    """Convert period sums into the tons/acre and inches used by the app."""
+    return pd.DataFrame(
+        {
+            "avg_loss": obs["avg_loss_kgm2"] * KG_M2_TO_TON_ACRE,
+            "qc_precip": obs["qc_precip_mm"] / 25.4,
+            "avg_delivery": obs["avg_delivery_kgm2"] * KG_M2_TO_TON_ACRE,
+            "avg_runoff": obs["avg_runoff_mm"] / 25.4,
+        }
+    )
+
+
+def to_numeric(value: float) -> Decimal:
+    """Round like PostgreSQL ``round(value::numeric, 2)``.
+
+    The cast keeps 15 significant digits and numeric rounds half away from
+    zero, so 0.125 becomes 0.13 rather than the 0.12 of float rounding.
+    """
+    return Decimal(f"{value:.15g}").quantize(CENT, ROUND_HALF_UP)
+
+
+def english_numeric(obs: pd.DataFrame, index) -> pd.DataFrame:
+    """Convert period sums like ``english_units``, rounded like SQL did.
+
+    The services used to return ``coalesce(round(x::numeric, 2), 0)``, so
+    the values are Decimals, for ``simplejson`` to write as ``0.10``, and
+    HUC12s of the index without results are ``Decimal(0)``.
+    """
+    df = english_units(obs).fillna(0)
+    df = pd.DataFrame(
+        {col: [to_numeric(val) for val in df[col].tolist()] for col in df},
+        index=df.index,
+        dtype=object,
+    )
+    return df.reindex(index, fill_value=Decimal(0))
+
+
+def refresh_cube(conn: Connection):
+    """Create, if necessary, and refresh the rollups."""
+    through = conn.execute(
+        sql_helper("SELECT max(valid) from water_results_by_huc12")
+    ).fetchone()[0]
+    sums = ", ".join(f"sum({col}) as {col}" for col in COLUMNS)
+    for table, period in ROLLUPS.items():
+        exists = conn.execute(
+            sql_helper("SELECT to_regclass(:table)"), {"table": table}
+        ).fetchone()[0]
+        if exists is None:
+            LOG.info("Creating %s", table)
+            conn.execute(
+                sql_helper(
+                    "CREATE MATERIALIZED VIEW {table} as "
+                    "SELECT scenario_id, huc12_id, "
+                    "date_trunc('{period}', valid)::date as valid, {sums} "
+                    "from water_results_by_huc12 "
+                    "GROUP by scenario_id, huc12_id, 3",
+                    table=table,
+                    period=period,
+                    sums=sums,
+                )
+            )
+            conn.execute(
+                sql_helper(
+                    "CREATE UNIQUE INDEX {index} on {table}"
+                    "(scenario_id, valid, huc12_id)",
+                    table=table,
+                    index=f"{table}_idx",
+                )
+            )
+        else:
+            LOG.info("Refreshing %s", table)
+            conn.execute(
+                sql_helper(
+                    "REFRESH MATERIALIZED VIEW CONCURRENTLY {table}",
+                    table=table,
+                )
+            )
+    conn.execute(
+        sql_helper("DELETE from properties WHERE key = :key"),
+        {"key": PROPERTY},
+    )
+    conn.execute(
+        sql_helper("INSERT into properties(key, value) VALUES (:key, :value)"),
+        {"key": PROPERTY, "value": f"{through:%Y-%m-%d}"},
+    )
+    conn.commit()
+
+
+def main():
+    """Go Main Go."""
+    with get_sqlalchemy_conn("dep", rw=True) as conn:
+        refresh_cube(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,8 @@ from pyiem.database import sql_helper, with_sqlalchemy_conn
 from pyiem.webutil import CGIModel, iemapp
 from sqlalchemy.engine import Connection
 
+from depbackend.aggregate import get_period_sums
+
 
 class Schema(CGIModel):
     """See how we are called."""
@@ -94,28 +96,23 @@ def generate_data(environ: dict, conn: Connection | None = None) -> dict:
         "lunit": "tonne/ha",
         "top10": [],
     }
-    dtlimit = "valid = :date"
-    if environ["date2"] is not None:
-        dtlimit = "valid >= :date and valid <= :date2"
-    resultsdf = pd.read_sql(
-        sql_helper(
-            """
-    select sum(qc_precip_mm) as qc_precip,
-    sum(avg_runoff_mm) as avg_runoff, sum(avg_loss_kgm2) as avg_loss,
-    sum(avg_delivery_kgm2) as avg_delivery from water_results_by_huc12 WHERE
-    {dtlimit} and huc12_id = get_huc12_id(:huc12, :scenario)
-    and scenario_id = :scenario
-        """,
-            dtlimit=dtlimit,
-        ),
+    huc12_id = conn.execute(
+        sql_helper("SELECT get_huc12_id(:huc12, :scenario)"),
+        {"huc12": environ["huc12"], "scenario": environ["scenario"]},
+    ).fetchone()[0]
+    resultsdf = get_period_sums(
         conn,
-        params={
-            "date": environ["date"],
-            "date2": environ["date2"],
-            "huc12": environ["huc12"],
-            "scenario": environ["scenario"],
-        },
-        index_col=None,
+        environ["scenario"],
+        environ["date"],
+        environ["date"] if environ["date2"] is None else environ["date2"],
+        [huc12_id],
+    ).rename(
+        columns={
+            "qc_precip_mm": "qc_precip",
+            "avg_runoff_mm": "avg_runoff",
+            "avg_loss_kgm2": "avg_loss",
+            "avg_delivery_kgm2": "avg_delivery",
+        }
     )
     if not resultsdf.empty:
         row = resultsdf.iloc[0]
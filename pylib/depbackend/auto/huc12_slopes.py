@@ -1,17 +1,15 @@
 """Mapping Interface"""
 
-import glob
-import os
 from io import BytesIO
-from typing import Annotated
+from typing import Annotated, Literal
 
 import numpy as np
 import seaborn as sns
-from dailyerosion.io.wepp import read_slp
 from pydantic import Field
-from pyiem.exceptions import NoDataFound
 from pyiem.webutil import CGIModel, iemapp
 
+from depbackend.slopes import get_slopes
+
 
 class Schema(CGIModel):
     """See how we are called."""
@@ -20,39 +18,109 @@ class Schema(CGIModel):
         str,
         Field(
             description="HUC12 to summarize",
-            max_length=12,
+            pattern=r"^\d{12}$",
         ),
     ] = "070600040601"
     scenario: Annotated[
         int,
         Field(
             description="Scenario ID to generate metadata for",
+            ge=0,
+            le=9999,
         ),
     ] = 0
+    kde: Annotated[
+        Literal["binned", "seaborn"],
+        Field(
+            description=(
+                "Kernel density estimator to use, the seaborn one is much "
+                "slower for HUC12s with many hill slopes."
+            ),
+        ),
+    ] = "binned"
+
+
+def binned_kde(x: np.ndarray, y: np.ndarray, gridsize: int = 200, cut=3):
+    """Estimate a 2-D Gaussian kernel density on a regular grid.
+
+    The points are binned onto the grid and convolved by FFT with the
+    Gaussian kernel having the same Scott's rule bandwidth and full
+    covariance as ``scipy.stats.gaussian_kde``, which seaborn uses, so the
+    cost scales with the grid size rather than the number of points.
+
+    Returns:
+        xx, yy, density arrays of shape ``(gridsize, gridsize)``, or ``None``
+        when the points are too few or have no variance.
+    """
+    if len(x) < 3:
+        return None
+    cov = np.cov(x, y) * len(x) ** (-1.0 / 3.0)  # Scott's factor squared
+    if np.isclose(min(cov[0, 0], cov[1, 1]), 0) or np.isclose(
+        np.linalg.det(cov), 0
+    ):
+        return None
+    bw = np.sqrt(np.diag(cov))
+    xs = np.linspace(x.min() - cut * bw[0], x.max() + cut * bw[0], gridsize)
+    ys = np.linspace(y.min() - cut * bw[1], y.max() + cut * bw[1], gridsize)
+    dx, dy = xs[1] - xs[0], ys[1] - ys[0]
+    counts, _, _ = np.histogram2d(
+        y,
+        x,
+        bins=[
+            np.append(ys - dy / 2, ys[-1] + dy / 2),
+            np.append(xs - dx / 2, xs[-1] + dx / 2),
+        ],
+    )
+    # Kernel evaluated at the grid offsets, truncated at four sigma
+    kx = min(int(np.ceil(4 * bw[0] / dx)), gridsize)
+    ky = min(int(np.ceil(4 * bw[1] / dy)), gridsize)
+    ox, oy = np.meshgrid(
+        np.arange(-kx, kx + 1) * dx, np.arange(-ky, ky + 1) * dy
+    )
+    offsets = np.stack([ox.ravel(), oy.ravel()])
+    inv = np.linalg.inv(cov)
+    kernel = np.exp(-0.5 * np.sum(offsets * (inv @ offsets), axis=0)).reshape(
+        ox.shape
+    ) / (2 * np.pi * np.sqrt(np.linalg.det(cov)))
+    # Linear convolution by zero padded FFT, then trimmed back to the grid
+    shape = (gridsize + 2 * ky, gridsize + 2 * kx)
+    conv = np.fft.irfft2(
+        np.fft.rfft2(counts, shape) * np.fft.rfft2(kernel, shape), shape
+    )[ky : ky + gridsize, kx : kx + gridsize]
+    density = np.clip(conv, 0, None) / len(x)
+    xx, yy = np.meshgrid(xs, ys)
+    return xx, yy, density
+
+
+def density_levels(density: np.ndarray, levels: int = 6, thresh=0.05):
+    """Convert evenly spaced iso-proportions into iso-densities.
+
+    This follows seaborn's ``kdeplot``, so each contour encloses that
+    proportion of the probability mass.
+    """
+    isoprop = np.linspace(thresh, 1, levels)
+    values = np.sort(density.ravel())[::-1]
+    cumulative = np.cumsum(values) / values.sum()
+    return np.unique(
+        np.take(values, np.searchsorted(cumulative, 1 - isoprop), mode="clip")
+    )
 
 
-def make_plot(huc12: str, scenario: int):
+def make_plot(huc12: str, scenario: int, kde: str = "binned"):
     """Make the map"""
-    mydir = f"/i/{scenario}/slp/{huc12[:8]}/{huc12[8:]}"
-    if not os.path.isdir(mydir):
-        raise NoDataFound("No data found for this scenario")
-    os.chdir(mydir)
-    res = []
-    for fn in glob.glob("*.slp"):
-        try:
-            slp = read_slp(fn)
-        except Exception:
-            continue
-        bulk = (slp[-1]["y"][-1]) / slp[-1]["x"][-1]
-        length = slp[-1]["x"][-1]
-        if bulk < -1:
-            continue
-        res.append([(0 - bulk) * 100.0, length])
-
-    data = np.array(res)
-    g = sns.jointplot(
-        x=data[:, 1], y=data[:, 0], s=40, zorder=1, color="tan"
-    ).plot_joint(sns.kdeplot, n_levels=6)
+    df = get_slopes(huc12, scenario)
+    df = df[df["bulk_slope"] >= -1]
+    x = df["length"].to_numpy()
+    y = df["bulk_slope"].to_numpy() * -100.0
+    g = sns.jointplot(x=x, y=y, s=40, zorder=1, color="tan")
+    if kde == "seaborn":
+        g.plot_joint(sns.kdeplot, n_levels=6)
+    else:
+        res = binned_kde(x, y)
+        if res is not None:
+            g.ax_joint.contour(
+                *res, levels=density_levels(res[2]), colors=["C0"]
+            )
     g.ax_joint.set_xlabel("Slope Length [m]")
     g.ax_joint.set_ylabel("Bulk Slope [%]")
     g.figure.subplots_adjust(top=0.8, bottom=0.2, left=0.15)
@@ -76,4 +144,6 @@ def make_plot(huc12: str, scenario: int):
 def application(environ, start_response):
     """Do something fun"""
     start_response("200 OK", [("Content-type", "image/png")])
-    return [make_plot(environ["huc12"], environ["scenario"]).read()]
+    return [
+        make_plot(environ["huc12"], environ["scenario"], environ["kde"]).read()
+    ]
@@ -6,9 +6,12 @@ from io import StringIO
 import pandas as pd
 from dailyerosion.reference import KG_M2_TO_TON_ACRE
 from pydantic import Field
-from pyiem.database import get_sqlalchemy_conn, sql_helper
+from pyiem.database import get_sqlalchemy_conn
 from pyiem.webutil import CGIModel, ListOrCSVType, iemapp
 
+from depbackend.aggregate import get_period_sums
+from depbackend.geometry import get_huc12_geometries
+
 
 class Schema(CGIModel):
     """See how we are called."""
@@ -30,29 +33,18 @@ class Schema(CGIModel):
 def gen(huc12s, sdate, edate):
     """Make the map"""
     with get_sqlalchemy_conn("dep") as conn:
-        # Check that we have data for this date!
-        df = pd.read_sql(
-            sql_helper(
-                """
-            SELECT huc12_code,
-            sum(avg_loss_kgm2) * :factor as avg_loss_ton_acre,
-            sum(avg_delivery_kgm2) * :factor as avg_delivery_ton_acre,
-            sum(qc_precip_mm) / 25.4 as rain_inch
-            from water_results_by_huc12 w
-            JOIN huc12 h on (w.huc12_id = h.huc12_id)
-            WHERE h.huc12_code = Any(:h) and w.scenario_id = 0
-            and w.valid >= :sdate and w.valid <= :edate
-            GROUP by h.huc12_code ORDER by h.huc12_code
-        """
-            ),
-            conn,
-            params={
-                "factor": KG_M2_TO_TON_ACRE,
-                "h": huc12s,
-                "sdate": sdate,
-                "edate": edate,
-            },
-        )
+        hucs = get_huc12_geometries(conn, 0)
+        hucs = hucs[hucs["huc12_code"].isin(huc12s)]
+        obs = get_period_sums(conn, 0, sdate, edate, hucs.index.tolist())
+    df = pd.DataFrame(
+        {
+            "huc12_code": hucs["huc12_code"].reindex(obs.index),
+            "avg_loss_ton_acre": obs["avg_loss_kgm2"] * KG_M2_TO_TON_ACRE,
+            "avg_delivery_ton_acre": obs["avg_delivery_kgm2"]
+            * KG_M2_TO_TON_ACRE,
+            "rain_inch": obs["qc_precip_mm"] / 25.4,
+        }
+    ).sort_values("huc12_code")
     sio = StringIO()
     df.to_csv(sio, index=False, float_format="%.2f")
     return sio.getvalue()
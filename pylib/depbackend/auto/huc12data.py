@@ -3,14 +3,20 @@
 from datetime import date
 from typing import Annotated
 
-import pandas as pd
 import simplejson as json
-from dailyerosion.reference import KG_M2_TO_TON_ACRE, RAMPS
+from dailyerosion.reference import RAMPS
 from pydantic import Field
-from pyiem.database import get_sqlalchemy_conn, sql_helper
+from pyiem.database import get_sqlalchemy_conn
 from pyiem.util import utc
 from pyiem.webutil import CGIModel, iemapp
 
+from depbackend.aggregate import english_numeric, get_period_sums
+from depbackend.cache import MemcacheCache, RevalidatingCache
+from depbackend.compression import get_compressed, respond
+from depbackend.geometry import get_huc12_geometries
+
+CACHE = RevalidatingCache(MemcacheCache(), ttl=3600, stale=3600)
+
 
 class Schema(CGIModel):
     """See how we are called."""
@@ -32,30 +38,10 @@ class Schema(CGIModel):
 def do(ts, ts2):
     """Do work"""
     with get_sqlalchemy_conn("dep") as conn:
-        df = pd.read_sql(
-            sql_helper("""
-        with data as (
-            SELECT w.huc12_id,
-            sum(coalesce(avg_loss_kgm2, 0)) * :factor as avg_loss,
-            sum(coalesce(avg_delivery_kgm2, 0)) * :factor as avg_delivery,
-            sum(coalesce(qc_precip_mm, 0)) / 25.4 as qc_precip,
-            sum(coalesce(avg_runoff_mm, 0)) / 25.4 as avg_runoff
-            from water_results_by_huc12 w
-            WHERE valid >= :sdate and valid <= :edate
-            and w.scenario_id = 0 GROUP by w.huc12_id)
-
-        SELECT h.huc12_code as huc_12,
-        coalesce(round(d.avg_loss::numeric, 2), 0) as avg_loss,
-        coalesce(round(d.qc_precip::numeric, 2), 0) as qc_precip,
-        coalesce(round(d.avg_delivery::numeric, 2), 0) as avg_delivery,
-        coalesce(round(d.avg_runoff::numeric, 2), 0) as avg_runoff
-        from huc12 h LEFT JOIN data d ON (h.huc12_id = d.huc12_id)
-        WHERE h.scenario_id = 0
-        """),
-            conn,
-            params={"factor": KG_M2_TO_TON_ACRE, "sdate": ts, "edate": ts2},
-            index_col=None,
-        )
+        hucs = get_huc12_geometries(conn, 0)
+        obs = get_period_sums(conn, 0, ts, ts2)
+    df = english_numeric(obs, hucs.index)
+    df.insert(0, "huc_12", hucs["huc12_code"])
     res = {
         "data": df.to_dict(orient="records"),
         "date": ts.strftime("%Y-%m-%d"),
@@ -88,14 +74,18 @@ def do(ts, ts2):
 
 def get_mckey(environ):
     """Figure out the memcache key"""
-    return (
-        f"/json/huc12data/{environ['sdate']:%Y%m%d}_{environ['edate']:%Y%m%d}"
-    )
+    sdate = environ["sdate"]
+    edate = environ["edate"]
+    return f"/json/huc12data.gz/{sdate:%Y%m%d}_{edate:%Y%m%d}"
 
 
-@iemapp(help=__doc__, schema=Schema, memcachekey=get_mckey)
-def application(environ, start_response) -> bytes:
+@iemapp(help=__doc__, schema=Schema)
+def application(environ, start_response):
     """Do Fun things"""
-    payload = do(environ["sdate"], environ["edate"])
-    start_response("200 OK", [("Content-Type", "application/json")])
-    return payload.encode("ascii")
+    payload = get_compressed(
+        CACHE,
+        get_mckey(environ),
+        lambda: do(environ["sdate"], environ["edate"]),
+    )
+    headers = [("Content-Type", "application/json")]
+    return respond(environ, start_response, payload, headers)
@@ -1,10 +1,19 @@
-"""Generate a PDF Report for a given HUC12."""
+"""Generate a PDF Report for a given HUC12.
+
+The figures and database summaries within the report are independent of each
+other, so they are computed concurrently within a pool of worker processes,
+as matplotlib is not thread safe.  The time spent on each stage is logged and
+returned within the ``Server-Timing`` HTTP header.
+"""
 
 import calendar
+import time
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from io import BytesIO
-from typing import Annotated
+from typing import Annotated, Any
 
+import numpy as np
 import pandas as pd
 from dailyerosion.reference import KG_M2_TO_TON_ACRE
 from metpy.units import units
@@ -14,6 +23,7 @@ from pyiem.database import (
     sql_helper,
     with_sqlalchemy_conn,
 )
+from pyiem.util import logger
 from pyiem.webutil import CGIModel, iemapp
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
@@ -28,10 +38,15 @@ from reportlab.platypus import (
     TableStyle,
 )
 from sqlalchemy.engine import Connection
+
 from depbackend.auto.huc12_slopes import make_plot
 from depbackend.auto.mapper import Schema as MapperSchema
 from depbackend.auto.mapper import make_overviewmap
+from depbackend.workers import discard_pool, get_pool
 
+LOG = logger()
+# The first year encoded by the field landuse and management strings
+LANDUSE_BASEYEAR = 2007
 PAGE_WIDTH = letter[0]
 PAGE_HEIGHT = letter[1]
 GENTIME = datetime.now().strftime("%B %-d %Y")
@@ -73,16 +88,97 @@ class Schema(CGIModel):
     ] = "070801050306"
 
 
+def _timed(func, *args) -> tuple[float, Any]:
+    """Run the function, returning the seconds it took and its result."""
+    sts = time.perf_counter()
+    res = func(*args)
+    return time.perf_counter() - sts, res
+
+
+def run_stages(stages: dict[str, tuple]) -> tuple[dict, dict]:
+    """Concurrently run ``{name: (func, *args)}`` within the pool.
+
+    Returns:
+        results and elapsed seconds, both keyed by the stage name.
+    """
+    pool = get_pool()
+    try:
+        futures = {
+            name: pool.submit(_timed, *stage) for name, stage in stages.items()
+        }
+        outcomes = {name: future.result() for name, future in futures.items()}
+    except BrokenProcessPool:
+        # A worker died, so start with a fresh pool next time
+        discard_pool(pool)
+        raise
+    timings = {name: outcome[0] for name, outcome in outcomes.items()}
+    results = {name: outcome[1] for name, outcome in outcomes.items()}
+    return results, timings
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Format the timings as a Server-Timing header value."""
+    return ", ".join(
+        f"{name};dur={elapsed * 1000.0:.1f}"
+        for name, elapsed in timings.items()
+    )
+
+
+def render_overviewmap(huc12: str, zoom: float) -> bytes:
+    """Render an overview map PNG."""
+    return make_overviewmap(
+        MapperSchema(overview=1, huc=huc12, zoom=zoom, extent=[]),
+    ).getvalue()
+
+
+def render_slopes(huc12: str) -> bytes:
+    """Render the slope length and steepness KDE PNG."""
+    return make_plot(huc12, 0).getvalue()
+
+
 def m2f(val):
     """Convert meters to feet."""
     return ((val * units("m")).to(units("feet"))).m
 
 
+def compute_crop_mix(landuse: pd.DataFrame) -> pd.DataFrame:
+    """Compute the yearly fraction of corn, soybean, pasture and other.
+
+    Args:
+        landuse: DataFrame of ``landuse`` strings, having one crop code
+          character per year starting in ``LANDUSE_BASEYEAR``, and the
+          ``count`` of OFEs having that string.
+
+    Returns:
+        DataFrame indexed by year with ``C``, ``B``, ``P`` and ``other``
+        fractions of the OFEs, covering each year the strings encode.
+    """
+    landuse = landuse[landuse["landuse"].notna()]
+    if landuse.empty:
+        return pd.DataFrame(columns=["C", "B", "P", "other"], dtype=float)
+    width = int(landuse["landuse"].str.len().max())
+    # (landuse strings, years) array of crop codes, padding short strings
+    codes = np.array(
+        [list(val.ljust(width)) for val in landuse["landuse"]], dtype="U1"
+    )
+    counts = landuse["count"].to_numpy(dtype=float)
+    total = counts.sum()
+    mix = pd.DataFrame(
+        {
+            code: (counts[:, np.newaxis] * (codes == code)).sum(axis=0) / total
+            for code in ["C", "B", "P"]
+        },
+        index=pd.RangeIndex(
+            LANDUSE_BASEYEAR, LANDUSE_BASEYEAR + width, name="year"
+        ),
+    )
+    mix["other"] = 1.0 - mix.sum(axis=1)
+    return mix
+
+
 @with_sqlalchemy_conn("dep")
-def generate_run_metadata(huc12: str, conn: Connection | None = None):
-    """Information about DEP modelling of this huc12."""
-    styles = getSampleStyleSheet()
-    res = []
+def get_run_metadata(huc12: str, conn: Connection | None = None):
+    """Query the hill slope and cropping summaries of this huc12."""
     # Get the number of runs
     rs = conn.execute(
         sql_helper("""
@@ -92,7 +188,36 @@ def generate_run_metadata(huc12: str, conn: Connection | None = None):
     """),
         {"huc12": huc12},
     )
-    row = rs.mappings().fetchone()
+    row = dict(rs.mappings().fetchone())
+
+    # Something about managements and crops
+    landuse = pd.read_sql(
+        sql_helper("""
+    select f.landuse, count(*) from
+    flowpath_ofe o JOIN flowpath p on (o.flowpath_id = p.flowpath_id)
+    JOIN field f on (f.field_id = o.field_id)
+    WHERE f.huc12_id = get_huc12_id(:huc12, 0)
+    and f.scenario_id = 0 GROUP by f.landuse
+    """),
+        conn,
+        params={"huc12": huc12},
+    )
+    rows = [["Year", "Corn", "Soybean", "Pasture", "Other"]]
+    for year, mix in compute_crop_mix(landuse).iterrows():
+        rows.append([year])
+        for cropcode in ["C", "B", "P"]:
+            if mix[cropcode] > 0:
+                rows[-1].append("%.1f%%" % (mix[cropcode] * 100.0,))
+            else:
+                rows[-1].append("None")
+        rows[-1].append("%.1f%%" % (mix["other"] * 100.0,))
+    return row, rows
+
+
+def generate_run_metadata(row: dict, rows: list, slopes: bytes):
+    """Information about DEP modelling of this huc12."""
+    styles = getSampleStyleSheet()
+    res = []
     res.append(
         Paragraph(
             (
@@ -115,33 +240,6 @@ def generate_run_metadata(huc12: str, conn: Connection | None = None):
         )
     )
 
-    # Something about managements and crops
-    rows = [["Year", "Corn", "Soybean", "Pasture", "Other"]]
-    for year in range(2016, 2023):
-        df = pd.read_sql(
-            sql_helper("""
-        select substr(f.landuse, :offset, 1) as datum, count(*) from
-        flowpath_ofe o JOIN flowpath p on (o.flowpath_id = p.flowpath_id)
-        JOIN field f on (f.field_id = o.field_id)
-        WHERE f.huc12_id = get_huc12_id(:huc12, 0)
-        and f.scenario_id = 0 GROUP by datum
-        """),
-            conn,
-            params={"offset": year - 2007 + 1, "huc12": huc12},
-            index_col="datum",
-        )
-        total = df["count"].sum()
-        leftover = total
-        rows.append([year])
-        for cropcode in ["C", "B", "P"]:
-            if cropcode in df.index:
-                val = df.loc[cropcode, "count"]
-                leftover -= val
-                rows[-1].append("%.1f%%" % (val / total * 100.0,))
-            else:
-                rows[-1].append("None")
-        rows[-1].append("%.1f%%" % (leftover / total * 100.0,))
-
     # Histogram of slope profiles
     tablestyle = TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP")])
     res.append(
@@ -150,7 +248,7 @@ def generate_run_metadata(huc12: str, conn: Connection | None = None):
                 [
                     [
                         Image(
-                            make_plot(huc12, 0),
+                            BytesIO(slopes),
                             width=3.6 * inch,
                             height=2.4 * inch,
                         ),
@@ -186,33 +284,8 @@ def generate_run_metadata(huc12: str, conn: Connection | None = None):
     return res
 
 
-def generate_monthly_summary_table(huc12):
-    """Make a table of monthly summary stats."""
-    data = []
-    data.append(
-        [
-            "Year",
-            "Month",
-            "Precip",
-            "Runoff",
-            "Loss",
-            "Delivery",
-            '2+" Precip',
-            "Events",
-        ]
-    )
-    data.append(
-        [
-            "",
-            "",
-            "[inch]",
-            "[inch]",
-            "[tons/acre]",
-            "[tons/acre]",
-            "[days]",
-            "[days]",
-        ]
-    )
+def get_monthly_summary(huc12: str) -> pd.DataFrame:
+    """Query the average monthly totals for the HUC8 or HUC12."""
     huc12col = "huc12_code"
     if len(huc12) == 8:
         huc12col = "substr(huc12_code, 1, 8)"
@@ -246,36 +319,16 @@ def generate_monthly_summary_table(huc12):
             params=(KG_M2_TO_TON_ACRE, KG_M2_TO_TON_ACRE, huc12),
             index_col=None,
         )
-    for _, row in df.iterrows():
-        vals = [int(row["year"]), calendar.month_abbr[int(row["month"])]]
-        vals.extend(["%.2f" % (f,) for f in list(row)[2:-2]])
-        vals.extend(["%.0f" % (f,) for f in list(row)[-2:]])
-        data.append(vals)
-    data[-1][1] = "%s*" % (data[-1][1],)
-    totals = df.iloc[:-1].mean()
-    vals = ["", "Average"]
-    vals.extend(["%.2f" % (f,) for f in list(totals[2:])])
-    data.append(vals)
-
-    style = TableStyle(
-        [
-            ("LINEBELOW", (2, 1), (-1, 1), 0.5, "#000000"),
-            ("LINEAFTER", (1, 2), (1, -2), 0.5, "#000000"),
-            ("LINEABOVE", (2, -1), (-1, -1), 0.5, "#000000"),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-        ]
-    )
-    for rownum in range(3, len(data) + 1, 2):
-        style.add("LINEBELOW", (0, rownum), (-1, rownum), 0.25, "#EEEEEE")
-    return Table(data, style=style, repeatRows=2)
+    return df
 
 
-def generate_summary_table(huc12):
-    """Make a table summarizing our results, please."""
+def generate_monthly_summary_table(df: pd.DataFrame):
+    """Make a table of monthly summary stats."""
     data = []
     data.append(
         [
             "Year",
+            "Month",
             "Precip",
             "Runoff",
             "Loss",
@@ -286,6 +339,7 @@ def generate_summary_table(huc12):
     )
     data.append(
         [
+            "",
             "",
             "[inch]",
             "[inch]",
@@ -295,6 +349,32 @@ def generate_summary_table(huc12):
             "[days]",
         ]
     )
+    for _, row in df.iterrows():
+        vals = [int(row["year"]), calendar.month_abbr[int(row["month"])]]
+        vals.extend(["%.2f" % (f,) for f in list(row)[2:-2]])
+        vals.extend(["%.0f" % (f,) for f in list(row)[-2:]])
+        data.append(vals)
+    data[-1][1] = "%s*" % (data[-1][1],)
+    totals = df.iloc[:-1].mean()
+    vals = ["", "Average"]
+    vals.extend(["%.2f" % (f,) for f in list(totals[2:])])
+    data.append(vals)
+
+    style = TableStyle(
+        [
+            ("LINEBELOW", (2, 1), (-1, 1), 0.5, "#000000"),
+            ("LINEAFTER", (1, 2), (1, -2), 0.5, "#000000"),
+            ("LINEABOVE", (2, -1), (-1, -1), 0.5, "#000000"),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+        ]
+    )
+    for rownum in range(3, len(data) + 1, 2):
+        style.add("LINEBELOW", (0, rownum), (-1, rownum), 0.25, "#EEEEEE")
+    return Table(data, style=style, repeatRows=2)
+
+
+def get_summary(huc12: str) -> pd.DataFrame:
+    """Query the yearly totals for the HUC8 or HUC12."""
     huc12col = "huc12_code"
     if len(huc12) == 8:
         huc12col = "substr(huc12_code, 1, 8)"
@@ -327,6 +407,34 @@ def generate_summary_table(huc12):
             params=(KG_M2_TO_TON_ACRE, KG_M2_TO_TON_ACRE, huc12),
             index_col="year",
         )
+    return df
+
+
+def generate_summary_table(df: pd.DataFrame):
+    """Make a table summarizing our results, please."""
+    data = []
+    data.append(
+        [
+            "Year",
+            "Precip",
+            "Runoff",
+            "Loss",
+            "Delivery",
+            '2+" Precip',
+            "Events",
+        ]
+    )
+    data.append(
+        [
+            "",
+            "[inch]",
+            "[inch]",
+            "[tons/acre]",
+            "[tons/acre]",
+            "[days]",
+            "[days]",
+        ]
+    )
     for year, row in df.iterrows():
         vals = [year]
         vals.extend(["%.2f" % (f,) for f in list(row)[:-2]])
@@ -385,6 +493,18 @@ def application(environ, start_response):
     """See how we are called"""
     huc12 = environ["huc"]
     ishuc12 = len(huc12) == 12
+    sts = time.perf_counter()
+    parts, timings = run_stages(
+        {
+            "overview_regional": (render_overviewmap, huc12, 250),
+            "overview_huc8": (render_overviewmap, huc12, 11),
+            "slopes": (render_slopes, huc12),
+            "run_metadata": (get_run_metadata, huc12),
+            "yearly": (get_summary, huc12),
+            "monthly": (get_monthly_summary, huc12),
+        }
+    )
+    timings["stages"] = time.perf_counter() - sts
     bio = BytesIO()
     styles = getSampleStyleSheet()
     doc = SimpleDocTemplate(bio, pagesize=letter, topMargin=(inch * 1.5))
@@ -393,16 +513,12 @@ def application(environ, start_response):
     story.append(Spacer(inch, inch * 0.25))
     story.append(Paragraph("Geographic Location", styles["Heading1"]))
     image1 = Image(
-        make_overviewmap(
-            MapperSchema(overview=1, huc=huc12, zoom=250, extent=[]),
-        ),
+        BytesIO(parts["overview_regional"]),
         width=3.6 * inch,
         height=2.4 * inch,
     )
     image2 = Image(
-        make_overviewmap(
-            MapperSchema(overview=1, huc=huc12, zoom=11, extent=[]),
-        ),
+        BytesIO(parts["overview_huc8"]),
         width=3.6 * inch,
         height=2.4 * inch,
     )
@@ -429,12 +545,14 @@ def application(environ, start_response):
     )
     story.append(Spacer(inch, inch * 0.25))
     story.append(Paragraph("DEP Input Data", styles["Heading1"]))
-    story.extend(generate_run_metadata(huc12))
+    story.extend(
+        generate_run_metadata(*parts["run_metadata"], parts["slopes"])
+    )
 
     story.append(PageBreak())
     story.append(Spacer(inch, inch * 0.25))
     story.append(Paragraph("Yearly Summary", styles["Heading1"]))
-    story.append(generate_summary_table(huc12))
+    story.append(generate_summary_table(parts["yearly"]))
     story.append(
         Paragraph(
             (
@@ -449,7 +567,7 @@ def application(environ, start_response):
     story.append(PageBreak())
     story.append(Spacer(inch, inch * 0.25))
     story.append(Paragraph("Monthly Summary", styles["Heading1"]))
-    story.append(generate_monthly_summary_table(huc12))
+    story.append(generate_monthly_summary_table(parts["monthly"]))
     story.append(
         Paragraph(
             (
@@ -464,6 +582,16 @@ def application(environ, start_response):
         """Proxy to our draw_header func"""
         draw_header(canvas, doc, huc12)
 
+    build_sts = time.perf_counter()
     doc.build(story, onFirstPage=pagecb, onLaterPages=pagecb)
-    start_response("200 OK", [("Content-type", "application/pdf")])
+    timings["build"] = time.perf_counter() - build_sts
+    timings["total"] = time.perf_counter() - sts
+    LOG.info("huc12report %s %s", huc12, server_timing(timings))
+    start_response(
+        "200 OK",
+        [
+            ("Content-type", "application/pdf"),
+            ("Server-Timing", server_timing(timings)),
+        ],
+    )
     return [bio.getvalue()]
@@ -20,15 +20,21 @@ edate=2015-12-31&v=avg_runoff&annual=true&state=KS
 
 """
 
+import hashlib
+import json
 from datetime import date
 from io import BytesIO
 from typing import Annotated
 
 import geopandas as gpd
 import matplotlib.colors as mpcolors
+import numpy as np
 import pandas as pd
+import shapely
 from dailyerosion.reference import KG_M2_TO_TON_ACRE, RAMPS
-from matplotlib.patches import Polygon, Rectangle
+from matplotlib.collections import PathCollection
+from matplotlib.patches import Rectangle
+from matplotlib.path import Path
 from pydantic import Field, field_validator, model_validator
 from pyiem.database import get_sqlalchemy_conn, sql_helper
 from pyiem.exceptions import NoDataFound
@@ -41,6 +47,18 @@ from pyproj import Transformer
 from pyproj.crs.crs import CRS
 from sqlalchemy.engine import Connection
 
+from depbackend.aggregate import get_period_sums
+from depbackend.cache import FileCache, get_last_date
+from depbackend.geometry import (
+    filter_states,
+    get_huc12_geometries,
+    get_huc12_scenario,
+)
+
+# Rendered PNGs keyed by the normalized request and the last model date
+RENDER_CACHE = FileCache("/mnt/dep/cache/mapper", max_bytes=2 * 1024**3)
+# These are folded into sdate and edate by Schema.merge_provided_dates
+RENDER_KEY_EXCLUDE = {"year", "month", "day", "year2", "month2", "day2"}
 V2NAME = {
     "avg_loss": "Detachment",
     "qc_precip": "Precipitation",
@@ -204,30 +222,73 @@ class Schema(CGIModel):
         return value
 
 
+def geometries_to_paths(geoms) -> list[Path]:
+    """Convert (Multi)Polygons into one compound matplotlib Path each.
+
+    Every ring becomes a MOVETO/LINETO/CLOSEPOLY run, so MultiPolygon parts
+    and interiors are retained.  Interiors are wound opposite to their
+    exterior so that they render as holes.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    if len(geoms) == 0:
+        return []
+    polys, poly_feature = shapely.get_parts(geoms, return_index=True)
+    rings, ring_poly = shapely.get_rings(polys, return_index=True)
+    # The first ring of each polygon is its exterior
+    is_exterior = np.ones(len(rings), dtype=bool)
+    is_exterior[1:] = ring_poly[1:] != ring_poly[:-1]
+    ccw = shapely.is_ccw(rings)
+    exterior_ccw = ccw[np.flatnonzero(is_exterior)][np.cumsum(is_exterior) - 1]
+    flip = ~is_exterior & (ccw == exterior_ccw)
+    rings[flip] = shapely.reverse(rings[flip])
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    ring_start = np.ones(len(coords), dtype=bool)
+    ring_start[1:] = coord_ring[1:] != coord_ring[:-1]
+    codes[ring_start] = Path.MOVETO
+    codes[np.roll(ring_start, -1)] = Path.CLOSEPOLY
+
+    # Split the flat arrays back into one chunk per input geometry
+    counts = np.bincount(
+        poly_feature[ring_poly[coord_ring]], minlength=len(geoms)
+    )
+    splits = np.cumsum(counts)[:-1]
+    return [
+        Path(verts, pathcodes)
+        for verts, pathcodes in zip(
+            np.split(coords, splits),
+            np.split(codes, splits),
+            strict=True,
+        )
+    ]
+
+
+def add_polygons(ax, geoms, facecolors, **kwargs) -> PathCollection:
+    """Add all geometries to the axes as a single collection.
+
+    Styling mimics what a ``matplotlib.patches.Polygon`` per geometry
+    provides, so the output is pixel equivalent to that approach.
+    """
+    kwargs.setdefault("edgecolors", "k")
+    kwargs.setdefault("linewidths", 0.1)
+    kwargs.setdefault("joinstyle", "miter")
+    kwargs.setdefault("capstyle", "butt")
+    collection = PathCollection(
+        geometries_to_paths(geoms), facecolors=facecolors, **kwargs
+    )
+    ax.add_collection(collection)
+    return collection
+
+
 def make_overviewmap(query: Schema):
     """Draw a pretty map of just the HUC."""
     projection = EPSG[5070]
-    params = {}
-    huclimiter = ""
-    if len(query.huc) >= 8:
-        huclimiter = " and substr(huc12_code, 1, 8) = :huc8 "
-        params["huc8"] = query.huc[:8]
     with get_sqlalchemy_conn("dep") as conn:
-        df = gpd.read_postgis(
-            sql_helper(
-                """
-            SELECT simple_geom as geom, huc12_code,
-            ST_x(ST_Transform(ST_Centroid(geom), 4326)) as centroid_x,
-            ST_y(ST_Transform(ST_Centroid(geom), 4326)) as centroid_y, name
-            from huc12 i WHERE i.scenario_id = 0 {huclimiter}
-        """,
-                huclimiter=huclimiter,
-            ),
-            conn,
-            geom_col="geom",
-            params=params,
-            index_col="huc12_code",
-        )  # type: ignore
+        hucs = get_huc12_geometries(conn, 0)
+    df = hucs[hucs["huc12_code"].str.startswith(query.huc[:8])].set_index(
+        "huc12_code"
+    )
     if df.empty:
         raise NoDataFound("No Data Found for this scenario and date")
     minx, miny, maxx, maxy = df["geom"].total_bounds
@@ -252,24 +313,21 @@ def make_overviewmap(query: Schema):
         subtitlefontsize=18,
         caption="Daily Erosion Project",
     )
-    for _huc12, row in df.iterrows():
-        p = Polygon(
-            row["geom"].exterior.coords,
-            fc="red" if _huc12 == query.huc else "tan",
-            ec="k",
-            zorder=Z_OVERLAY2,
-            lw=0.1,
+    add_polygons(
+        m.ax,
+        df["geom"].values,
+        np.where(df.index == query.huc, "red", "tan"),
+        zorder=Z_OVERLAY2,
+    )
+    # If this is our HUC, add some text to prevent cities overlay overlap
+    if query.huc in df.index:
+        m.plot_values(
+            [df.at[query.huc, "centroid_x"]],
+            [df.at[query.huc, "centroid_y"]],
+            ["    .    "],
+            color="None",
+            outlinecolor="None",
         )
-        m.ax.add_patch(p)
-        # If this is our HUC, add some text to prevent cities overlay overlap
-        if _huc12 == query.huc:
-            m.plot_values(
-                [row["centroid_x"]],
-                [row["centroid_y"]],
-                ["    .    "],
-                color="None",
-                outlinecolor="None",
-            )
     if query.huc is not None:
         m.drawcounties()
         m.drawcities()
@@ -357,75 +415,28 @@ def build_map_object(query: Schema, df: pd.DataFrame):
 
 def get_map_data(query: Schema, conn: Connection) -> gpd.GeoDataFrame:
     """Figure out the data for this query."""
-    # Compute what the huc12 scenario is for this scenario
-    res = conn.execute(
-        sql_helper(
-            "select huc12_scenario from scenario where scenario_id = :id"
-        ),
-        {"id": query.scenario},
-    )
-    huc12_scenario = res.fetchone()[0]
-
-    params = {
-        "scenario": query.scenario,
-        "huc12_scenario": huc12_scenario,
-        "sday1": f"{query.sdate:%m%d}",
-        "sday2": f"{query.edate:%m%d}",
-        "ts": query.sdate,
-        "ts2": query.edate,
-        "dbcol": V2MULTI[query.v],
-        "state": query.state,
-    }
-    huclimiter = ""
-    if query.huc is not None:
-        if len(query.huc) == 8:
-            huclimiter = " and substr(i.huc12_code, 1, 8) = :huc8 "
-            params["huc8"] = query.huc
-        elif len(query.huc) == 12:
-            huclimiter = " and i.huc12_code = :huc12 "
-            params["huc12"] = query.huc
+    hucs = get_huc12_geometries(conn, get_huc12_scenario(conn, query.scenario))
+    # The state index is built for the shared frame, so filter it first
     if query.state:
-        huclimiter += " and i.states ~* :state "
+        hucs = filter_states(hucs, [query.state])
+    if query.huc is not None:
+        hucs = hucs[hucs["huc12_code"].str.startswith(query.huc)]
     if query.v in ["dt", "slp"]:
-        df = gpd.read_postgis(
-            sql_helper(
-                """
-        SELECT simple_geom as geom,
-        {colname} as data
-        from huc12 i WHERE scenario_id = :huc12_scenario {huclimiter}
-        """,
-                huclimiter=huclimiter,
-                colname=COLMAPPER[query.v],
-            ),
-            conn,
-            params=params,
-            geom_col="geom",
-        )  # type: ignore
-    else:
-        df = gpd.read_postgis(
-            sql_helper(
-                """
-        WITH data as (
-        SELECT huc12_id, sum({v})  as d from water_results_by_huc12
-        WHERE scenario_id = :scenario and valid between :ts and :ts2
-        GROUP by huc12_id)
-
-        SELECT simple_geom as geom,
-        coalesce(d.d, 0) * :dbcol as data
-        from huc12 i LEFT JOIN data d
-        ON (i.huc12_id = d.huc12_id) WHERE i.scenario_id = :huc12_scenario
-        {huclimiter}
-        """,
-                huclimiter=huclimiter,
-                v=COLMAPPER[query.v],
-            ),
-            conn,
-            params=params,
-            geom_col="geom",
-        )  # type: ignore
-        if query.annual:
-            years = query.edate.year - query.sdate.year + 1
-            df["data"] = df["data"] / years
+        return hucs[["geom"]].assign(data=hucs[COLMAPPER[query.v]])
+    obs = get_period_sums(
+        conn,
+        query.scenario,
+        query.sdate,
+        query.edate,
+        None if query.huc is None and not query.state else hucs.index.tolist(),
+    )
+    df = hucs[["geom"]].assign(
+        data=obs[COLMAPPER[query.v]].reindex(hucs.index).fillna(0)
+        * V2MULTI[query.v]
+    )
+    if query.annual:
+        years = query.edate.year - query.sdate.year + 1
+        df["data"] = df["data"] / years
     return df
 
 
@@ -458,15 +469,12 @@ def make_map(conn, query: Schema):
         if query.v == "slp":
             bins = [0, 0.01, 0.03, 0.05, 0.07, 0.1, 0.5]
         norm = mpcolors.BoundaryNorm(bins, cmap.N)
-        for _, row in df.to_crs(mp.panels[0].crs).iterrows():
-            p = Polygon(
-                row["geom"].exterior.coords,
-                fc=cmap(norm([row["data"]]))[0],
-                ec="k",
-                zorder=5,
-                lw=0.1,
-            )
-            mp.ax.add_patch(p)
+        add_polygons(
+            mp.ax,
+            df.to_crs(mp.panels[0].crs)["geom"].values,
+            cmap(norm(df["data"].values)),
+            zorder=5,
+        )
         lbl = [round(_, 2) for _ in bins]
         mp.draw_colorbar(
             bins,
@@ -521,6 +529,14 @@ def make_map(conn, query: Schema):
     return ram
 
 
+def get_render_key(query: Schema, last_date: str | None) -> str:
+    """Compute a cache key for the rendered image of this query."""
+    payload = query.model_dump(mode="json", exclude=RENDER_KEY_EXCLUDE)
+    payload["last_date"] = last_date
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 @iemapp(
     content_type="image/png",
     help=__doc__,
@@ -531,11 +547,15 @@ def application(environ: dict, start_response: callable):
     """Our mod-wsgi handler"""
     # Capture the request
     query: Schema = environ["_cgimodel_schema"]
-    if query.overview:
-        res = make_overviewmap(query).read()
-    else:
-        with get_sqlalchemy_conn("dep") as conn:
+    with get_sqlalchemy_conn("dep") as conn:
+        key = get_render_key(query, get_last_date(conn, query.scenario))
+        res = RENDER_CACHE.get(key)
+        if res is None and not query.overview:
             res = make_map(conn, query).read()
+            RENDER_CACHE.set(key, res)
+    if res is None:
+        res = make_overviewmap(query).read()
+        RENDER_CACHE.set(key, res)
 
     # Ensure that all work is done before we start to respond.
     start_response("200 OK", [("Content-type", "image/png")])
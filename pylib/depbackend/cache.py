@@ -0,0 +1,566 @@
+"""Caching helpers shared by depbackend services."""
+
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable
+from typing import Any
+
+from pyiem.database import sql_helper
+from pyiem.util import logger
+from pymemcache.client.base import PooledClient
+from pymemcache.client.hash import HashClient
+from sqlalchemy.engine import Connection
+
+LOG = logger()
+# IEM memcached instances run with a 10MB item limit `-I 10m`
+MAX_ITEM_SIZE = 10_000_000
+
+
+class VersionedCache:
+    """Process-wide values that are reloaded when their version changes.
+
+    ``probe(conn, key)`` is a cheap query returning a version stamp and
+    ``load(conn, key)`` is the expensive one returning the value.  The probe
+    is run at most every ``recheck`` seconds per key, with the value only
+    reloaded when the version stamp differs from the one it was loaded with.
+    Cached values are shared between threads, so treat them as read-only.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[Connection, Hashable], Any],
+        load: Callable[[Connection, Hashable], Any],
+        recheck: float = 60.0,
+    ):
+        """Constructor."""
+        self.probe = probe
+        self.load = load
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        # key -> (version, monotonic time of last probe, value)
+        self._entries: dict[Hashable, tuple[Any, float, Any]] = {}
+
+    def get(self, conn: Connection, key: Hashable) -> Any:
+        """Return the value for this key, loading it when necessary."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.recheck:
+                return entry[2]
+            version = self.probe(conn, key)
+            if entry is not None and entry[0] == version:
+                value = entry[2]
+            else:
+                value = self.load(conn, key)
+            self._entries[key] = (version, now, value)
+            return value
+
+    def clear(self):
+        """Drop everything, forcing a reload on next access."""
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache:
+    """Size-bounded least recently used cache of bytes on the filesystem.
+
+    Reads bump the file's mtime, so when the directory grows beyond
+    ``max_bytes``, the files with the oldest mtime are removed until the
+    directory is back under ``low_water`` of that size.  Filesystem errors
+    are logged and treated as cache misses, so a missing or read-only
+    directory simply disables the cache.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        low_water: float = 0.8,
+        check_every: int = 50,
+    ):
+        """Constructor."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.check_every = check_every
+        self._sets = 0
+
+    def _path(self, key: str) -> str:
+        """Where this key lives."""
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> bytes | None:
+        """Fetch the key, if it exists."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                res = fh.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as exp:
+            LOG.warning("FileCache get %s failed: %s", path, exp)
+            return None
+        return res
+
+    def set(self, key: str, value: bytes):
+        """Store the key."""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(path), delete=False
+            ) as fh:
+                fh.write(value)
+            os.replace(fh.name, path)
+        except OSError as exp:
+            LOG.warning("FileCache set %s failed: %s", path, exp)
+            return
+        self._sets += 1
+        if (self._sets - 1) % self.check_every == 0:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used files when over the size limit."""
+        entries = []
+        for dirpath, _dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(entry[1] for entry in entries)
+        if total <= self.max_bytes:
+            return
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes * self.low_water:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def parse_servers(text: str) -> list[tuple[str, int]]:
+    """Parse comma separated ``host:port`` memcached endpoints."""
+    res = []
+    for token in text.split(","):
+        if token.strip():
+            host, _, port = token.strip().partition(":")
+            res.append((host, int(port or 11211)))
+    return res
+
+
+class MemcachePool:
+    """Process-wide pooled memcached client.
+
+    Sockets are kept in a pool shared by the threads of the process, rather
+    than connecting for every request.  Endpoints default to the comma
+    separated ``DEP_MEMCACHE_SERVERS`` environment variable, with multiple
+    endpoints spreading the keys among them.  When memcached fails, the
+    error is logged and the pool acts as an always missing cache for
+    ``retry`` seconds, so an unreachable server does not add its timeouts
+    to every request.
+    """
+
+    def __init__(
+        self,
+        servers: str | None = None,
+        connect_timeout: float = 0.5,
+        timeout: float = 1.0,
+        max_pool_size: int = 16,
+        retry: float = 30.0,
+        client_factory: Callable[[], Any] | None = None,
+    ):
+        """Constructor.
+
+        Args:
+            servers: comma separated ``host:port`` endpoints
+            connect_timeout: seconds to wait for a connection
+            timeout: seconds to wait for a response
+            max_pool_size: the most sockets to keep per endpoint
+            retry: seconds to skip memcached after a failure
+            client_factory: optionally build the client, for testing
+        """
+        if servers is None:
+            servers = os.environ.get(
+                "DEP_MEMCACHE_SERVERS", "iem-memcached:11211"
+            )
+        self.servers = parse_servers(servers)
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.max_pool_size = max_pool_size
+        self.retry = retry
+        self.client_factory = client_factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._down_until = 0.0
+
+    def _build(self):
+        """Build the pymemcache client."""
+        if self.client_factory is not None:
+            return self.client_factory()
+        kwargs = {
+            "connect_timeout": self.connect_timeout,
+            "timeout": self.timeout,
+            "max_pool_size": self.max_pool_size,
+            "no_delay": True,
+        }
+        if len(self.servers) == 1:
+            return PooledClient(self.servers[0], **kwargs)
+        return HashClient(self.servers, use_pooling=True, **kwargs)
+
+    def _get_client(self):
+        """Return the client, or None while memcached is failing."""
+        with self._lock:
+            if not self.servers and self.client_factory is None:
+                return None
+            if time.monotonic() < self._down_until:
+                return None
+            if self._client is None:
+                self._client = self._build()
+            return self._client
+
+    def _failed(self, action: str, key: str, exp: Exception):
+        """Log the failure and skip memcached for a while."""
+        LOG.warning("memcache %s %s failed: %s", action, key, exp)
+        with self._lock:
+            self._down_until = time.monotonic() + self.retry
+
+    def get(self, key: str) -> bytes | None:
+        """Fetch the key, returning None when missing or failing."""
+        client = self._get_client()
+        if client is None:
+            return None
+        try:
+            return client.get(key)
+        except Exception as exp:
+            self._failed("get", key, exp)
+            return None
+
+    def set(self, key: str, value: bytes, expire: int = 0):
+        """Store the key, doing nothing when failing."""
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.set(key, value, expire)
+        except Exception as exp:
+            self._failed("set", key, exp)
+
+    def add(self, key: str, value: bytes, expire: int = 0) -> bool:
+        """Store the key only if it does not exist.
+
+        Returns:
+            True when stored, or when failing, so that callers using this
+            as a lock do not wait on memcached.
+        """
+        client = self._get_client()
+        if client is None:
+            return True
+        try:
+            return bool(client.add(key, value, expire, noreply=False))
+        except Exception as exp:
+            self._failed("add", key, exp)
+            return True
+
+    def delete(self, key: str):
+        """Remove the key, doing nothing when failing."""
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.delete(key)
+        except Exception as exp:
+            self._failed("delete", key, exp)
+
+    def close(self):
+        """Close the pooled sockets."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+
+
+_POOL: dict[str, MemcachePool] = {}
+
+
+def get_memcache_pool() -> MemcachePool:
+    """Return the process-wide memcached pool."""
+    if "pool" not in _POOL:
+        configure_memcache()
+    return _POOL["pool"]
+
+
+def configure_memcache(**kwargs) -> MemcachePool:
+    """Replace the process-wide pool, see ``MemcachePool`` for arguments."""
+    old = _POOL.get("pool")
+    _POOL["pool"] = MemcachePool(**kwargs)
+    if old is not None:
+        old.close()
+    return _POOL["pool"]
+
+
+class MemcacheCache:
+    """Memcached backed cache with the same interface as FileCache.
+
+    Memcached takes care of the least recently used eviction within its
+    configured memory limit.  Requests go through the process-wide
+    ``MemcachePool``, unless another pool is given, and are counted within
+    ``hits`` and ``misses``.
+    """
+
+    def __init__(self, expire: int = 86400, pool: MemcachePool | None = None):
+        """Constructor."""
+        self.expire = expire
+        self.pool = pool
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _pool(self) -> MemcachePool:
+        """The pool to use."""
+        return get_memcache_pool() if self.pool is None else self.pool
+
+    def get(self, key: str) -> bytes | None:
+        """Fetch the key, if it exists."""
+        res = self._pool().get(key)
+        with self._lock:
+            if res is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return res
+
+    def set(self, key: str, value: bytes, expire: int | None = None):
+        """Store the key, for ``expire`` seconds when given."""
+        self._pool().set(key, value, self.expire if expire is None else expire)
+
+    def add(self, key: str, value: bytes, expire: int | None = None) -> bool:
+        """Store the key only if it does not exist, see ``MemcachePool``."""
+        return self._pool().add(
+            key, value, self.expire if expire is None else expire
+        )
+
+    def delete(self, key: str):
+        """Remove the key."""
+        self._pool().delete(key)
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit and miss counts."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class _Flight:
+    """A generation in progress, which other threads can wait on."""
+
+    def __init__(self):
+        """Constructor."""
+        self.done = threading.Event()
+        self.value: bytes | None = None
+        self.error: BaseException | None = None
+
+
+class RevalidatingCache:
+    """Stale-while-revalidate memcached values with coalesced generation.
+
+    Values are stored along with the time they become stale, ``ttl``
+    seconds after being generated, and memcached keeps them for a further
+    ``stale`` seconds.  Once stale, the first worker to ``add`` the key's
+    lock regenerates the value, while other workers keep serving the stale
+    one.  Without any value, concurrent requests for the key within a
+    process wait for a single generation, and requests in other processes
+    wait up to ``wait`` seconds for the lock holder to store it.
+    """
+
+    def __init__(
+        self,
+        cache: MemcacheCache,
+        ttl: int,
+        stale: int,
+        lock_ttl: int = 300,
+        wait: float = 60.0,
+        poll: float = 0.1,
+    ):
+        """Constructor.
+
+        Args:
+            cache: where values are stored
+            ttl: seconds until a value is stale
+            stale: seconds a stale value may still be served
+            lock_ttl: seconds before an abandoned lock is released
+            wait: seconds to wait for another process's generation
+            poll: seconds between checks while waiting
+        """
+        self.cache = cache
+        self.ttl = ttl
+        self.stale = stale
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._flights: dict[str, _Flight] = {}
+
+    def lookup(self, key: str) -> tuple[bytes | None, bool]:
+        """Return the cached value, if any, and whether it is fresh."""
+        res = self.cache.get(key)
+        if res is None or len(res) < 8:
+            return None, False
+        (fresh_until,) = struct.unpack(">d", res[:8])
+        return res[8:], time.time() < fresh_until
+
+    def store(self, key: str, value: bytes):
+        """Store the value, when small enough for memcached."""
+        if len(value) + 8 >= MAX_ITEM_SIZE:
+            return
+        header = struct.pack(">d", time.time() + self.ttl)
+        self.cache.set(key, header + value, self.ttl + self.stale)
+
+    def fetch(self, key: str, generate: Callable[[], bytes]) -> bytes:
+        """Return the value, generating it when missing or stale."""
+        value, fresh = self.lookup(key)
+        if fresh:
+            return value
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            if value is not None:
+                return value
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = self._generate(key, generate, value)
+        except BaseException as exp:
+            flight.error = exp
+            raise
+        finally:
+            self._land(key, flight)
+        return flight.value
+
+    def stream(
+        self, key: str, generate: Callable[[], Iterable[bytes]]
+    ) -> Iterable[bytes]:
+        """Return the value's pieces, streaming them when generated here.
+
+        This behaves like ``fetch``, except that ``generate`` returns the
+        pieces of the value, which are passed along as they are produced
+        and joined for storage once all have been sent.  Only the pieces
+        are held, and no longer once they exceed the memcached item size,
+        in which case the value is not stored.  Fresh values are returned
+        as a single item list.  Otherwise, the generation is only joined
+        or started once the returned pieces are iterated, so a response
+        closed before then holds nothing.  Threads waiting on another
+        thread's stream give up after ``wait`` seconds and generate the
+        value themselves.
+        """
+        value, fresh = self.lookup(key)
+        if fresh:
+            return [value]
+        return self._stream(key, generate, value)
+
+    def _stream(self, key: str, generate, value: bytes | None):
+        """Yield the pieces, storing the value once all are sent."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            if value is None and flight.done.wait(self.wait):
+                if flight.error is not None:
+                    raise flight.error
+                value = flight.value
+            if value is None:
+                yield from generate()
+            else:
+                yield value
+            return
+        lockkey = f"{key}/lock"
+        if not self.cache.add(lockkey, b"1", self.lock_ttl):
+            if value is None:
+                value = self._wait_for(key)
+            if value is not None:
+                flight.value = value
+                self._land(key, flight)
+                yield value
+                return
+            lockkey = None
+        pieces = []
+        size = 8
+        try:
+            for piece in generate():
+                size += len(piece)
+                if size < MAX_ITEM_SIZE:
+                    pieces.append(piece)
+                else:
+                    pieces.clear()
+                yield piece
+            if size < MAX_ITEM_SIZE:
+                flight.value = b"".join(pieces)
+                self.store(key, flight.value)
+        except GeneratorExit:
+            # The client went away, so waiting threads generate it instead
+            raise
+        except BaseException as exp:
+            flight.error = exp
+            raise
+        finally:
+            if lockkey is not None:
+                self.cache.delete(lockkey)
+            self._land(key, flight)
+
+    def _land(self, key: str, flight: _Flight):
+        """Mark the flight as done, releasing the threads waiting on it."""
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.done.set()
+
+    def _wait_for(self, key: str) -> bytes | None:
+        """Wait up to ``wait`` seconds for another process to store it."""
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            time.sleep(self.poll)
+            value, _fresh = self.lookup(key)
+            if value is not None:
+                return value
+        LOG.warning("Gave up waiting on %s, generating it", key)
+        return None
+
+    def _generate(self, key: str, generate, stale: bytes | None) -> bytes:
+        """Generate and store the value, unless another process is."""
+        lockkey = f"{key}/lock"
+        if not self.cache.add(lockkey, b"1", self.lock_ttl):
+            if stale is not None:
+                return stale
+            value = self._wait_for(key)
+            return generate() if value is None else value
+        try:
+            value = generate()
+            self.store(key, value)
+        finally:
+            self.cache.delete(lockkey)
+        return value
+
+
+def get_last_date(conn: Connection, scenario: int) -> str | None:
+    """Return the ``last_date_{scenario}`` property.
+
+    This changes as new model days land, so is useful for cache keys.
+    """
+    res = conn.execute(
+        sql_helper("SELECT value from properties WHERE key = :key"),
+        {"key": f"last_date_{scenario}"},
+    ).fetchone()
+    return None if res is None else res[0]
@@ -0,0 +1,171 @@
+"""Lookup and cached parsing of DEP climate files.
+
+The ``climate_file`` table of each scenario is small and rarely changes, so
+each process loads it once per database and scenario into a KD-tree on
+longitude and latitude.  Like the PostGIS ``<->`` and ``ST_Distance`` it
+replaces, distances are planar degrees.  The tree is reloaded when the
+number of files or the max ``climate_file_id`` changes.
+
+Parsing a breakpoint climate file, and especially computing its rainfall
+intensities, is expensive while the same popular grid cells get requested
+over and over.  The parsed frames are kept as ``.npz`` bytes within a size
+bounded, least recently used ``FileCache`` keyed by the file path, its
+modification time and the requested intensity levels, so a rewritten
+climate file is simply a cache miss.
+"""
+
+import hashlib
+import math
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from dailyerosion.io.wepp import read_cli
+from pyiem.database import sql_helper
+from scipy.spatial import KDTree
+from sqlalchemy.engine import Connection
+
+from depbackend.cache import FileCache, VersionedCache
+
+CLI_CACHE = FileCache("/mnt/dep/cache/climate", max_bytes=1024**3)
+# npz member holding the DatetimeIndex
+INDEX = "__index__"
+
+
+class ClimateFileIndex:
+    """Nearest neighbour lookup of a scenario's climate files."""
+
+    def __init__(self, df: pd.DataFrame):
+        """Constructor.
+
+        Args:
+            df: frame with ``climate_file_id``, ``filepath``, ``lon`` and
+              ``lat`` columns.
+        """
+        self.ids = df["climate_file_id"].to_numpy()
+        self.filepaths = df["filepath"].to_numpy()
+        self.coords = df[["lon", "lat"]].to_numpy(dtype=float)
+        self.tree = KDTree(self.coords) if len(df.index) else None
+
+    def nearest(
+        self, lon: float, lat: float, within: float = 1.0
+    ) -> tuple[int, str, float] | tuple[None, None, None]:
+        """Find the closest file within ``within`` degrees in lon and lat.
+
+        Returns:
+            climate_file_id, filepath and distance [degrees], or Nones.
+        """
+        if self.tree is None:
+            return None, None, None
+        dist, idx = self.tree.query((lon, lat))
+        if not self._inside(idx, lon, lat, within):
+            # The nearest file is outside of the envelope, but one within
+            # the corners of the envelope could be further away
+            candidates = [
+                i
+                for i in self.tree.query_ball_point(
+                    (lon, lat), within * math.sqrt(2)
+                )
+                if self._inside(i, lon, lat, within)
+            ]
+            if not candidates:
+                return None, None, None
+            dists = np.hypot(*(self.coords[candidates] - (lon, lat)).T)
+            idx = candidates[int(np.argmin(dists))]
+            dist = dists.min()
+        return int(self.ids[idx]), str(self.filepaths[idx]), float(dist)
+
+    def _inside(self, idx: int, lon: float, lat: float, within: float):
+        """Is this file strictly within the envelope about the point."""
+        return (
+            abs(self.coords[idx, 0] - lon) < within
+            and abs(self.coords[idx, 1] - lat) < within
+        )
+
+
+def _probe(conn: Connection, key: tuple) -> tuple:
+    """Compute a version stamp for the climate_file table."""
+    res = conn.execute(
+        sql_helper(
+            "SELECT count(*), max(climate_file_id) from climate_file "
+            "WHERE scenario_id = :scenario"
+        ),
+        {"scenario": key[1]},
+    )
+    return tuple(res.fetchone())
+
+
+def _load(conn: Connection, key: tuple) -> ClimateFileIndex:
+    """Load the climate file locations."""
+    df = pd.read_sql(
+        sql_helper(
+            "SELECT climate_file_id, filepath, ST_X(geom) as lon, "
+            "ST_Y(geom) as lat from climate_file "
+            "WHERE scenario_id = :scenario ORDER by climate_file_id"
+        ),
+        conn,
+        params={"scenario": key[1]},
+    )
+    return ClimateFileIndex(df)
+
+
+_INDEX = VersionedCache(_probe, _load)
+
+
+def get_climate_file_index(
+    conn: Connection, dbname: str, scenario: int
+) -> ClimateFileIndex:
+    """Return the climate file index for this database and scenario."""
+    return _INDEX.get(conn, (dbname, scenario))
+
+
+def dump_frame(df: pd.DataFrame) -> bytes:
+    """Serialize the climate frame as npz bytes."""
+    bio = BytesIO()
+    np.savez(
+        bio,
+        **{INDEX: df.index.to_numpy()},
+        **{col: df[col].to_numpy() for col in df.columns},
+    )
+    return bio.getvalue()
+
+
+def load_frame(data: bytes) -> pd.DataFrame:
+    """Deserialize the ``dump_frame`` bytes."""
+    with np.load(BytesIO(data)) as npz:
+        return pd.DataFrame(
+            {col: npz[col] for col in npz.files if col != INDEX},
+            index=pd.DatetimeIndex(npz[INDEX]),
+        )
+
+
+def get_cache_key(clifn: str, levels: list[int] | None) -> str | None:
+    """Compute the cache key, or None when the file does not exist."""
+    try:
+        mtime = os.stat(clifn).st_mtime_ns
+    except OSError:
+        return None
+    levels = "" if not levels else ",".join(str(x) for x in sorted(levels))
+    return hashlib.sha256(f"{clifn}|{mtime}|{levels}".encode()).hexdigest()
+
+
+def read_cli_cached(
+    clifn: str, levels: list[int] | None = None
+) -> pd.DataFrame:
+    """Return ``read_cli(clifn, compute_intensity_over=levels)``, cached.
+
+    The returned frame is a fresh copy, so may be modified.
+    """
+    key = get_cache_key(clifn, levels)
+    if key is not None:
+        data = CLI_CACHE.get(key)
+        if data is not None:
+            return load_frame(data)
+    if levels:
+        df = read_cli(clifn, compute_intensity_over=levels)
+    else:
+        df = read_cli(clifn)
+    if key is not None:
+        CLI_CACHE.set(key, dump_frame(df))
+    return df
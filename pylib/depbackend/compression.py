@@ -0,0 +1,153 @@
+"""Gzip compressed cache values, sent as is to clients accepting gzip.
+
+The full domain JSON payloads are several megabytes.  Storing them gzip
+compressed keeps them well under the memcached item size limit, and sending
+the stored bytes as is to clients accepting gzip, which is nearly all of
+them, saves Apache's ``SetOutputFilter DEFLATE`` from compressing them again
+on every hit, as mod_deflate leaves responses with a ``Content-Encoding``
+alone.  Other clients get the payload decompressed.
+"""
+
+import gzip
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+
+from depbackend.cache import RevalidatingCache
+
+GZIP_LEVEL = 6
+VARY = ("Vary", "Accept-Encoding")
+
+
+def accepts_gzip(environ: dict) -> bool:
+    """Does the request's Accept-Encoding allow a gzip response?"""
+    qvalues = {}
+    for token in environ.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, *params = token.split(";")
+        qvalue = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding.strip().lower()] = qvalue
+    for coding in ["gzip", "x-gzip", "*"]:
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+
+def gzip_compress(payload: bytes) -> bytes:
+    """Compress the payload, without a timestamp so to be reproducible."""
+    return gzip.compress(payload, GZIP_LEVEL, mtime=0)
+
+
+def gzip_stream(chunks) -> Iterator[bytes]:
+    """Yield the str or bytes chunks gzip compressed, as they are generated."""
+    compressor = zlib.compressobj(
+        GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gzip_chunks(chunks) -> bytes:
+    """Compress the str or bytes chunks as they are generated."""
+    return b"".join(gzip_stream(chunks))
+
+
+def get_compressed(
+    cache: RevalidatingCache, key: str, generate: Callable
+) -> bytes:
+    """Fetch the gzip compressed payload, generating it when necessary.
+
+    Args:
+        cache: where the compressed payload is kept
+        key: the cache key
+        generate: called without arguments for the str or bytes payload
+    """
+
+    def _generate():
+        res = generate()
+        return gzip_compress(
+            res.encode("utf-8") if isinstance(res, str) else res
+        )
+
+    return cache.fetch(key, _generate)
+
+
+def respond(
+    environ: dict,
+    start_response: Callable,
+    payload: bytes,
+    headers: list,
+    callback: str | None = None,
+) -> list[bytes]:
+    """Start the response for the gzip compressed payload.
+
+    The payload is only decompressed when the client does not accept gzip
+    or it needs to be wrapped within a JSONP callback.
+    """
+    headers = [*headers, VARY]
+    if callback is None and accepts_gzip(environ):
+        headers.append(("Content-Encoding", "gzip"))
+        headers.append(("Content-Length", str(len(payload))))
+        start_response("200 OK", headers)
+        return [payload]
+    payload = gzip.decompress(payload)
+    if callback is not None:
+        payload = f"{callback}(".encode("utf-8") + payload + b")"
+    start_response("200 OK", headers)
+    return [payload]
+
+
+def _gunzip(pieces: Iterable[bytes], callback: str | None):
+    """Yield the decompressed pieces, wrapped within the JSONP callback."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pieces = iter(pieces)
+    try:
+        # Start the pieces first, so that closing them releases what they hold
+        first = next(pieces, b"")
+        if callback is not None:
+            yield f"{callback}(".encode("utf-8")
+        yield decompressor.decompress(first)
+        for piece in pieces:
+            yield decompressor.decompress(piece)
+        yield decompressor.flush()
+        if callback is not None:
+            yield b")"
+    finally:
+        if hasattr(pieces, "close"):
+            pieces.close()
+
+
+def respond_stream(
+    environ: dict,
+    start_response: Callable,
+    pieces: Iterable[bytes],
+    headers: list,
+    callback: str | None = None,
+) -> Iterable[bytes]:
+    """Start the response for the pieces of a gzip compressed payload.
+
+    Like ``respond``, but the pieces are sent as they are produced and
+    decompressed one at a time when needed.  Only a list of pieces, as
+    ``RevalidatingCache.stream`` returns for cached values, is given a
+    ``Content-Length``.
+    """
+    headers = [*headers, VARY]
+    if callback is None and accepts_gzip(environ):
+        headers.append(("Content-Encoding", "gzip"))
+        if isinstance(pieces, list):
+            size = sum(len(piece) for piece in pieces)
+            headers.append(("Content-Length", str(size)))
+        start_response("200 OK", headers)
+        return pieces
+    start_response("200 OK", headers)
+    return _gunzip(pieces, callback)
@@ -0,0 +1,339 @@
+"""Nightly archive backing single day shapefile downloads.
+
+Most shapefile downloads are for a single date, yet the HUC12 geometry
+parts of the shapefile never change between dates.  So the ``.shp``,
+``.shx`` and ``.prj`` files, along with the static HUC12 attributes, are
+written once within ``{ARCHIVE_DIR}/static/{stamp}/``, with ``stamp``
+being a hash of their content and recorded in ``{ARCHIVE_DIR}/CURRENT``.
+Each date's results are a small columnar ``.npz`` file within
+``{ARCHIVE_DIR}/daily/{YYYY}/{YYYYMMDD}.npz``, so that a download only needs
+to write the ``.dbf`` and ``.csv`` files.  Each date's file also holds a
+version of its results, the row count and the sum of each column, which is
+checked against the database on access, so that reprocessed dates fall back
+to the database until they are archived again.
+
+The archive is refreshed by running this module nightly after the model
+run, which defaults to the seven days ending with ``last_date_0``::
+
+    python -m depbackend.dailyarchive [YYYY-MM-DD [YYYY-MM-DD]]
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from dailyerosion.reference import KG_M2_TO_TON_ACRE
+from pyiem.database import get_sqlalchemy_conn, sql_helper
+from pyiem.util import logger
+from sqlalchemy.engine import Connection
+
+from depbackend.aggregate import COLUMNS
+from depbackend.cache import get_last_date
+from depbackend.geometry import get_huc12_geometries
+from depbackend.shpwriter import CPG, get_prj, write_dbf, write_shp
+
+LOG = logger()
+ARCHIVE_DIR = "/mnt/dep/cache/shapefile"
+BASENAME = "idepv2"
+STATIC_COLUMNS = ["name", "dominant_tillage", "avg_slope_ratio"]
+# stamp -> (static attributes, version label, geometry parts)
+_STATIC: dict[str, tuple] = {}
+
+
+def get_attributes(
+    hucs: pd.DataFrame, obs: pd.DataFrame, version: str, conv: str
+) -> pd.DataFrame:
+    """Build the shapefile attribute table.
+
+    Args:
+        hucs: HUC12 attributes indexed by huc12_id
+        obs: period sums indexed by huc12_id, see ``aggregate.COLUMNS``
+        version: the scenario's dep_version_label
+        conv: metric or english units
+
+    Returns:
+        frame with upper case column names, in the order of ``hucs``.
+    """
+    obs = obs.reindex(hucs.index).fillna(0)
+    df = pd.DataFrame(
+        {
+            "huc12_id": hucs.index,
+            "name": hucs["name"],
+            "tillcode": hucs["dominant_tillage"],
+            "avg_slp1": hucs["avg_slope_ratio"],
+            "prec_mm": obs["qc_precip_mm"],
+            "los_kgm2": obs["avg_loss_kgm2"],
+            "runof_mm": obs["avg_runoff_mm"],
+            "deli_kgm": obs["avg_delivery_kgm2"],
+            "version": version,
+        }
+    ).reset_index(drop=True)
+    if conv == "english":
+        df["prec_in"] = df["prec_mm"] / 25.4
+        df["loss_tpa"] = df["los_kgm2"] * KG_M2_TO_TON_ACRE
+        df["runof_in"] = df["runof_mm"] / 25.4
+        df["deli_tpa"] = df["deli_kgm"] * KG_M2_TO_TON_ACRE
+        df = df.drop(columns=["prec_mm", "los_kgm2", "runof_mm", "deli_kgm"])
+    df.columns = [col.upper() for col in df.columns]
+    return df
+
+
+def get_version_label(conn: Connection) -> str:
+    """Return the scenario 0 dep_version_label."""
+    return conn.execute(
+        sql_helper(
+            "SELECT dep_version_label from scenario where scenario_id = 0"
+        )
+    ).fetchone()[0]
+
+
+def _dayfn(archive_dir: str, dt: date) -> str:
+    """Where this date's results live."""
+    return os.path.join(archive_dir, "daily", f"{dt:%Y}", f"{dt:%Y%m%d}.npz")
+
+
+def _write_atomic(path: str, payload: bytes):
+    """Write the file, so that readers never see a partial one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), delete=False
+    ) as fh:
+        fh.write(payload)
+    os.replace(fh.name, path)
+
+
+def _npz_bytes(**arrays) -> bytes:
+    """Serialize the arrays as an .npz file."""
+    with tempfile.TemporaryFile() as fh:
+        np.savez(fh, **arrays)
+        fh.seek(0)
+        return fh.read()
+
+
+def write_static(conn: Connection, archive_dir: str = ARCHIVE_DIR) -> str:
+    """Write the geometry parts and static attributes, if they changed.
+
+    Returns:
+        the stamp of the current static files
+    """
+    hucs = get_huc12_geometries(conn, 0)
+    shp, shx = write_shp(hucs["geom"].values)
+    attributes = {
+        "huc12_id": hucs.index.to_numpy(),
+        "version": np.array(get_version_label(conn)),
+        "name": hucs["name"].fillna("").to_numpy(dtype=str),
+        "dominant_tillage": hucs["dominant_tillage"]
+        .fillna("")
+        .to_numpy(dtype=str),
+        "avg_slope_ratio": hucs["avg_slope_ratio"].to_numpy(dtype=float),
+    }
+    files = {
+        f"{BASENAME}.shp": shp,
+        f"{BASENAME}.shx": shx,
+        f"{BASENAME}.prj": get_prj(),
+    }
+    # The .npz has timestamps, so hash its arrays instead
+    digest = hashlib.sha256()
+    for payload in files.values():
+        digest.update(payload)
+    for arr in attributes.values():
+        digest.update(arr.tobytes())
+    stamp = digest.hexdigest()[:16]
+    files["attributes.npz"] = _npz_bytes(**attributes)
+    staticdir = os.path.join(archive_dir, "static")
+    if not os.path.isdir(os.path.join(staticdir, stamp)):
+        LOG.info("Writing static files %s", stamp)
+        os.makedirs(staticdir, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=staticdir)
+        for name, payload in files.items():
+            with open(os.path.join(tmpdir, name), "wb") as fh:
+                fh.write(payload)
+        os.chmod(tmpdir, 0o755)
+        os.rename(tmpdir, os.path.join(staticdir, stamp))
+    _write_atomic(os.path.join(archive_dir, "CURRENT"), stamp.encode())
+    # Remove what is no longer current
+    for name in os.listdir(staticdir):
+        if name != stamp:
+            shutil.rmtree(os.path.join(staticdir, name), ignore_errors=True)
+    return stamp
+
+
+def get_daily_sums(conn: Connection, sdate: date, edate: date):
+    """Sum the results by date and huc12_id, like ``get_period_sums``.
+
+    The ``row_count`` column counts the rows summed, see ``get_day_version``.
+    """
+    cols = ", ".join(f"sum({col}) as {col}" for col in COLUMNS)
+    df = pd.read_sql(
+        sql_helper(
+            "SELECT valid, huc12_id, count(*) as row_count, {cols} "
+            "from water_results_by_huc12 "
+            "WHERE scenario_id = 0 and valid >= :sts and valid <= :ets "
+            "GROUP by valid, huc12_id ORDER by valid, huc12_id",
+            cols=cols,
+        ),
+        conn,
+        params={"sts": sdate, "ets": edate},
+    )
+    df["valid"] = pd.to_datetime(df["valid"]).dt.date
+    return df
+
+
+def _day_version(day: pd.DataFrame) -> np.ndarray:
+    """The version of a date's ``get_daily_sums`` results."""
+    return np.array(
+        [day["row_count"].sum(), *(day[col].sum() for col in COLUMNS)],
+        dtype=float,
+    )
+
+
+def get_day_version(conn: Connection, dt: date) -> np.ndarray:
+    """Return the version of this date's results within the database.
+
+    This is the count of rows followed by the sum of each of ``COLUMNS``,
+    which changes when the date's results are reprocessed.
+    """
+    cols = ", ".join(f"coalesce(sum({col}), 0)" for col in COLUMNS)
+    row = conn.execute(
+        sql_helper(
+            "SELECT count(*), {cols} from water_results_by_huc12 "
+            "WHERE scenario_id = 0 and valid = :dt",
+            cols=cols,
+        ),
+        {"dt": dt},
+    ).fetchone()
+    return np.array(row, dtype=float)
+
+
+def write_days(
+    conn: Connection, sdate: date, edate: date, archive_dir=ARCHIVE_DIR
+):
+    """Write the inclusive dates' results, one query per year."""
+    while sdate <= edate:
+        ets = min(edate, date(sdate.year, 12, 31))
+        LOG.info("Writing days %s through %s", sdate, ets)
+        df = get_daily_sums(conn, sdate, ets)
+        groups = dict(tuple(df.groupby("valid")))
+        for offset in range((ets - sdate).days + 1):
+            dt = sdate + timedelta(days=offset)
+            day = groups.get(dt, df.iloc[:0])
+            _write_atomic(
+                _dayfn(archive_dir, dt),
+                _npz_bytes(
+                    version=_day_version(day),
+                    huc12_id=day["huc12_id"].to_numpy(),
+                    **{col: day[col].to_numpy(dtype=float) for col in COLUMNS},
+                ),
+            )
+        sdate = ets + timedelta(days=1)
+
+
+def load_static(archive_dir: str = ARCHIVE_DIR) -> tuple | None:
+    """Load the current static files, cached per process.
+
+    Returns:
+        static attributes indexed by huc12_id, the version label and the
+        geometry parts keyed by suffix, or None when there is no archive.
+    """
+    try:
+        with open(os.path.join(archive_dir, "CURRENT")) as fh:
+            stamp = fh.read().strip()
+        if stamp in _STATIC:
+            return _STATIC[stamp]
+        staticdir = os.path.join(archive_dir, "static", stamp)
+        parts = {}
+        for suffix in ["shp", "shx", "prj"]:
+            with open(
+                os.path.join(staticdir, f"{BASENAME}.{suffix}"), "rb"
+            ) as fh:
+                parts[suffix] = fh.read()
+        with np.load(os.path.join(staticdir, "attributes.npz")) as npz:
+            hucs = pd.DataFrame(
+                {col: npz[col] for col in STATIC_COLUMNS},
+                index=pd.Index(npz["huc12_id"], name="huc12_id"),
+            )
+            version = str(npz["version"])
+    except (OSError, KeyError, ValueError) as exp:
+        LOG.info("Daily archive unavailable: %s", exp)
+        return None
+    _STATIC.clear()
+    _STATIC[stamp] = (hucs, version, parts)
+    return _STATIC[stamp]
+
+
+def load_day(
+    conn: Connection, dt: date, archive_dir: str = ARCHIVE_DIR
+) -> pd.DataFrame | None:
+    """Load this date's results indexed by huc12_id, if archived.
+
+    Returns:
+        the results, or None when the date is not archived or its results
+        changed since, as the archived version tells.
+    """
+    try:
+        with np.load(_dayfn(archive_dir, dt)) as npz:
+            version = npz["version"]
+            obs = pd.DataFrame(
+                {col: npz[col] for col in COLUMNS},
+                index=pd.Index(npz["huc12_id"], name="huc12_id"),
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+    current = get_day_version(conn, dt)
+    # Sums of the same values may differ in the last bits
+    if version.shape != current.shape or not np.allclose(
+        version, current, rtol=1e-9, atol=0
+    ):
+        LOG.info("Archived %s is outdated, %s != %s", dt, version, current)
+        return None
+    return obs
+
+
+def get_day_members(
+    conn: Connection, dt: date, conv: str, archive_dir: str = ARCHIVE_DIR
+):
+    """Return the shapefile zip members for this date from the archive.
+
+    Returns:
+        list of (name, payload) or None, when the date is not archived or
+        its archived results are outdated.
+    """
+    static = load_static(archive_dir)
+    if static is None:
+        return None
+    obs = load_day(conn, dt, archive_dir)
+    if obs is None:
+        return None
+    hucs, version, parts = static
+    df = get_attributes(hucs, obs, version, conv)
+    basefn = f"{BASENAME}_{dt:%Y%m%d}"
+    return [
+        (f"{basefn}.prj", parts["prj"]),
+        (f"{basefn}.shp", parts["shp"]),
+        (f"{basefn}.shx", parts["shx"]),
+        (f"{basefn}.dbf", write_dbf(df)),
+        (f"{basefn}.cpg", CPG),
+        (f"{basefn}.csv", df.to_csv(index=False)),
+    ]
+
+
+def main(argv):
+    """Go Main Go."""
+    with get_sqlalchemy_conn("dep") as conn:
+        write_static(conn)
+        if len(argv) > 1:
+            sdate = date.fromisoformat(argv[1])
+            edate = date.fromisoformat(argv[2]) if len(argv) > 2 else sdate
+        else:
+            edate = date.fromisoformat(get_last_date(conn, 0))
+            sdate = edate - timedelta(days=6)
+        write_days(conn, sdate, edate)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
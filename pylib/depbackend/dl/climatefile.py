@@ -4,9 +4,20 @@ This service emits a climate file usable by WEPP, WEPS, or NTT.  This file
 is provided for the nearest point to the provided latitude and longitude
 pair.
 
+Many points can be requested at once by providing ``points`` instead of
+``lat`` and ``lon``, either on the URL or as the ``points`` field of a form
+POST, with each point being a ``lon,lat`` pair separated by semicolons or
+newlines.  A header line is ignored.  The response is then a zip file with
+one climate file per unique nearest file in the requested format, along
+with a ``points.csv`` manifest relating each point to its file.  Up to
+5000 points can be provided and ``intensity`` is not supported in this
+mode.
+
 Changelog
 ---------
 
+- 2026-10-18: Added ``points`` batch mode returning a zip file.
+
 - 2026-06-26: Added output format support for WEPS.
 - 2025-12-08: Allow release of files from all current domains.
 - 2025-08-28: Emit climate files for the Europe domain when requested.
@@ -20,16 +31,22 @@ compatable format.
 https://mesonet-dep.agron.iastate.edu/dl/climatefile.py?\
 lat=35.5&lon=-97.5&format=weps
 
+Provide a zip file of the WEPP climate files nearest to three points.
+
+https://mesonet-dep.agron.iastate.edu/dl/climatefile.py?\
+points=-93.5,42.0;-93.6,42.1;-97.5,35.5
+
 
 """
 
 import os
 from io import StringIO
+from pathlib import Path
 from typing import Annotated
 
+import numpy as np
 import pandas as pd
-from dailyerosion.io.wepp import read_cli
-from pydantic import Field
+from pydantic import Field, field_validator, model_validator
 from pyiem.database import get_sqlalchemy_conn, sql_helper
 from pyiem.exceptions import NoDataFound
 from pyiem.iemre import get_domain
@@ -37,18 +54,35 @@ from pyiem.util import logger
 from pyiem.webutil import CGIModel, ListOrCSVType, iemapp
 from sqlalchemy.engine import Connection
 
+from depbackend.climate import get_climate_file_index, read_cli_cached
+from depbackend.points import check_points, parse_points
+from depbackend.requestlog import BufferedWriter
+from depbackend.streaming import file_response, stream_zip
+from depbackend.workers import pool_map
+
 LOG = logger()
+MAX_POINTS = 5000
 
 
 class Schema(CGIModel):
     """See how we are called."""
 
     lat: Annotated[
-        float, Field(description="Latitude of point", ge=-90, le=90)
-    ]
+        float | None, Field(description="Latitude of point", ge=-90, le=90)
+    ] = None
     lon: Annotated[
-        float, Field(description="Longitude of point", ge=-180, le=180)
-    ]
+        float | None,
+        Field(description="Longitude of point", ge=-180, le=180),
+    ] = None
+    points: Annotated[
+        list[tuple[float, float]] | None,
+        Field(
+            description=(
+                "lon,lat pairs separated by semicolons or newlines, "
+                "returning a zip file of climate files"
+            ),
+        ),
+    ] = None
     format: Annotated[
         str,
         Field(
@@ -72,59 +106,196 @@ class Schema(CGIModel):
         ),
     ] = 0
 
+    @field_validator("points", mode="before")
+    @classmethod
+    def parse_points(cls, value):
+        """Parse the lon,lat pairs."""
+        return parse_points(value)
 
-def log_request(
-    conn: Connection, environ: dict, fn: str, distance: float, scenario: int
-):
-    """Log this request"""
-    conn.execute(
-        sql_helper("""
+    @model_validator(mode="after")
+    def check_points(self):
+        """Ensure we have a point or points."""
+        if self.points is None:
+            if self.lat is None or self.lon is None:
+                raise ValueError("Either lat and lon or points is required")
+            return self
+        check_points(self.points, MAX_POINTS)
+        if self.intensity:
+            raise ValueError("intensity is not supported with points")
+        return self
+
+
+def get_dbname(lon: float, lat: float) -> str | None:
+    """Which database holds the climate files for this point."""
+    domain = get_domain(lon, lat)
+    if domain is None:
+        return None
+    return "dep" if domain == "conus" else f"dep_{domain}"
+
+
+def write_requests(dbname: str, records: list[dict]):
+    """Insert a batch of request log records with one statement."""
+    with get_sqlalchemy_conn(dbname) as conn:
+        conn.execute(
+            sql_helper("""
 INSERT into climate_file_requests(client_addr, geom, climate_file_id,
-distance_degrees) VALUES (:addr, ST_Point(:lon, :lat, 4326),
-(select climate_file_id from climate_file
- where scenario_id = :scenario and filepath = :fn),
-:dist)
+distance_degrees)
+SELECT addr, ST_Point(lon, lat, 4326), climate_file_id, dist
+from unnest(CAST(:addr AS text[]), CAST(:lon AS float8[]),
+CAST(:lat AS float8[]), CAST(:climate_file_id AS int[]),
+CAST(:dist AS float8[])) as t(addr, lon, lat, climate_file_id, dist)
 """),
+            {
+                col: [record[col] for record in records]
+                for col in ["addr", "lon", "lat", "climate_file_id", "dist"]
+            },
+        )
+        conn.commit()
+
+
+REQUEST_LOG = BufferedWriter(write_requests)
+
+
+def log_request(
+    dbname: str,
+    environ: dict,
+    climate_file_id: int,
+    distance: float,
+    lon: float | None = None,
+    lat: float | None = None,
+):
+    """Queue this request to be logged, defaulting to the query point."""
+    REQUEST_LOG.add(
+        dbname,
         {
-            "lon": environ["lon"],
-            "lat": environ["lat"],
-            "fn": fn,
+            "lon": environ["lon"] if lon is None else lon,
+            "lat": environ["lat"] if lat is None else lat,
+            "climate_file_id": climate_file_id,
             "dist": distance,
             "addr": environ.get("REMOTE_ADDR"),
-            "scenario": scenario,
         },
     )
-    conn.commit()
-
-
-def find_closest_file(conn: Connection, query: Schema) -> tuple:
-    """Find the closest climate file to the given point."""
-    res = conn.execute(
-        sql_helper("""
-select filepath, st_distance(geom, ST_Point(:lon, :lat, 4326)) as distance
-from climate_file where scenario_id = :scenario and
-ST_Contains(ST_MakeEnvelope(:west, :south, :east, :north, 4326), geom)
-order by geom <-> ST_Point(:lon, :lat, 4326) asc limit 1
-                """),
+
+
+def find_closest_file(conn: Connection, dbname: str, query: Schema) -> tuple:
+    """Find the closest climate file within a degree of the given point.
+
+    Returns:
+        climate_file_id, filepath and distance [degrees], or Nones.
+    """
+    index = get_climate_file_index(conn, dbname, query.scenario)
+    return index.nearest(query.lon, query.lat)
+
+
+def resolve_points(points: list, scenario: int) -> pd.DataFrame:
+    """Find the nearest climate file for each of the points.
+
+    Points are grouped by database, so each database's climate file index is
+    only fetched once.
+
+    Returns:
+        frame with ``lon``, ``lat``, ``dbname``, ``climate_file_id``,
+        ``filepath`` and ``distance`` columns, in the order of the points,
+        with the latter three being null for points without a file.
+    """
+    df = pd.DataFrame(points, columns=["lon", "lat"])
+    df["dbname"] = [get_dbname(lon, lat) for lon, lat in points]
+    df["climate_file_id"] = None
+    df["filepath"] = None
+    df["distance"] = np.nan
+    for dbname, gdf in df[df["dbname"].notna()].groupby("dbname"):
+        with get_sqlalchemy_conn(dbname) as conn:
+            index = get_climate_file_index(conn, dbname, scenario)
+        for idx, row in gdf.iterrows():
+            df.loc[idx, ["climate_file_id", "filepath", "distance"]] = (
+                index.nearest(row["lon"], row["lat"])
+            )
+    return df
+
+
+def get_download_name(fn: str, fmt: str) -> str:
+    """The filename a climate file is provided as."""
+    dlfn = os.path.basename(fn)
+    if fmt == "ntt":
+        dlfn = dlfn[:-4].replace(".", "_") + ".wth"
+    return dlfn
+
+
+def batch_members(df: pd.DataFrame, fmt: str):
+    """Yield the zip members for the resolved points.
+
+    The unique files are converted in parallel, with the manifest coming
+    last to relate each point to its file.  WEPP files are given as paths,
+    so they are copied into the zip in blocks.
+    """
+    files = df["filepath"].dropna().unique().tolist()
+    if fmt == "wepp":
+        payloads = map(Path, files)
+    else:
+        func = convert_to_ntt if fmt == "ntt" else convert_to_weps
+        payloads = pool_map(func, files)
+    for fn, payload in zip(files, payloads, strict=True):
+        yield get_download_name(fn, fmt), payload
+    manifest = pd.DataFrame(
         {
-            "lon": query.lon,
-            "lat": query.lat,
-            "west": query.lon - 1,
-            "south": query.lat - 1,
-            "east": query.lon + 1,
-            "north": query.lat + 1,
-            "scenario": query.scenario,
-        },
+            "lon": df["lon"],
+            "lat": df["lat"],
+            "filename": df["filepath"].map(
+                lambda fn: get_download_name(fn, fmt), na_action="ignore"
+            ),
+            "distance_degrees": df["distance"],
+        }
     )
-    if res.rowcount == 0:
-        return None, None
-    row = res.first()
-    return row[0], row[1]
+    yield "points.csv", manifest.to_csv(index=False, float_format="%.4f")
+
+
+def batch_application(environ, start_response, query: Schema):
+    """Provide a zip file of the climate files nearest to the points."""
+    df = resolve_points(query.points, query.scenario)
+    if df["filepath"].isna().all():
+        raise NoDataFound("No climate files found for the provided points")
+    missing = [fn for fn in df["filepath"].dropna() if not os.path.isfile(fn)]
+    if missing:
+        raise NoDataFound(
+            f"Database found a file `{missing[0]}` that does not exist"
+        )
+    if query.format == "wepp":
+        for _idx, row in df[df["filepath"].notna()].iterrows():
+            log_request(
+                row["dbname"],
+                environ,
+                row["climate_file_id"],
+                row["distance"],
+                lon=row["lon"],
+                lat=row["lat"],
+            )
+    headers = [
+        ("Content-type", "application/zip"),
+        (
+            "Content-Disposition",
+            f"attachment; filename=dep_climate_{query.format}.zip",
+        ),
+    ]
+    start_response("200 OK", headers)
+    return stream_zip(batch_members(df, query.format))
+
+
+def format_rows(template: str, columns: list) -> str:
+    """Format equal length columns into one line each with the template.
+
+    The columns are interleaved and formatted with a single ``%`` operation
+    over the repeated template, so there is no per-day Python loop and the
+    output is identical to formatting each row by itself.
+    """
+    if len(columns[0]) == 0:
+        return ""
+    values = np.column_stack(columns).astype(float).ravel().tolist()
+    return (template * len(columns[0])) % tuple(values)
 
 
 def convert_to_weps(clifn: str) -> str:
     """Read and convert the clifn to a format WEPS likes."""
-    dailydf = read_cli(clifn)
+    dailydf = read_cli_cached(clifn)
     with open(clifn) as fh:
         headerlines = []
         for linenum, line in enumerate(fh):
@@ -145,51 +316,75 @@ def convert_to_weps(clifn: str) -> str:
         "              (mm)  (h)               "
         "(C)   (C) (l/d) (m/s)(Deg)   (C)\n"
     )
-    sio = StringIO()
-    sio.write("".join(headerlines))
-    for dt, row in dailydf.iterrows():
-        tpeak = 0.0
-        duration = 0.0
-        if row["pcpn"] > 0:
-            # Approximate until dailyerosion computes this
-            tpeak = 0.5
-            # Will add this in dailyerosion, but estimating for now
-            duration = max(1.0, min(12.0, row["pcpn"] / (row["maxr"] * 4.0)))
-        sio.write(
-            f" {dt.strftime('%-2d %-2m %Y')} {row['pcpn']:5.1f} "
-            f"{duration:5.2f}  "
-            f"{tpeak:.2f} {row['maxr']:5.1f} "
-            f"{row['tmax']:5.1f} {row['tmin']:5.1f}   {row['rad']:3.0f}"
-            f"{row['wvl']:5.1f} {row['wdir']:5.1f} {row['tdew']:5.1f}"
-            "\n"
-        )
+    pcpn = dailydf["pcpn"].to_numpy()
+    maxr = dailydf["maxr"].to_numpy()
+    wet = pcpn > 0
+    # Approximate until dailyerosion computes this
+    tpeak = np.where(wet, 0.5, 0.0)
+    # Will add this in dailyerosion, but estimating for now
+    with np.errstate(divide="ignore", invalid="ignore"):
+        duration = pcpn / (maxr * 4.0)
+    duration = np.where(
+        wet, np.where(np.isnan(duration), 12.0, duration.clip(1, 12)), 0.0
+    )
+    body = format_rows(
+        " %2d %2d %d %5.1f %5.2f  %.2f %5.1f %5.1f %5.1f   %3.0f"
+        "%5.1f %5.1f %5.1f\n",
+        [
+            dailydf.index.day,
+            dailydf.index.month,
+            dailydf.index.year,
+            pcpn,
+            duration,
+            tpeak,
+            maxr,
+            dailydf["tmax"],
+            dailydf["tmin"],
+            dailydf["rad"],
+            dailydf["wvl"],
+            dailydf["wdir"],
+            dailydf["tdew"],
+        ],
+    )
+    return "".join(headerlines) + body
 
-    return sio.getvalue()
+
+def convert_to_ntt(clifn: str) -> str:
+    """Read and convert the clifn to the NTT weather format."""
+    df = read_cli_cached(clifn)
+    return format_rows(
+        "  %d %2d %2d  %3.0f%6.1f %6.1f %6.2f\r\n",
+        [
+            df.index.year,
+            df.index.month,
+            df.index.day,
+            # Convert langleys to MJ
+            df["rad"] * 0.04184,
+            df["tmax"],
+            df["tmin"],
+            df["pcpn"],
+        ],
+    )
 
 
 @iemapp(help=__doc__, schema=Schema)
 def application(environ, start_response):
     """Go Main Go."""
     query: Schema = environ["_cgimodel_schema"]
-    scenario = environ["scenario"]
-    domain = get_domain(query.lon, query.lat)
-    if domain is None:
+    if query.points is not None:
+        return batch_application(environ, start_response, query)
+    dbname = get_dbname(query.lon, query.lat)
+    if dbname is None:
         raise NoDataFound("Point is outside of our domain")
-    dbname = "dep" if domain == "conus" else f"dep_{domain}"
     with get_sqlalchemy_conn(dbname) as conn:
-        fn, distance = find_closest_file(conn, query)
+        climate_file_id, fn, distance = find_closest_file(conn, dbname, query)
         if fn is None:
             raise NoDataFound("No climate files found in our database")
-        if query.format == "wepp":
-            # Log this request
-            try:
-                log_request(conn, environ, fn, distance, scenario)
-            except Exception as exp:
-                LOG.exception(exp)
+    if query.format == "wepp":
+        # Log this request
+        log_request(dbname, environ, climate_file_id, distance)
 
-    dlfn = os.path.basename(fn)
-    if query.format == "ntt":
-        dlfn = dlfn[:-4].replace(".", "_") + ".wth"
+    dlfn = get_download_name(fn, query.format)
     headers = [
         ("Content-type", "application/octet-stream"),
         ("Content-Disposition", f"attachment; filename={dlfn}"),
@@ -199,10 +394,9 @@ def application(environ, start_response):
         start_response("200 OK", headers)
         return payload
 
-    start_response("200 OK", headers)
     if query.intensity:
         levels = [int(x) for x in query.intensity]
-        df = read_cli(fn, compute_intensity_over=levels)
+        df = read_cli_cached(fn, levels)
         df.index.name = "date"
         df = df.loc[: pd.Timestamp("now")]
         df = df[df["pcpn"] > 0]
@@ -211,23 +405,13 @@ def application(environ, start_response):
             "pcpn",
         ] + [f"i{x}_mm" for x in levels]
         df[cols].to_csv(sio, float_format="%.2f")
+        start_response("200 OK", headers)
         return sio.getvalue()
 
     if not os.path.isfile(fn):
         raise NoDataFound(f"Database found a file `{fn}` that does not exist")
     if query.format == "wepp":
-        with open(fn, "rb") as fh:
-            payload = fh.read()
-    elif query.format == "ntt":
-        df = read_cli(fn)
-        payload = StringIO()
-        # Convert langleys to MJ
-        df["rad"] = df["rad"] * 0.04184
-        for dt, row in df.iterrows():
-            payload.write(
-                f"  {dt.strftime('%Y %-2m %-2d')}  {row['rad']:3.0f}"
-                f"{row['tmax']:6.1f} {row['tmin']:6.1f} {row['pcpn']:6.2f}"
-                "\r\n"
-            )
-        payload = payload.getvalue()
+        return file_response(environ, start_response, fn, filename=dlfn)
+    payload = convert_to_ntt(fn)
+    start_response("200 OK", headers)
     return payload
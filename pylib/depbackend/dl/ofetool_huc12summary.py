@@ -10,6 +10,8 @@ from pydantic import Field
 from pyiem.util import logger
 from pyiem.webutil import CGIModel, iemapp
 
+from depbackend.streaming import file_response
+
 LOG = logger()
 
 
@@ -35,10 +37,6 @@ def application(environ, start_response):
         headers = [("Content-type", "text/plain")]
         start_response("404 Not Found", headers)
         return [b"ERROR: No data found for given HUC12"]
-    headers = [
-        ("Content-type", "application/octet-stream"),
-        ("Content-Disposition", f"attachment; filename={fn.split('/')[-1]}"),
-    ]
-    start_response("200 OK", headers)
-    with open(fn, "rb") as fh:
-        return fh.read()
+    return file_response(
+        environ, start_response, fn, filename=fn.split("/")[-1]
+    )
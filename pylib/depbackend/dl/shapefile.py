@@ -1,6 +1,10 @@
 """.. title:: Download IDEP Shapefile
 
-Emits a zip file containing a shapefile of the IDEP HUC12
+Emits a zip file containing a shapefile of the IDEP HUC12.  Alternatively,
+``format=gpkg`` emits a GeoPackage and ``format=fgb`` a FlatGeobuf file,
+which are quicker to write and read for large requests.  Single day
+shapefiles for all states are assembled from a nightly archive, when
+available.
 
 Example Requests
 ----------------
@@ -9,20 +13,36 @@ Get the results for 1 Jul 2025
 
 https://mesonet-dep.agron.iastate.edu/dl/shapefile.py?dt=2025-07-01
 
+Get the results for 2024 as a GeoPackage
+
+https://mesonet-dep.agron.iastate.edu/dl/shapefile.py?\
+dt=2024-01-01&dt2=2024-12-31&format=gpkg
+
 """
 
 import datetime
-import tempfile
-import zipfile
 from collections.abc import Callable
+from io import BytesIO
 
 from geopandas import GeoDataFrame
-from dailyerosion.reference import KG_M2_TO_TON_ACRE
 from pydantic import Field
-from pyiem.database import get_sqlalchemy_conn, sql_helper
+from pyiem.database import get_sqlalchemy_conn
 from pyiem.webutil import CGIModel, ListOrCSVType, iemapp
 
-PRJFILE = "/opt/iem/data/gis/meta/5070.prj"
+from depbackend.aggregate import get_period_sums
+from depbackend.dailyarchive import (
+    get_attributes,
+    get_day_members,
+    get_version_label,
+)
+from depbackend.geometry import filter_states, get_huc12_geometries
+from depbackend.shpwriter import get_prj, write_shapefile
+from depbackend.streaming import stream_zip
+
+FORMATS = {
+    "gpkg": ("GPKG", "application/geopackage+sqlite3"),
+    "fgb": ("FlatGeobuf", "application/octet-stream"),
+}
 
 
 class Schema(CGIModel):
@@ -34,89 +54,73 @@ class Schema(CGIModel):
         None, description="Optional comma delimited states"
     )
     conv: str = Field("metric", description="Output units, metric or english")
+    format: str = Field(
+        "shp",
+        description="Output format, shp (zipped), gpkg or fgb",
+        pattern=r"^(shp|gpkg|fgb)$",
+    )
+
 
+def shapefile_members(df: GeoDataFrame, basefn: str):
+    """Yield the zip members, only writing each part as it is needed."""
+    yield f"{basefn}.prj", get_prj()
+    for suffix, payload in write_shapefile(df).items():
+        yield f"{basefn}.{suffix}", payload
+    yield f"{basefn}.csv", df.drop(columns="geo").to_csv(index=False)
 
-def workflow(start_response: Callable, dt, dt2, states, conv):
+
+def workflow(start_response: Callable, dt, dt2, states, conv, fmt):
     """Generate for a given date"""
-    dextra = "valid = :dt"
-    params = {"dt": dt}
-    if dt2 is not None:
-        dextra = "valid >= :dt and valid <= :dt2"
-        params["dt2"] = dt2
-    statelimit = ""
-    if states:
-        _s = [f" states ~* '{a[:2]}' " for a in states]
-        statelimit = " and (" + " or ".join(_s) + " ) "
-    with get_sqlalchemy_conn("dep") as conn:
-        df = GeoDataFrame.from_postgis(
-            sql_helper(
-                """
-            with data as (
-                SELECT simple_geom, huc12_id,
-                huc12_code, name, dominant_tillage,
-                avg_slope_ratio, s.dep_version_label as version
-                from huc12 h, scenario s
-                WHERE h.scenario_id = 0 and s.scenario_id = 0
-                {statelimit}),
-            obs as (
-                SELECT huc12_id,
-                sum(coalesce(avg_loss_kgm2, 0)) as avg_loss,
-                sum(coalesce(avg_delivery_kgm2, 0)) as avg_delivery,
-                sum(coalesce(qc_precip_mm, 0)) as qc_precip,
-                sum(coalesce(avg_runoff_mm, 0)) as avg_runoff
-                from water_results_by_huc12 WHERE {dextra} and scenario_id = 0
-                GROUP by huc12_id)
-
-            SELECT d.simple_geom as geo, d.huc12_id, d.name,
-            d.dominant_tillage as tillcode,
-            d.avg_slope_ratio as avg_slp1,
-            coalesce(o.qc_precip, 0) as prec_mm,
-            coalesce(o.avg_loss, 0) as los_kgm2,
-            coalesce(o.avg_runoff, 0) as runof_mm,
-            coalesce(o.avg_delivery, 0) as deli_kgm,
-            d.version
-            from data d LEFT JOIN obs o ON (d.huc12_id = o.huc12_id)
-        """,
-                statelimit=statelimit,
-                dextra=dextra,
+    members = None
+    if fmt == "shp" and not states and dt2 is None:
+        with get_sqlalchemy_conn("dep") as conn:
+            members = get_day_members(conn, dt, conv)
+    if members is not None:
+        headers = [
+            ("Content-type", "application/octet-stream"),
+            (
+                "Content-Disposition",
+                f"attachment; filename=idepv2_{dt:%Y%m%d}.zip",
             ),
+        ]
+        start_response("200 OK", headers)
+        return stream_zip(members)
+    with get_sqlalchemy_conn("dep") as conn:
+        hucs = get_huc12_geometries(conn, 0)
+        if states:
+            hucs = filter_states(hucs, [a[:2] for a in states])
+        version = get_version_label(conn)
+        obs = get_period_sums(
             conn,
-            params=params,
-            geom_col="geo",
+            0,
+            dt,
+            dt if dt2 is None else dt2,
+            hucs.index.tolist() if states else None,
         )
-    if conv == "english":
-        df["prec_in"] = df["prec_mm"] / 25.4
-        df["loss_tpa"] = df["los_kgm2"] * KG_M2_TO_TON_ACRE
-        df["runof_in"] = df["runof_mm"] / 25.4
-        df["deli_tpa"] = df["deli_kgm"] * KG_M2_TO_TON_ACRE
-        df = df.drop(columns=["prec_mm", "los_kgm2", "runof_mm", "deli_kgm"])
-
-    with tempfile.TemporaryDirectory() as tempdir:
-        basefn = f"idepv2_{dt:%Y%m%d}"
-        if dt2:
-            basefn += dt2.strftime("_%Y%m%d")
-        fn = f"{tempdir}/{basefn}"
-        df.columns = [
-            s.upper() if s != "geo" else s for s in df.columns.values
+    df = GeoDataFrame(
+        get_attributes(hucs, obs, version, conv),
+        geometry=hucs["geom"].values,
+    ).rename_geometry("geo")
+
+    basefn = f"idepv2_{dt:%Y%m%d}"
+    if dt2:
+        basefn += dt2.strftime("_%Y%m%d")
+    if fmt in FORMATS:
+        driver, content_type = FORMATS[fmt]
+        bio = BytesIO()
+        df.to_file(bio, driver=driver, layer=basefn, engine="pyogrio")
+        headers = [
+            ("Content-type", content_type),
+            ("Content-Disposition", f"attachment; filename={basefn}.{fmt}"),
         ]
-        df.to_file(f"{fn}.shp")
-        df.drop(columns="geo").to_csv(f"{fn}.csv", index=False)
-        zfn = f"{fn}.zip"
-        with zipfile.ZipFile(zfn, "w", zipfile.ZIP_DEFLATED) as zfp:
-            with open(PRJFILE, encoding="ascii") as fh:
-                zfp.writestr(f"{basefn}.prj", fh.read())
-            for suffix in ["shp", "shx", "dbf", "csv"]:
-                zfp.write(f"{fn}.{suffix}", f"{basefn}.{suffix}")
-
-        with open(zfn, "rb") as fh:
-            res = fh.read()
+        start_response("200 OK", headers)
+        return [bio.getvalue()]
     headers = [
         ("Content-type", "application/octet-stream"),
         ("Content-Disposition", f"attachment; filename={basefn}.zip"),
     ]
     start_response("200 OK", headers)
-
-    return res
+    return stream_zip(shapefile_members(df, basefn))
 
 
 @iemapp(help=__doc__, schema=Schema)
@@ -126,4 +130,4 @@ def application(environ, start_response: Callable):
     dt2 = environ["dt2"]
     states = environ["states"]
     conv = environ["conv"]
-    return [workflow(start_response, dt, dt2, states, conv)]
+    return workflow(start_response, dt, dt2, states, conv, environ["format"])
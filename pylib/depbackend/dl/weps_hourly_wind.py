@@ -7,9 +7,21 @@ for the current year so to have serially complete data for the current year.
 
 The file will contain data from 2007 to the current date's year.
 
+Many files can be requested at once by providing either a ``bbox`` of
+``west,south,east,north`` degrees or ``points`` instead of ``lat`` and
+``lon``.  Points are ``lon,lat`` pairs separated by semicolons or newlines
+and can be sent as the ``points`` field of a form POST, with a header line
+being ignored.  The
+response is then a zip file with one wind file per unique grid cell, along
+with a ``manifest.csv`` relating each point, or each grid cell center for a
+``bbox``, to its IEMRE grid id and file.  At most 2500 grid cells or points
+can be requested.
+
 Changelog
 ---------
 
+- 2026-10-18: Added ``bbox`` and ``points`` region modes returning a zip.
+
 - 2026-06-05: Initial sevice release
 
 Example Requests
@@ -19,43 +31,174 @@ Provide the wind file for a point in Iowa:
 
 https://mesonet-dep.agron.iastate.edu/dl/weps_hourly_wind.py?lat=42.0&lon=-93.0
 
+Provide a zip file of the wind files covering Story County, Iowa:
+
+https://mesonet-dep.agron.iastate.edu/dl/weps_hourly_wind.py?\
+bbox=-93.70,41.86,-93.23,42.21
+
 """
 
 from pathlib import Path
 from typing import Annotated
 
-from pydantic import Field
+import numpy as np
+import pandas as pd
+from pydantic import Field, field_validator, model_validator
 from pyiem.exceptions import NoDataFound
-from pyiem.iemre import get_gid, get_domain
+from pyiem.iemre import get_domain, get_gid
 from pyiem.util import logger
 from pyiem.webutil import CGIModel, iemapp
 
+from depbackend.points import (
+    check_points,
+    get_bbox_gids,
+    get_gids,
+    parse_points,
+)
+from depbackend.streaming import file_response, stream_zip
+
 LOG = logger()
+MAX_CELLS = 2500
 
 
 class Schema(CGIModel):
     """See how we are called."""
 
     lat: Annotated[
-        float,
+        float | None,
         Field(description="Latitude of point, degrees North", ge=-90, le=90),
-    ]
+    ] = None
     lon: Annotated[
-        float,
+        float | None,
         Field(description="Longitude of point, degrees East", ge=-180, le=180),
+    ] = None
+    bbox: Annotated[
+        tuple[float, float, float, float] | None,
+        Field(
+            description=(
+                "west,south,east,north bounding box, returning a zip file of "
+                "wind files"
+            ),
+        ),
+    ] = None
+    points: Annotated[
+        list[tuple[float, float]] | None,
+        Field(
+            description=(
+                "lon,lat pairs separated by semicolons or newlines, "
+                "returning a zip file of wind files"
+            ),
+        ),
+    ] = None
+
+    @field_validator("bbox", mode="before")
+    @classmethod
+    def parse_bbox(cls, value):
+        """Parse the comma delimited bounds."""
+        if isinstance(value, str):
+            return [float(x) for x in value.split(",")]
+        return value
+
+    @field_validator("points", mode="before")
+    @classmethod
+    def parse_points(cls, value):
+        """Parse the lon,lat pairs."""
+        return parse_points(value)
+
+    @model_validator(mode="after")
+    def check_region(self):
+        """Ensure we have exactly one of a point, bbox or points."""
+        modes = [
+            self.lat is not None and self.lon is not None,
+            self.bbox is not None,
+            self.points is not None,
+        ]
+        if sum(modes) != 1:
+            raise ValueError(
+                "Provide one of lat and lon, bbox or points, but not both"
+            )
+        if self.points is not None:
+            check_points(self.points, MAX_CELLS)
+        if self.bbox is not None:
+            west, south, east, north = self.bbox
+            if west >= east or south >= north:
+                raise ValueError("bbox must be west,south,east,north")
+        return self
+
+
+def get_wind_path(gid: int) -> Path:
+    """Where the wind file for this IEMRE grid id lives."""
+    padded_gid = f"{gid:06.0f}"
+    return Path(f"/i/0/wind/{padded_gid[:3]}/{padded_gid}.win")
+
+
+def get_region_manifest(query: Schema) -> pd.DataFrame:
+    """Map the bbox or points to IEMRE grid ids and wind files.
+
+    Returns:
+        frame with ``lon``, ``lat``, ``gid`` and ``filename`` columns, with
+        ``gid`` being -1 and ``filename`` null for points outside CONUS and
+        ``filename`` null when there is no wind file.
+    """
+    if query.bbox is not None:
+        gids, lons, lats = get_bbox_gids(*query.bbox)
+        if len(gids) > MAX_CELLS:
+            raise NoDataFound(
+                f"bbox covers {len(gids)} grid cells, at most {MAX_CELLS} "
+                "are supported"
+            )
+    else:
+        lons, lats = np.array(query.points, dtype=float).T
+        gids = get_gids(lons, lats)
+    paths = {gid: get_wind_path(gid) for gid in np.unique(gids) if gid >= 0}
+    exists = {gid: path.is_file() for gid, path in paths.items()}
+    return pd.DataFrame(
+        {
+            "lon": lons,
+            "lat": lats,
+            "gid": gids,
+            "filename": [
+                paths[gid].name if exists.get(gid) else None for gid in gids
+            ],
+        }
+    )
+
+
+def region_members(manifest: pd.DataFrame):
+    """Yield the zip members, streaming each unique wind file from disk."""
+    for gid in manifest.loc[manifest["filename"].notna(), "gid"].unique():
+        path = get_wind_path(gid)
+        yield path.name, path
+    yield "manifest.csv", manifest.to_csv(index=False, float_format="%.4f")
+
+
+def region_application(environ, start_response, query: Schema):
+    """Provide a zip file of the wind files for the bbox or points."""
+    manifest = get_region_manifest(query)
+    if manifest["filename"].isna().all():
+        raise NoDataFound("Sorry, no wind files found for this region")
+    headers = [
+        ("Content-type", "application/zip"),
+        (
+            "Content-Disposition",
+            "attachment; filename=weps_hourly_wind.zip",
+        ),
     ]
+    start_response("200 OK", headers)
+    return stream_zip(region_members(manifest))
 
 
 @iemapp(help=__doc__, schema=Schema)
 def application(environ, start_response):
     """Go Main Go."""
     query: Schema = environ["_cgimodel_schema"]
+    if query.lat is None:
+        return region_application(environ, start_response, query)
     # Ensure that our domain matches the reality
     if (domain := get_domain(query.lon, query.lat)) != "conus":
         raise NoDataFound("Sorry, only CONUS data is supported at the moment")
     gid = get_gid(query.lon, query.lat, domain)
-    padded_gid = f"{gid:06.0f}"
-    fn = Path(f"/i/0/wind/{padded_gid[:3]}/{padded_gid}.win")
+    fn = get_wind_path(gid)
     if not fn.is_file():
         raise NoDataFound(
             f"Sorry, no data found for {query.lon:.2f}E {query.lat:.2f}N, "
@@ -68,12 +211,4 @@ def application(environ, start_response):
         "weps_hourly_wind_"
         f"{abs(query.lon):.2f}{lonstr}_{abs(query.lat):.2f}{latstr}.win"
     )
-
-    headers = [
-        ("Content-type", "application/octet-stream"),
-        ("Content-Disposition", f"attachment; filename={dlfn}"),
-    ]
-    start_response("200 OK", headers)
-    with open(fn, "rb") as fh:
-        payload = fh.read()
-    return payload
+    return file_response(environ, start_response, str(fn), filename=dlfn)
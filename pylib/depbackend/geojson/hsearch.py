@@ -1,11 +1,15 @@
 """.. title:: DEP HUC12 Search by Name or ID
 
 Returns at most 10 results for a fuzzy name search or based on the HUC12 ID
-provided.  Sadly, this service does not actually emit GeoJSON.
+provided.  HUC12 IDs starting with the query come first, followed by names
+ranked by how they start with and are similar to the query.  Sadly, this
+service does not actually emit GeoJSON.
 
 Changelog
 ---------
 
+- 2026-10-18: Results are ranked and the query is no longer treated as a
+  regular expression.
 - 14 Nov 2025: The search now checks against the HUC12 ID.
 
 """
@@ -13,9 +17,10 @@ Changelog
 import json
 
 from pydantic import Field
-from pyiem.database import get_sqlalchemy_conn, sql_helper
 from pyiem.webutil import CGIModel, iemapp
 
+from depbackend.search import get_search_index
+
 
 class Schema(CGIModel):
     """See how we are called."""
@@ -25,20 +30,7 @@ class Schema(CGIModel):
 
 def search(q):
     """Search for q"""
-    d = dict(results=[])
-    with get_sqlalchemy_conn("dep") as conn:
-        res = conn.execute(
-            sql_helper(
-                """SELECT huc12_code, name from huc12
-                WHERE (name ~* :name or strpos(huc12_code, :name) = 1)
-                and scenario_id = 0 LIMIT 10"""
-            ),
-            {"name": q},
-        )
-        for row in res:
-            d["results"].append(dict(huc_12=row[0], name=row[1]))
-
-    return d
+    return {"results": get_search_index().search(q)}
 
 
 @iemapp(help=__doc__, schema=Schema)
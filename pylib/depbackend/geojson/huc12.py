@@ -5,6 +5,7 @@ Changelog
 
 - 2026-03-10: Added validation that the `domain` parameter needs to be
   a two character state code.
+- 2026-10-18: Responses are gzip compressed for clients accepting it.
 
 Example Requests
 ----------------
@@ -20,13 +21,19 @@ from typing import Annotated
 
 # needed for Decimal formatting to work
 import simplejson as json
-from dailyerosion.reference import KG_M2_TO_TON_ACRE, RAMPS
+from dailyerosion.reference import RAMPS
 from pydantic import Field
 from pyiem.database import get_sqlalchemy_conn, sql_helper
 from pyiem.util import logger, utc
 from pyiem.webutil import CGIModel, iemapp
 
+from depbackend.aggregate import english_numeric, get_period_sums
+from depbackend.cache import MemcacheCache, RevalidatingCache
+from depbackend.compression import gzip_stream, respond_stream
+from depbackend.geometry import filter_states, get_huc12_geometries
+
 LOG = logger()
+CACHE = RevalidatingCache(MemcacheCache(), ttl=3600, stale=3600)
 
 
 class Schema(CGIModel):
@@ -45,21 +52,57 @@ class Schema(CGIModel):
     ] = None
 
 
+def stream_featurecollection(
+    header: dict, footer: dict, hucs, obs, chunksize: int = 65536
+):
+    """Yield the FeatureCollection JSON text in chunks.
+
+    The output matches ``json.dumps`` of the equivalent dictionary, but the
+    already encoded ``geojson`` text of each HUC12 is spliced in as is and
+    ``max_values`` is computed as the features are written, so only one
+    chunk is held in memory at a time.
+
+    Args:
+        header: the properties preceding ``features``.
+        footer: the properties following ``features``, before the
+          ``max_values`` that are appended.
+        hucs: frame with ``huc12_code`` and ``geojson`` columns.
+        obs: frame aligned to hucs with the ``avg_loss``, ``qc_precip``,
+          ``avg_delivery`` and ``avg_runoff`` columns.
+    """
+    keys = ["avg_loss", "qc_precip", "avg_delivery", "avg_runoff"]
+    maxes = dict.fromkeys(keys, 0)
+    buf = [json.dumps(header)[:-1], ', "features": [']
+    size = 0
+    rows = zip(
+        hucs["huc12_code"],
+        hucs["geojson"],
+        obs[keys].itertuples(index=False),
+        strict=True,
+    )
+    for i, (huc12, geojson, row) in enumerate(rows):
+        props = dict(huc_12=huc12)
+        for key, val in zip(keys, row, strict=True):
+            props[key] = val
+            if i == 0 or val > maxes[key]:
+                maxes[key] = val
+        feature = json.dumps(dict(type="Feature", id=huc12, properties=props))
+        buf.append(
+            f'{", " if i else ""}{feature[:-1]}, "geometry": {geojson}}}'
+        )
+        size += len(buf[-1])
+        if size >= chunksize:
+            yield "".join(buf)
+            buf = []
+            size = 0
+    buf.append("], ")
+    buf.append(json.dumps({**footer, "max_values": maxes})[1:])
+    yield "".join(buf)
+
+
 def do(ts, ts2, domain):
     """Do work"""
     utcnow = utc()
-    dextra = "valid = :date"
-    params = {
-        "date": ts,
-        "date2": ts2,
-        "factor": KG_M2_TO_TON_ACRE,
-    }
-    if ts2 is not None:
-        dextra = "valid >= :date and valid <= :date2"
-    domainextra = ""
-    if domain is not None:
-        domainextra = " and states ~* :state "
-        params["state"] = domain
     with get_sqlalchemy_conn("dep") as conn:
         # Get version label
         res = conn.execute(
@@ -68,86 +111,40 @@ def do(ts, ts2, domain):
             )
         )
         dep_version_label = res.fetchone()[0]
-        res = conn.execute(
-            sql_helper(
-                """
-            WITH data as (
-                SELECT ST_asGeoJson(ST_Transform(simple_geom, 4326), 4) as g,
-                huc12_id, huc12_code
-                from huc12 WHERE scenario_id = 0 {domainextra}),
-            obs as (
-                SELECT huc12_id,
-                sum(coalesce(avg_loss_kgm2, 0)) * :factor as avg_loss,
-                sum(coalesce(avg_delivery_kgm2, 0)) * :factor as avg_delivery,
-                sum(coalesce(qc_precip_mm, 0)) / 25.4 as qc_precip,
-                sum(coalesce(avg_runoff_mm, 0)) / 25.4 as avg_runoff
-                from water_results_by_huc12 WHERE {dextra}
-                and scenario_id = 0 GROUP by huc12_id)
-
-            SELECT d.g, d.huc12_code,
-            coalesce(round(o.avg_loss::numeric, 2), 0),
-            coalesce(round(o.qc_precip::numeric, 2), 0),
-            coalesce(round(o.avg_delivery::numeric, 2), 0),
-            coalesce(round(o.avg_runoff::numeric, 2), 0)
-            from data d LEFT JOIN obs o ON (d.huc12_id = o.huc12_id)
-        """,
-                domainextra=domainextra,
-                dextra=dextra,
-            ),
-            params,
+        hucs = get_huc12_geometries(conn, 0)
+        if domain is not None:
+            hucs = filter_states(hucs, [domain])
+        obs = get_period_sums(
+            conn,
+            0,
+            ts,
+            ts if ts2 is None else ts2,
+            None if domain is None else hucs.index.tolist(),
         )
-        data = {
-            "type": "FeatureCollection",
-            "dep_version_label": dep_version_label,
-            "date": ts.strftime("%Y-%m-%d"),
-            "date2": None if ts2 is None else ts2.strftime("%Y-%m-%d"),
-            "features": [],
-            "generation_time": utcnow.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "count": res.rowcount,
-        }
-        avg_loss = []
-        qc_precip = []
-        avg_delivery = []
-        avg_runoff = []
-        for row in res:
-            avg_loss.append(row[2])
-            qc_precip.append(row[3])
-            avg_delivery.append(row[4])
-            avg_runoff.append(row[5])
-            data["features"].append(
-                dict(
-                    type="Feature",
-                    id=row[1],
-                    properties=dict(
-                        huc_12=row[1],
-                        avg_loss=row[2],
-                        qc_precip=row[3],
-                        avg_delivery=row[4],
-                        avg_runoff=row[5],
-                    ),
-                    geometry=json.loads(row[0]),
-                )
-            )
+    obs = english_numeric(obs, hucs.index)
+    header = {
+        "type": "FeatureCollection",
+        "dep_version_label": dep_version_label,
+        "date": ts.strftime("%Y-%m-%d"),
+        "date2": None if ts2 is None else ts2.strftime("%Y-%m-%d"),
+    }
     myramp = RAMPS["english"][0]
     if ts2 is not None:
         days = (ts2 - ts).days
         myramp = RAMPS["english"][1]
         if days > 31:
             myramp = RAMPS["english"][2]
-
-    data["jenks"] = dict(
-        avg_loss=myramp,
-        qc_precip=myramp,
-        avg_delivery=myramp,
-        avg_runoff=myramp,
-    )
-    data["max_values"] = dict(
-        avg_loss=0 if not avg_loss else max(avg_loss),
-        qc_precip=0 if not qc_precip else max(qc_precip),
-        avg_delivery=0 if not avg_delivery else max(avg_delivery),
-        avg_runoff=0 if not avg_runoff else max(avg_runoff),
-    )
-    return json.dumps(data)
+    footer = {
+        "generation_time": utcnow.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "count": len(hucs.index),
+        "jenks": dict(
+            avg_loss=myramp,
+            qc_precip=myramp,
+            avg_delivery=myramp,
+            avg_runoff=myramp,
+        ),
+    }
+    return stream_featurecollection(header, footer, hucs, obs)
 
 
 def get_mckey(environ):
@@ -157,21 +154,24 @@ def get_mckey(environ):
     domain = environ["domain"]
     tkey = "" if ts2 is None else ts2.strftime("%Y%m%d")
     dkey = "" if domain is None else domain
-    return f"/geojson/huc12/{ts:%Y%m%d}/{tkey}/{dkey}"
+    return f"/geojson/huc12.gz/{ts:%Y%m%d}/{tkey}/{dkey}"
 
 
 @iemapp(
     content_type="application/vnd.geo+json",
-    memcachekey=get_mckey,
     help=__doc__,
     schema=Schema,
 )
 def application(environ, start_response):
     """Do Fun things"""
-    domain = environ["domain"]
-    ts = environ["date"]
-    ts2 = environ["date2"]
-    payload = do(ts, ts2, domain)
-    start_response("200 OK", [("Content-Type", "application/vnd.geo+json")])
-
-    return payload
+    # On a miss, the chunks are streamed as they are compressed and cached
+    pieces = CACHE.stream(
+        get_mckey(environ),
+        lambda: gzip_stream(
+            do(environ["date"], environ["date2"], environ["domain"])
+        ),
+    )
+    headers = [("Content-Type", "application/vnd.geo+json")]
+    return respond_stream(
+        environ, start_response, pieces, headers, environ["callback"]
+    )
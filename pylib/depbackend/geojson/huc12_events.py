@@ -1,18 +1,48 @@
-"""GeoJSON service for HUC12 data"""
+"""GeoJSON service for HUC12 data.
+
+Changelog
+---------
+
+- 2026-10-18: Added a `monthly` mode and the optional `sdate` and `edate`
+  parameters limiting the results to an inclusive date window.  Responses
+  are now cached until the next model day lands.
+
+Example Requests
+----------------
+
+Provide the monthly DEP results for a HUC12 during 2024
+
+https://mesonet-dep.agron.iastate.edu/geojson/huc12_events.py?\
+huc12=102300070211&mode=monthly&sdate=2024-01-01&edate=2024-12-31
+"""
 
 import json
+from datetime import date
 from io import BytesIO
 from typing import Annotated
 
 import pandas as pd
 from dailyerosion.reference import KG_M2_TO_TON_ACRE
 from pydantic import Field
-from pyiem.database import get_sqlalchemy_conn
+from pyiem.database import get_sqlalchemy_conn, sql_helper
 from pyiem.util import utc
 from pyiem.webutil import CGIModel, iemapp
-from pymemcache.client import Client
+from sqlalchemy.engine import Connection
+
+from depbackend.aggregate import COLUMNS
+from depbackend.cache import MemcacheCache, get_last_date
 
 EXL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Keys include last_date_0, so entries only need to outlive a model day
+MEMCACHE = MemcacheCache(expire=2 * 86400)
+# Output column -> (daily column, multiplier)
+VARIABLES = {
+    "avg_loss": ("avg_loss_kgm2", KG_M2_TO_TON_ACRE),
+    "avg_delivery": ("avg_delivery_kgm2", KG_M2_TO_TON_ACRE),
+    "qc_precip": ("qc_precip_mm", 1 / 25.4),
+    "avg_runoff": ("avg_runoff_mm", 1 / 25.4),
+}
+PERIODS = {"monthly": "M", "yearly": "Y"}
 
 
 class Schema(CGIModel):
@@ -27,102 +57,140 @@ class Schema(CGIModel):
     mode: Annotated[
         str,
         Field(
-            description="daily or yearly summary", pattern=r"^(daily|yearly)$"
+            description="daily, monthly or yearly summary",
+            pattern=r"^(daily|monthly|yearly)$",
         ),
     ] = "daily"
     format: Annotated[
         str, Field(description="json or xlsx", pattern=r"^(json|xlsx)$")
     ] = "json"
+    sdate: Annotated[
+        date | None,
+        Field(description="Optional inclusive start date of the results"),
+    ] = None
+    edate: Annotated[
+        date | None,
+        Field(description="Optional inclusive end date of the results"),
+    ] = None
 
 
-def do(huc12: str, mode: str, fmt: str):
-    """Do work"""
-    utcnow = utc()
+def get_daily(
+    conn: Connection,
+    huc12: str,
+    sdate: date | None = None,
+    edate: date | None = None,
+) -> pd.DataFrame:
+    """Fetch the HUC12's daily results within the optional date window."""
+    params = {"huc12": huc12}
+    limiter = ""
+    if sdate is not None:
+        limiter += " and valid >= :sdate "
+        params["sdate"] = sdate
+    if edate is not None:
+        limiter += " and valid <= :edate "
+        params["edate"] = edate
+    df = pd.read_sql(
+        sql_helper(
+            "SELECT valid, {cols} from water_results_by_huc12 "
+            "WHERE huc12_id = get_huc12_id(:huc12, 0) and scenario_id = 0 "
+            "{limiter} ORDER by valid ASC",
+            cols=", ".join(COLUMNS),
+            limiter=limiter,
+        ),
+        conn,
+        params=params,
+    )
+    df["valid"] = pd.to_datetime(df["valid"])
+    return df
+
+
+def summarize(daily: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Convert the daily results into the service's columns.
+
+    Each variable is in inches or tons per acre, with its ``_events`` column
+    counting the days with a positive value, which is 1 for daily rows.
+    """
     if mode == "daily":
-        with get_sqlalchemy_conn("dep") as conn:
-            df = pd.read_sql(
-                """
-                SELECT valid,
-                avg_loss_kgm2 * %s as avg_loss,
-                avg_delivery_kgm2 * %s as avg_delivery,
-                qc_precip_mm / 25.4 as qc_precip,
-                avg_runoff_mm / 25.4 as avg_runoff,
-                1 as avg_loss_events,
-                1 as avg_delivery_events,
-                1 as qc_precip_events,
-                1 as avg_runoff_events
-                from water_results_by_huc12
-                where huc12_id = get_huc12_id(%s, 0) and scenario_id = 0
-                ORDER by valid ASC
-            """,
-                conn,
-                params=(KG_M2_TO_TON_ACRE, KG_M2_TO_TON_ACRE, huc12),
-                index_col=None,
-            )
+        df = pd.DataFrame({"valid": daily["valid"]})
+        for col, (src, mul) in VARIABLES.items():
+            df[col] = daily[src] * mul
+            df[f"{col}_events"] = 1
+        return df.reset_index(drop=True)
+    key = daily["valid"].dt.to_period(PERIODS[mode])
+    sums = daily[COLUMNS].groupby(key).sum()
+    events = (daily[COLUMNS] > 0).groupby(key).sum()
+    df = pd.DataFrame({"valid": sums.index.to_timestamp()})
+    for col, (src, mul) in VARIABLES.items():
+        df[col] = sums[src].to_numpy() * mul
+        df[f"{col}_events"] = events[src].to_numpy()
+    return df
+
+
+def to_json(df: pd.DataFrame, huc12: str, generation_time) -> str:
+    """Encode the summary as the service's JSON response."""
+    columns = [col for col in VARIABLES for col in (col, f"{col}_events")]
+    dates = df["valid"].dt.strftime("%Y-%m-%d").tolist()
+    keys = ["date", *columns]
+    values = zip(dates, *(df[col].tolist() for col in columns), strict=True)
+    return json.dumps(
+        {
+            "results": [dict(zip(keys, row, strict=True)) for row in values],
+            "huc12": huc12,
+            "generation_time": generation_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+    )
+
+
+def to_xlsx(df: pd.DataFrame, huc12: str, mode: str) -> bytes:
+    """Encode the summary as an Excel workbook.
+
+    The daily and yearly workbooks keep the columns the service always had,
+    with yearly ones having a ``yr`` column first and the ``valid``
+    timestamp last.
+    """
+    events = [f"{col}_events" for col in VARIABLES]
+    if mode == "daily":
+        # Events are always one for daily output
+        df = df[["valid", *VARIABLES]].assign(valid=df["valid"].dt.date)
+    elif mode == "yearly":
+        df = df[[*VARIABLES, *events, "valid"]]
+        df.insert(0, "yr", df["valid"].dt.year)
     else:
-        with get_sqlalchemy_conn("dep") as conn:
-            df = pd.read_sql(
-                """
-                SELECT extract(year from valid)::int as yr,
-                sum(avg_loss_kgm2) * %s as avg_loss,
-                sum(avg_delivery_kgm2) * %s as avg_delivery,
-                sum(qc_precip_mm) / 25.4 as qc_precip,
-                sum(avg_runoff_mm) / 25.4 as avg_runoff,
-                sum(case when avg_loss_kgm2 > 0 then 1 else 0 end)
-                    as avg_loss_events,
-                sum(case when avg_delivery_kgm2 > 0 then 1 else 0 end)
-                    as avg_delivery_events,
-                sum(case when qc_precip_mm > 0 then 1 else 0 end)
-                    as qc_precip_events,
-                sum(case when avg_runoff_mm > 0 then 1 else 0 end)
-                    as avg_runoff_events
-                from water_results_by_huc12 where
-                huc12_id = get_huc12_id(%s, 0) and scenario_id = 0
-                GROUP by yr ORDER by yr ASC
-            """,
-                conn,
-                params=(KG_M2_TO_TON_ACRE, KG_M2_TO_TON_ACRE, huc12),
-                index_col=None,
-            )
-            df["valid"] = pd.to_datetime(df["yr"].astype(str) + "-01-01")
-    if fmt == "xlsx":
-        # Drop unuseful event columns for daily output
-        if mode == "daily":
-            df = df.drop(
-                columns=[
-                    "avg_loss_events",
-                    "avg_delivery_events",
-                    "qc_precip_events",
-                    "avg_runoff_events",
-                ]
-            )
-        bio = BytesIO()
-        # pylint: disable=abstract-class-instantiated
-        writer = pd.ExcelWriter(bio, engine="xlsxwriter")
-        df.to_excel(writer, sheet_name=f"{huc12} Data", index=False)
-        writer.close()
-        return bio.getvalue()
-
-    res = {
-        "results": [],
-        "huc12": huc12,
-        "generation_time": utcnow.strftime("%Y-%m-%dT%H:%M:%SZ"),
-    }
-    for _, row in df.iterrows():
-        res["results"].append(
-            dict(
-                date=row["valid"].strftime("%Y-%m-%d"),
-                avg_loss=row["avg_loss"],
-                avg_loss_events=row["avg_loss_events"],
-                avg_delivery=row["avg_delivery"],
-                avg_delivery_events=row["avg_delivery_events"],
-                qc_precip=row["qc_precip"],
-                qc_precip_events=row["qc_precip_events"],
-                avg_runoff=row["avg_runoff"],
-                avg_runoff_events=row["avg_runoff_events"],
-            )
+        df = df[["valid", *VARIABLES, *events]].assign(
+            valid=df["valid"].dt.date
         )
-    return json.dumps(res)
+    bio = BytesIO()
+    # pylint: disable=abstract-class-instantiated
+    with pd.ExcelWriter(bio, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name=f"{huc12} Data", index=False)
+    return bio.getvalue()
+
+
+def do(
+    conn: Connection,
+    huc12: str,
+    mode: str,
+    fmt: str,
+    sdate: date | None = None,
+    edate: date | None = None,
+) -> bytes:
+    """Do work"""
+    df = summarize(get_daily(conn, huc12, sdate, edate), mode)
+    if fmt == "xlsx":
+        return to_xlsx(df, huc12, mode)
+    return to_json(df, huc12, utc()).encode("utf-8")
+
+
+def get_mckey(environ: dict, last_date: str | None) -> str:
+    """Figure out the memcache key, which changes with last_date_0."""
+    window = "/".join(
+        "" if environ[key] is None else f"{environ[key]:%Y%m%d}"
+        for key in ["sdate", "edate"]
+    )
+    return (
+        f"/geojson/huc12_events/{environ['huc12']}/{environ['mode']}/"
+        f"{environ['format']}/{window}/{last_date}"
+    )
 
 
 @iemapp(help=__doc__, schema=Schema)
@@ -140,20 +208,15 @@ def application(environ, start_response):
             ("Content-Type", EXL),
             ("Content-disposition", f"attachment; Filename=dep{huc12}.xlsx"),
         ]
-    mckey = f"/geojson/huc12_events/{huc12}/{mode}/{fmt}"
-    mc = Client("iem-memcached:11211")
-    res = mc.get(mckey)
-    if res is None:
-        res = do(huc12, mode, fmt)
-        if fmt == "xlsx":
-            mc.close()
-            start_response("200 OK", headers)
-            return [res]
-        mc.set(mckey, res, 15)
-    else:
-        res = res.decode("utf-8")
-    mc.close()
-    if cb is not None:
-        res = f"{cb}({res})"
+    with get_sqlalchemy_conn("dep") as conn:
+        key = get_mckey(environ, get_last_date(conn, 0))
+        res = MEMCACHE.get(key)
+        if res is None:
+            res = do(
+                conn, huc12, mode, fmt, environ["sdate"], environ["edate"]
+            )
+            MEMCACHE.set(key, res)
+    if fmt == "json" and cb is not None:
+        res = f"{cb}(".encode("utf-8") + res + b")"
     start_response("200 OK", headers)
-    return res
+    return [res]
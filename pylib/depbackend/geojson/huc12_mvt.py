@@ -0,0 +1,174 @@
+"""Mapbox Vector Tiles of HUC12 results.
+
+Returns a tile with a ``huc12`` layer of the HUC12s intersecting the given
+``z/x/y`` web mercator tile, with the same ``avg_loss``, ``qc_precip``,
+``avg_delivery`` and ``avg_runoff`` totals as the ``/geojson/huc12.py``
+service.  The geometries are simplified to the tile's resolution.  These
+tiles are also available via ``/geojson/huc12/{z}/{x}/{y}.mvt``.
+
+Example Requests
+----------------
+
+Provide the DEP results for a single day for a tile over central Iowa
+
+https://mesonet-dep.agron.iastate.edu/geojson/huc12_mvt.py?\
+z=7&x=30&y=47&date=2023-01-01
+"""
+
+import math
+from datetime import date as dateobj
+from typing import Annotated
+
+import mapbox_vector_tile
+import shapely
+from pydantic import Field, model_validator
+from pyiem.database import get_sqlalchemy_conn
+from pyiem.webutil import CGIModel, iemapp
+
+from depbackend.aggregate import english_numeric, get_period_sums
+from depbackend.geometry import get_huc12_geometries
+
+# Half the width of the web mercator world [m]
+WORLD = 20037508.342789244
+EXTENT = 4096
+# Tile edge buffer in tile units, so clipped edges are not drawn
+BUFFER = 64
+
+
+class Schema(CGIModel):
+    """See how we are called."""
+
+    z: Annotated[int, Field(description="Tile zoom level", ge=0, le=20)]
+    x: Annotated[int, Field(description="Tile column", ge=0)]
+    y: Annotated[int, Field(description="Tile row", ge=0)]
+    date: Annotated[dateobj, Field(description="Date to query")]
+    date2: Annotated[
+        dateobj | None, Field(description="Optional end date to query")
+    ] = None
+
+    @model_validator(mode="after")
+    def ensure_tile_exists(self):
+        """Ensure the tile is within the zoom level's grid."""
+        if self.x >= 2**self.z or self.y >= 2**self.z:
+            raise ValueError("Tile x and y must be less than 2**z")
+        return self
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, ...]:
+    """Compute the web mercator bounds of the tile."""
+    size = 2 * WORLD / 2**z
+    west = -WORLD + x * size
+    north = WORLD - y * size
+    return west, north - size, west + size, north
+
+
+def mercator_to_lonlat(mx: float, my: float) -> tuple[float, float]:
+    """Convert web mercator coordinates to longitude and latitude."""
+    lon = mx / WORLD * 180.0
+    lat = math.degrees(
+        2 * math.atan(math.exp(my / WORLD * math.pi)) - math.pi / 2
+    )
+    return lon, lat
+
+
+def buffered_bounds(z: int, x: int, y: int) -> tuple[float, ...]:
+    """Compute the tile bounds including the edge buffer."""
+    bounds = tile_bounds(z, x, y)
+    pad = BUFFER / EXTENT * (bounds[2] - bounds[0])
+    return (
+        bounds[0] - pad,
+        bounds[1] - pad,
+        bounds[2] + pad,
+        bounds[3] + pad,
+    )
+
+
+def tile_hucs(hucs, z: int, x: int, y: int):
+    """Select the HUC12s from the store that may intersect the tile."""
+    buffered = buffered_bounds(z, x, y)
+    llbox = shapely.box(
+        *mercator_to_lonlat(*buffered[:2]), *mercator_to_lonlat(*buffered[2:])
+    )
+    return hucs.iloc[hucs["geom_4326"].sindex.query(llbox)]
+
+
+def make_tile(hits, obs, z: int, x: int, y: int) -> bytes:
+    """Encode the tile.
+
+    Args:
+        hits: the HUC12s from ``tile_hucs``.
+        obs: frame indexed by ``huc12_id`` with the result properties.
+        z, x, y: the tile.
+    """
+    bounds = tile_bounds(z, x, y)
+    geoms = shapely.clip_by_rect(
+        shapely.simplify(
+            hits["geom"].to_crs(3857).values,
+            (bounds[2] - bounds[0]) / EXTENT,
+            preserve_topology=True,
+        ),
+        *buffered_bounds(z, x, y),
+    )
+    features = []
+    for huc12_id, huc12, geom, props in zip(
+        hits.index,
+        hits["huc12_code"],
+        geoms,
+        obs.reindex(hits.index).to_dict("records"),
+        strict=True,
+    ):
+        if geom is None or geom.is_empty:
+            continue
+        features.append(
+            {
+                "id": int(huc12_id),
+                "geometry": geom,
+                "properties": {"huc_12": huc12, **props},
+            }
+        )
+    return mapbox_vector_tile.encode(
+        [{"name": "huc12", "features": features}],
+        default_options={"quantize_bounds": bounds, "extents": EXTENT},
+    )
+
+
+def do(z: int, x: int, y: int, ts, ts2) -> bytes:
+    """Do work"""
+    with get_sqlalchemy_conn("dep") as conn:
+        hits = tile_hucs(get_huc12_geometries(conn, 0), z, x, y)
+        obs = get_period_sums(
+            conn, 0, ts, ts if ts2 is None else ts2, hits.index.tolist()
+        )
+    # Rounded like the GeoJSON services, so that the values agree
+    obs = english_numeric(obs, hits.index).astype(float)
+    return make_tile(hits, obs, z, x, y)
+
+
+def get_mckey(environ):
+    """Figure out the memcache key"""
+    tkey = "" if environ["date2"] is None else f"{environ['date2']:%Y%m%d}"
+    return (
+        f"/geojson/huc12_mvt/{environ['z']}/{environ['x']}/{environ['y']}/"
+        f"{environ['date']:%Y%m%d}/{tkey}"
+    )
+
+
+@iemapp(
+    content_type="application/vnd.mapbox-vector-tile",
+    memcachekey=get_mckey,
+    help=__doc__,
+    schema=Schema,
+)
+def application(environ, start_response):
+    """Do Fun things"""
+    payload = do(
+        environ["z"],
+        environ["x"],
+        environ["y"],
+        environ["date"],
+        environ["date2"],
+    )
+    start_response(
+        "200 OK", [("Content-Type", "application/vnd.mapbox-vector-tile")]
+    )
+    return payload
@@ -4,31 +4,34 @@ import geopandas as gpd
 from pyiem.database import get_sqlalchemy_conn
 from pyiem.webutil import iemapp
 
+from depbackend.cache import MemcacheCache, RevalidatingCache
+from depbackend.compression import get_compressed, respond
+from depbackend.geometry import get_huc12_geometries
+
+CACHE = RevalidatingCache(MemcacheCache(), ttl=86400, stale=86400)
+
 
 def do():
     """Do work"""
     with get_sqlalchemy_conn("dep") as conn:
-        df = gpd.read_postgis(
-            """
-            SELECT ST_ReducePrecision(ST_Transform(simple_geom, 4326),
-            0.0001) as geo, dominant_tillage as dt,
-            round(avg_slope_ratio::numeric, 3) as slp,
-            huc12_code, name from huc12 WHERE scenario_id = 0
-            """,
-            conn,
-            index_col="huc12_code",
-            geom_col="geo",
-        )
+        hucs = get_huc12_geometries(conn, 0)
+    df = gpd.GeoDataFrame(
+        {
+            "geo": hucs["geom_4326"],
+            "dt": hucs["dominant_tillage"],
+            "slp": hucs["avg_slope_ratio"].round(3),
+            "name": hucs["name"],
+        },
+        geometry="geo",
+    ).set_index(hucs["huc12_code"])
     return df.to_json()
 
 
-@iemapp(
-    content_type="application/vnd.geo+json",
-    memcachekey="/geojson/huc12.geojson",
-    memcacheexpire=86400,
-)
-def application(_environ, start_response):
+@iemapp(content_type="application/vnd.geo+json")
+def application(environ, start_response):
     """Do Fun things"""
-    payload = do()
-    start_response("200 OK", [("Content-Type", "application/vnd.geo+json")])
-    return payload
+    payload = get_compressed(CACHE, "/geojson/huc12.geojson.gz", do)
+    headers = [("Content-Type", "application/vnd.geo+json")]
+    return respond(
+        environ, start_response, payload, headers, environ.get("callback")
+    )
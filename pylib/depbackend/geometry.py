@@ -0,0 +1,153 @@
+"""Process-wide store of HUC12 geometries.
+
+The HUC12 geometries almost never change, so rather than having each map,
+shapefile and GeoJSON request pull ``simple_geom`` out of PostGIS and
+reproject it, they are loaded once per process for a given
+``huc12_scenario``.  Services then only query their per-request results and
+join them in memory by ``huc12_id``.
+
+The store is reloaded when the number of HUC12s, the max ``huc12_id`` or the
+``huc12_version_{huc12_scenario}`` property changes.  Limiting the HUC12s to
+states uses an inverted index of state abbreviation to rows, built once per
+store frame, rather than matching every HUC12's ``states`` text.
+"""
+
+import weakref
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+import simplejson as json
+from pyiem.database import sql_helper
+from pyiem.reference import EPSG
+from sqlalchemy.engine import Connection
+
+from depbackend.cache import VersionedCache
+
+
+def _probe(conn: Connection, huc12_scenario: int) -> tuple:
+    """Compute a version stamp for the HUC12 table."""
+    res = conn.execute(
+        sql_helper(
+            """
+        SELECT count(*), max(huc12_id),
+        (SELECT value from properties WHERE key = :key)
+        from huc12 WHERE scenario_id = :scenario
+        """
+        ),
+        {"scenario": huc12_scenario, "key": f"huc12_version_{huc12_scenario}"},
+    )
+    return tuple(res.fetchone())
+
+
+def normalize_geojson(text: str) -> str:
+    """Re-encode GeoJSON text the way ``simplejson.dumps`` would.
+
+    This lets services splice the text into their own JSON output and have
+    it match what serializing the parsed geometry would produce.
+    """
+    return json.dumps(json.loads(text))
+
+
+def _load(conn: Connection, huc12_scenario: int) -> gpd.GeoDataFrame:
+    """Load the HUC12 geometries."""
+    df = gpd.read_postgis(
+        sql_helper(
+            """
+        SELECT huc12_id, huc12_code, name, states, dominant_tillage,
+        avg_slope_ratio, simple_geom as geom,
+        ST_AsBinary(ST_ReducePrecision(ST_Transform(simple_geom, 4326),
+            0.0001)) as wkb_4326,
+        ST_asGeoJson(ST_Transform(simple_geom, 4326), 4) as geojson,
+        ST_x(ST_Transform(ST_Centroid(geom), 4326)) as centroid_x,
+        ST_y(ST_Transform(ST_Centroid(geom), 4326)) as centroid_y
+        from huc12 WHERE scenario_id = :scenario ORDER by huc12_id
+        """
+        ),
+        conn,
+        params={"scenario": huc12_scenario},
+        geom_col="geom",
+        index_col="huc12_id",
+    )  # type: ignore
+    df["geojson"] = df["geojson"].map(normalize_geojson)
+    df["geom_4326"] = gpd.GeoSeries(
+        shapely.from_wkb(df.pop("wkb_4326").map(bytes).values),
+        index=df.index,
+        crs=EPSG[4326],
+    )
+    return df
+
+
+_STORE = VersionedCache(_probe, _load)
+# id(frame) -> (weak reference to the frame, state index)
+_STATE_INDEX: dict[int, tuple] = {}
+
+
+def get_huc12_geometries(
+    conn: Connection, huc12_scenario: int = 0
+) -> gpd.GeoDataFrame:
+    """Return the HUC12 GeoDataFrame for this huc12_scenario.
+
+    The frame is indexed by ``huc12_id`` and ordered by it, with ``geom`` in
+    EPSG:5070, ``geom_4326`` in EPSG:4326 rounded to 0.0001 degrees and
+    ``geojson`` being the EPSG:4326 geometry as ``normalize_geojson`` text.
+    This frame is shared, so do not modify it.
+    """
+    return _STORE.get(conn, huc12_scenario)
+
+
+def get_huc12_scenario(conn: Connection, scenario: int) -> int:
+    """Compute the HUC12 scenario that this scenario uses."""
+    res = conn.execute(
+        sql_helper(
+            "select huc12_scenario from scenario where scenario_id = :id"
+        ),
+        {"id": scenario},
+    )
+    return res.fetchone()[0]
+
+
+def build_state_index(states: pd.Series) -> dict[str, np.ndarray]:
+    """Map each upper case state abbreviation to its row positions."""
+    # Indexed by row position, with one row per state token
+    tokens = (
+        pd.Series(states.to_numpy())
+        .fillna("")
+        .str.upper()
+        .str.findall(r"[A-Z]+")
+        .explode()
+        .dropna()
+    )
+    positions = pd.Series(tokens.index.to_numpy(), index=tokens.to_numpy())
+    return {
+        state: np.unique(group.to_numpy())
+        for state, group in positions.groupby(level=0)
+    }
+
+
+def get_state_index(hucs: gpd.GeoDataFrame) -> dict[str, np.ndarray]:
+    """Return the state index for this frame, cached by identity.
+
+    The cache only weakly references the frame and the entry is removed once
+    the frame is freed, such as after the store reloads.
+    """
+    key = id(hucs)
+    entry = _STATE_INDEX.get(key)
+    if entry is None or entry[0]() is not hucs:
+        entry = (weakref.ref(hucs), build_state_index(hucs["states"]))
+        _STATE_INDEX[key] = entry
+        weakref.finalize(hucs, _STATE_INDEX.pop, key, None)
+    return entry[1]
+
+
+def filter_states(
+    hucs: gpd.GeoDataFrame, states: list[str]
+) -> gpd.GeoDataFrame:
+    """Limit the HUC12s to those within any of the state abbreviations."""
+    index = get_state_index(hucs)
+    empty = np.array([], dtype=int)
+    rows = np.unique(
+        np.concatenate([empty] + [index.get(s.upper(), empty) for s in states])
+    )
+    return hucs.iloc[rows]
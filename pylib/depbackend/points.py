@@ -0,0 +1,89 @@
+"""Helpers for services accepting many points in one request.
+
+Points are given as ``lon,lat`` pairs separated by semicolons or newlines,
+so that the contents of a CSV file can be sent as the ``points`` field of
+a form POST, and are mapped to IEMRE grid cells with numpy rather than one
+``get_gid`` call at a time.  A raw ``text/csv`` request body is not read,
+as ``iemapp`` only parses form fields.
+"""
+
+import re
+
+import numpy as np
+from pyiem.iemre import DOMAINS, DX, DY
+
+
+def parse_points(value):
+    """Parse the lon,lat pairs, ignoring a header line.
+
+    Non-string values are returned as is for pydantic to validate.
+    """
+    if not isinstance(value, str):
+        return value
+    lines = [ln.strip() for ln in re.split(r"[;\r\n]+", value)]
+    lines = [ln for ln in lines if ln]
+    # Allow for a CSV header line
+    if lines and not re.match(r"^[\s\d.+-]", lines[0]):
+        lines = lines[1:]
+    res = []
+    for line in lines:
+        tokens = line.replace("\t", ",").split(",")
+        if len(tokens) != 2:
+            raise ValueError(f"Could not parse point `{line}`")
+        res.append((float(tokens[0]), float(tokens[1])))
+    return res
+
+
+def check_points(points: list, max_points: int):
+    """Raise ValueError for an empty, too long or out of range list."""
+    if not points:
+        raise ValueError("No points were provided")
+    if len(points) > max_points:
+        raise ValueError(f"At most {max_points} points are supported")
+    for lon, lat in points:
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise ValueError(f"Point {lon},{lat} is out of range")
+
+
+def get_gids(lons, lats, domain: str = "conus") -> np.ndarray:
+    """Vectorized ``pyiem.iemre.get_gid``, with -1 outside the domain."""
+    dom = DOMAINS[domain]
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    inside = (
+        (lons >= dom["west_edge"])
+        & (lons < dom["east_edge"])
+        & (lats >= dom["south_edge"])
+        & (lats < dom["north_edge"])
+    )
+    i = ((lons - dom["west_edge"]) / DX).astype(int)
+    j = ((lats - dom["south_edge"]) / DY).astype(int)
+    return np.where(inside, j * dom["nx"] + i, -1)
+
+
+def get_bbox_gids(
+    west: float, south: float, east: float, north: float, domain="conus"
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find the grid cells overlapping the bounding box.
+
+    Returns:
+        gids and the longitudes and latitudes of the cell centers.
+    """
+    dom = DOMAINS[domain]
+    i0 = max(int(np.floor((west - dom["west_edge"]) / DX)), 0)
+    i1 = min(int(np.floor((east - dom["west_edge"]) / DX)), dom["nx"] - 1)
+    j0 = max(int(np.floor((south - dom["south_edge"]) / DY)), 0)
+    j1 = min(int(np.floor((north - dom["south_edge"]) / DY)), dom["ny"] - 1)
+    if i1 < i0 or j1 < j0:
+        empty = np.array([], dtype=int)
+        return empty, empty.astype(float), empty.astype(float)
+    jj, ii = np.meshgrid(
+        np.arange(j0, j1 + 1), np.arange(i0, i1 + 1), indexing="ij"
+    )
+    ii = ii.ravel()
+    jj = jj.ravel()
+    return (
+        jj * dom["nx"] + ii,
+        dom["west"] + ii * DX,
+        dom["south"] + jj * DY,
+    )
@@ -0,0 +1,89 @@
+"""Buffered, background writing of request log records.
+
+Writing a log row and committing it within the request path makes every
+download wait on the database.  Instead, records are queued in-process and
+a background thread hands them to the ``write`` callable in bulk, once
+``max_records`` are waiting or ``interval`` seconds have passed, and when
+the process exits.
+"""
+
+import atexit
+import threading
+from collections import defaultdict
+from collections.abc import Callable, Hashable
+
+from pyiem.util import logger
+
+LOG = logger()
+
+
+class BufferedWriter:
+    """Queue records by key and write them in batches from a thread."""
+
+    def __init__(
+        self,
+        write: Callable[[Hashable, list[dict]], None],
+        max_records: int = 100,
+        interval: float = 5.0,
+        max_queued: int = 10000,
+    ):
+        """Constructor.
+
+        Args:
+            write: called with a key and its list of records to write.
+            max_records: queued records triggering an early write.
+            interval: seconds between writes.
+            max_queued: records beyond this are dropped, so that an
+              unavailable database does not exhaust memory.
+        """
+        self.write = write
+        self.max_records = max_records
+        self.interval = interval
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._queued: dict[Hashable, list[dict]] = defaultdict(list)
+        self._count = 0
+        self._thread: threading.Thread | None = None
+
+    def add(self, key: Hashable, record: dict):
+        """Queue a record to be written."""
+        with self._lock:
+            if self._count >= self.max_queued:
+                LOG.warning("BufferedWriter queue is full, dropping record")
+                return
+            self._queued[key].append(record)
+            self._count += 1
+            if self._thread is None:
+                # Started lazily, so not before mod_wsgi forks processes
+                self._thread = threading.Thread(
+                    target=self._run, name="BufferedWriter", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+            if self._count >= self.max_records:
+                self._wake.set()
+
+    def flush(self):
+        """Write everything that is queued."""
+        with self._lock:
+            queued = self._queued
+            self._queued = defaultdict(list)
+            self._count = 0
+        for key, records in queued.items():
+            try:
+                self.write(key, records)
+            except Exception as exp:
+                LOG.warning(
+                    "BufferedWriter failed writing %s records for %s: %s",
+                    len(records),
+                    key,
+                    exp,
+                )
+
+    def _run(self):
+        """Background loop."""
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
@@ -0,0 +1,206 @@
+"""In-process HUC12 search index for autocomplete.
+
+Rather than running a regex over the ``huc12`` table on every keystroke,
+the HUC12 codes and names of the shared geometry store are indexed once per
+store version.  Codes are kept sorted, so a prefix lookup is a binary search
+over what amounts to a flattened trie.  Names are normalized and split into
+``pg_trgm`` style trigrams, with an inverted index of trigram to rows, so
+that a fuzzy name search only scores the names sharing a trigram with the
+query.  Sorted names and word suffixes rank names starting with the query,
+or having a word starting with it, without scanning every name.  Queries
+shorter than a trigram are answered from those sorted ranges alone.
+"""
+
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+from pyiem.database import get_sqlalchemy_conn
+
+from depbackend.geometry import get_huc12_geometries
+
+NONWORD_RE = re.compile(r"[^a-z0-9]+")
+# How often to check if the geometry store has changed
+RECHECK = 60.0
+# The fraction of the query's trigrams a name must have
+MIN_COVERAGE = 0.5
+# Shorter queries only match names, or their words, starting with them
+MIN_FUZZY = 3
+_LOCK = threading.Lock()
+# Keyed by "hucs", "index" and "checked"
+_STATE: dict = {}
+
+
+def normalize(text: str) -> str:
+    """Lower case the text with words separated by single spaces."""
+    return NONWORD_RE.sub(" ", str(text).lower()).strip()
+
+
+def trigrams(text: str, partial: bool = False) -> set[str]:
+    """Compute the ``pg_trgm`` style trigrams of the normalized text.
+
+    Args:
+        text: normalized text
+        partial: the last word is still being typed, so do not pad its end
+    """
+    words = text.split()
+    res = set()
+    for i, word in enumerate(words):
+        padded = (
+            f"  {word}" if partial and i == len(words) - 1 else f"  {word} "
+        )
+        res.update(padded[j : j + 3] for j in range(len(padded) - 2))
+    return res
+
+
+def _prefix_range(values: list[str], prefix: str) -> tuple[int, int]:
+    """The slice of the sorted values starting with the prefix."""
+    return (
+        bisect_left(values, prefix),
+        bisect_left(values, f"{prefix}\U0010ffff"),
+    )
+
+
+class HUC12SearchIndex:
+    """Prefix search over HUC12 codes and fuzzy search over names."""
+
+    def __init__(self, codes, names):
+        """Constructor.
+
+        Args:
+            codes: the huc12_code of each HUC12
+            names: the name of each HUC12, aligned with codes
+        """
+        self.codes = np.asarray(codes, dtype=str)
+        self.names = np.asarray(pd.Series(names).fillna(""), dtype=str)
+        self.normalized = [normalize(name) for name in self.names]
+        self._code_order = np.argsort(self.codes, kind="stable")
+        self._sorted_codes = self.codes[self._code_order].tolist()
+        # Names sorted, with each row's position, for prefix ranges and to
+        # break ties without comparing strings
+        order = np.argsort(np.asarray(self.normalized, dtype=str))
+        self._name_order = order
+        self._sorted_names = [self.normalized[row] for row in order]
+        self._name_rank = np.empty(len(order), dtype=int)
+        self._name_rank[order] = np.arange(len(order))
+        # Sorted suffixes of the names starting at each word
+        suffixes = sorted(
+            (name[match.start() :], row)
+            for row, name in enumerate(self.normalized)
+            for match in re.finditer(r"\S+", name)
+        )
+        self._suffixes = [entry[0] for entry in suffixes]
+        self._suffix_rows = np.array(
+            [entry[1] for entry in suffixes], dtype=int
+        )
+        postings: dict[str, list[int]] = {}
+        sizes = np.zeros(len(self.names), dtype=int)
+        for row, name in enumerate(self.normalized):
+            tris = trigrams(name)
+            sizes[row] = len(tris)
+            for tri in tris:
+                postings.setdefault(tri, []).append(row)
+        self._trigram_counts = sizes
+        self._postings = {
+            tri: np.array(rows, dtype=np.int32)
+            for tri, rows in postings.items()
+        }
+
+    def prefix(self, q: str, limit: int = 10) -> list[int]:
+        """Rows whose code starts with q, ordered by code."""
+        lo, hi = _prefix_range(self._sorted_codes, q)
+        return self._code_order[lo : min(hi, lo + limit)].tolist()
+
+    def starting(self, q: str, limit: int = 10) -> list[int]:
+        """Rows whose name, then a word of it, starts with q, in name order.
+
+        Only as many of the sorted name and word suffix ranges are read as
+        needed for ``limit`` rows.
+        """
+        text = normalize(q)
+        if not text:
+            return []
+        lo, hi = _prefix_range(self._sorted_names, text)
+        rows = self._name_order[lo : min(hi, lo + limit)].tolist()
+        seen = set(rows)
+        slo, shi = _prefix_range(self._suffixes, text)
+        step = 4 * limit
+        for start in range(slo, shi, step):
+            if len(rows) >= limit:
+                break
+            chunk = self._suffix_rows[start : min(shi, start + step)]
+            ranks = self._name_rank[chunk]
+            for row in chunk[(ranks < lo) | (ranks >= hi)].tolist():
+                if row not in seen and len(rows) < limit:
+                    seen.add(row)
+                    rows.append(row)
+        return rows
+
+    def fuzzy(self, q: str, limit: int = 10) -> list[int]:
+        """Rows whose name is most similar to q.
+
+        Names starting with the query come first, then names with a word
+        starting with it, each ranked by trigram similarity.  Queries
+        shorter than ``MIN_FUZZY`` only match those, see ``starting``.
+        """
+        text = normalize(q)
+        if len(text) < MIN_FUZZY:
+            return self.starting(text, limit)
+        tris = trigrams(text, partial=True)
+        need = max(1, math.ceil(MIN_COVERAGE * len(tris)))
+        lists = [self._postings[tri] for tri in tris if tri in self._postings]
+        if len(lists) < need:
+            return []
+        counts = np.bincount(np.concatenate(lists))
+        rows = np.flatnonzero(counts >= need)
+        shared = counts[rows]
+        similarity = shared / (len(tris) + self._trigram_counts[rows] - shared)
+        tier = np.full(len(rows), 2)
+        lo, hi = _prefix_range(self._suffixes, text)
+        tier[np.isin(rows, self._suffix_rows[lo:hi])] = 1
+        ranks = self._name_rank[rows]
+        lo, hi = _prefix_range(self._sorted_names, text)
+        tier[(ranks >= lo) & (ranks < hi)] = 0
+        if len(rows) > limit:
+            # Only sort the candidates that can be within the first limit
+            key = tier - similarity
+            keep = key <= np.partition(key, limit - 1)[limit - 1]
+            rows, ranks = rows[keep], ranks[keep]
+            similarity, tier = similarity[keep], tier[keep]
+        order = np.lexsort((ranks, -similarity, tier))
+        return rows[order[:limit]].tolist()
+
+    def search(self, q: str, limit: int = 10) -> list[dict]:
+        """Code prefix matches, followed by fuzzy name matches."""
+        q = q.strip()
+        rows = self.prefix(q, limit) if q else []
+        if len(rows) < limit:
+            rows += [r for r in self.fuzzy(q, limit) if r not in rows]
+        return [
+            {"huc_12": str(self.codes[row]), "name": str(self.names[row])}
+            for row in rows[:limit]
+        ]
+
+
+def get_search_index() -> HUC12SearchIndex:
+    """Return the index, rebuilt when the geometry store changes.
+
+    The database is consulted at most every ``RECHECK`` seconds.
+    """
+    with _LOCK:
+        now = time.monotonic()
+        if "index" in _STATE and now - _STATE["checked"] < RECHECK:
+            return _STATE["index"]
+        with get_sqlalchemy_conn("dep") as conn:
+            hucs = get_huc12_geometries(conn, 0)
+        if _STATE.get("hucs") is not hucs:
+            _STATE["index"] = HUC12SearchIndex(
+                hucs["huc12_code"], hucs["name"]
+            )
+            _STATE["hucs"] = hucs
+        _STATE["checked"] = now
+        return _STATE["index"]
@@ -0,0 +1,208 @@
+"""In-memory ESRI Shapefile writer for polygon layers.
+
+GDAL can only write shapefiles to disk, so services had to round-trip
+through a temporary directory.  These functions instead produce the
+``.shp``, ``.shx`` and ``.dbf`` bytes directly with numpy, matching what
+GDAL writes for the same GeoDataFrame: clockwise exterior rings, with
+integers as ``N(18,0)``, floats as ``N(24,15)`` and strings as UTF-8
+``C(80)``, widened to fit up to 254 bytes.  The geometry and attribute
+parts are independent, so callers can reuse the former while only writing
+a new ``.dbf``.
+"""
+
+import struct
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import shapely
+
+SHAPE_NULL = 0
+SHAPE_POLYGON = 5
+CPG = b"UTF-8"
+PRJFILE = "/opt/iem/data/gis/meta/5070.prj"
+_PRJ = {}
+
+
+def get_prj() -> bytes:
+    """Return the cached EPSG:5070 .prj file contents."""
+    if "prj" not in _PRJ:
+        with open(PRJFILE, "rb") as fh:
+            _PRJ["prj"] = fh.read()
+    return _PRJ["prj"]
+
+
+def _file_header(length: int, shape_type: int, bounds) -> bytes:
+    """The 100 byte header shared by the .shp and .shx files."""
+    return (
+        struct.pack(">7i", 9994, 0, 0, 0, 0, 0, length // 2)
+        + struct.pack("<2i", 1000, shape_type)
+        + struct.pack("<8d", *bounds, 0, 0, 0, 0)
+    )
+
+
+def write_shp(geoms) -> tuple[bytes, bytes]:
+    """Write the polygons or multipolygons as .shp and .shx bytes.
+
+    Missing or empty geometries are written as null shapes.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    valid = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    oriented = shapely.orient_polygons(geoms[valid], exterior_cw=True)
+    polys, poly_idx = shapely.get_parts(oriented, return_index=True)
+    rings, ring_idx = shapely.get_rings(polys, return_index=True)
+    coords = shapely.get_coordinates(rings)
+    # Feature, in oriented space, of each ring and the counts of each
+    ring_feature = poly_idx[ring_idx]
+    ring_sizes = shapely.get_num_coordinates(rings)
+    nparts = np.bincount(ring_feature, minlength=len(oriented))
+    npoints = np.bincount(
+        ring_feature, weights=ring_sizes, minlength=len(oriented)
+    ).astype(int)
+    part_offsets = np.concatenate([[0], np.cumsum(nparts)])
+    point_offsets = np.concatenate([[0], np.cumsum(npoints)])
+    # Each ring's start relative to its feature's first point
+    ring_starts = np.concatenate([[0], np.cumsum(ring_sizes)[:-1]])
+    ring_starts = ring_starts - point_offsets[ring_feature]
+    bounds = shapely.bounds(oriented)
+
+    # Converted once, with python lists being faster to index per record
+    coords = coords.astype("<f8")
+    ring_starts = ring_starts.astype("<i4")
+    part_offsets = part_offsets.tolist()
+    point_offsets = point_offsets.tolist()
+    bounds_list = bounds.tolist()
+
+    records = []
+    index = []
+    offset = 100
+    vidx = 0
+    for recnum, isvalid in enumerate(valid.tolist(), start=1):
+        if isvalid:
+            p0, p1 = part_offsets[vidx], part_offsets[vidx + 1]
+            c0, c1 = point_offsets[vidx], point_offsets[vidx + 1]
+            content = b"".join(
+                [
+                    struct.pack(
+                        "<i4d2i",
+                        SHAPE_POLYGON,
+                        *bounds_list[vidx],
+                        p1 - p0,
+                        c1 - c0,
+                    ),
+                    ring_starts[p0:p1].tobytes(),
+                    coords[c0:c1].tobytes(),
+                ]
+            )
+            vidx += 1
+        else:
+            content = struct.pack("<i", SHAPE_NULL)
+        records.append(struct.pack(">2i", recnum, len(content) // 2))
+        records.append(content)
+        index.append(struct.pack(">2i", offset // 2, len(content) // 2))
+        offset += 8 + len(content)
+    if len(oriented):
+        total = (
+            bounds[:, 0].min(),
+            bounds[:, 1].min(),
+            bounds[:, 2].max(),
+            bounds[:, 3].max(),
+        )
+    else:
+        total = (0, 0, 0, 0)
+    shp = _file_header(offset, SHAPE_POLYGON, total) + b"".join(records)
+    shx = _file_header(100 + 8 * len(index), SHAPE_POLYGON, total)
+    return shp, shx + b"".join(index)
+
+
+def get_dbf_fields(df: pd.DataFrame) -> list[tuple[str, str, int, int]]:
+    """Compute the GDAL default dBASE field for each column.
+
+    Returns:
+        list of (name, type, width, decimals)
+    """
+    fields = []
+    for name, dtype in df.dtypes.items():
+        if dtype.kind in "biu":
+            fields.append((name, "N", 18, 0))
+        elif dtype.kind == "f":
+            fields.append((name, "N", 24, 15))
+        else:
+            # Like GDAL, strings are widened to fit, up to 254 bytes
+            encoded = df[name].dropna().astype(str).str.encode("utf-8")
+            longest = int(encoded.str.len().max()) if len(encoded) else 0
+            width = min(max(80, longest), 254)
+            fields.append((name, "C", width, 0))
+    return fields
+
+
+def _format_column(values: pd.Series, ftype: str, width: int, decimals):
+    """Format the column into fixed width bytes."""
+    if ftype == "C":
+        text = values.astype(str).where(values.notna(), "").to_numpy()
+        encoded = np.char.encode(text.astype(str), "utf-8")
+        # Truncate to the width, then pad
+        encoded = encoded.astype(f"S{width}")
+        return np.char.ljust(encoded, width)
+    arr = values.to_numpy(dtype=float)
+    finite = np.isfinite(arr)
+    template = f"%{width}.{decimals}f" if decimals else f"%{width}d"
+    out = np.full(len(arr), b"*" * width, dtype=f"S{width}")
+    if finite.any():
+        fvals = arr[finite] if decimals else arr[finite].astype(np.int64)
+        text = np.char.mod(template, fvals).astype(f"S{width + 32}")
+        # Overlong values are truncated, like GDAL does
+        out[finite] = text.astype(f"S{width}")
+    return out
+
+
+def write_dbf(df: pd.DataFrame, fields=None, today: date | None = None):
+    """Write the frame's columns as dBASE III bytes.
+
+    Args:
+        df: attributes, with names up to 10 characters
+        fields: optional (name, type, width, decimals) list, defaulting to
+          ``get_dbf_fields``
+        today: last update date stored in the header
+    """
+    fields = get_dbf_fields(df) if fields is None else fields
+    today = date.today() if today is None else today
+    reclen = 1 + sum(field[2] for field in fields)
+    header = struct.pack(
+        "<4BIHH20x",
+        3,
+        today.year - 1900,
+        today.month,
+        today.day,
+        len(df.index),
+        32 + 32 * len(fields) + 1,
+        reclen,
+    )
+    descriptors = b"".join(
+        struct.pack(
+            "<11sc4xBB14x",
+            name.encode("ascii")[:10],
+            ftype.encode("ascii"),
+            width,
+            decimals,
+        )
+        for name, ftype, width, decimals in fields
+    )
+    # Deletion flag, followed by the fixed width fields
+    rows = np.full(len(df.index), b" ", dtype="S1")
+    for name, ftype, width, decimals in fields:
+        rows = np.char.add(
+            rows, _format_column(df[name], ftype, width, decimals)
+        )
+    return header + descriptors + b"\r" + rows.tobytes() + b"\x1a"
+
+
+def write_shapefile(gdf) -> dict[str, bytes]:
+    """Write the GeoDataFrame as shapefile parts keyed by suffix."""
+    shp, shx = write_shp(gdf.geometry.values)
+    return {
+        "shp": shp,
+        "shx": shx,
+        "dbf": write_dbf(pd.DataFrame(gdf.drop(columns=gdf.geometry.name))),
+        "cpg": CPG,
+    }
@@ -0,0 +1,152 @@
+"""Per-HUC12 index of hill slope bulk slope and length.
+
+Plotting the slope length and steepness of a HUC12's hill slopes only needs
+two numbers from each ``.slp`` file, so rather than parsing hundreds of
+files per request, they are summarized into a small columnar ``.npz`` file
+per HUC12 within ``/i/{scenario}/slp_index/{huc8}/{huc12}.npz``.  An index
+older than its ``/i/{scenario}/slp/{huc8}/{huc4}`` directory or any ``.slp``
+file within it is rebuilt on access.  The indices can be built or refreshed
+offline by running::
+
+    python -m depbackend.slopes <scenario> [--force]
+"""
+
+import glob
+import os
+import re
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from dailyerosion.io.wepp import read_slp
+from pyiem.exceptions import NoDataFound
+from pyiem.util import logger
+
+LOG = logger()
+SLPDIR = "/i/{scenario}/slp/{huc8}/{huc4}"
+INDEXFN = "/i/{scenario}/slp_index/{huc8}/{huc12}.npz"
+HUC12_RE = re.compile(r"^\d{12}$")
+
+
+def _paths(huc12: str, scenario: int) -> tuple[str, str]:
+    """Return the slp directory and index filename for this HUC12."""
+    if not HUC12_RE.match(huc12) or int(scenario) < 0:
+        raise ValueError(f"Invalid huc12 {huc12} or scenario {scenario}")
+    kwargs = {
+        "scenario": scenario,
+        "huc8": huc12[:8],
+        "huc4": huc12[8:],
+        "huc12": huc12,
+    }
+    return SLPDIR.format(**kwargs), INDEXFN.format(**kwargs)
+
+
+def summarize_slopes(slpdir: str) -> pd.DataFrame:
+    """Compute the flowpath, bulk slope and length of each slp file.
+
+    Returns:
+        DataFrame with ``flowpath``, ``bulk_slope`` (rise over run, so
+        negative when descending) and ``length`` [m] columns.  Files that
+        fail to parse are skipped.
+    """
+    rows = []
+    for fn in sorted(glob.glob(os.path.join(slpdir, "*.slp"))):
+        try:
+            slp = read_slp(fn)
+        except Exception:
+            continue
+        stem = os.path.basename(fn)[:-4]
+        fpath = stem.rsplit("_", 1)[-1]
+        length = slp[-1]["x"][-1]
+        rows.append(
+            [
+                int(fpath) if fpath.isdigit() else -1,
+                slp[-1]["y"][-1] / length,
+                length,
+            ]
+        )
+    return pd.DataFrame(
+        rows, columns=["flowpath", "bulk_slope", "length"]
+    ).astype({"flowpath": int, "bulk_slope": float, "length": float})
+
+
+def write_index(df: pd.DataFrame, indexfn: str):
+    """Atomically write the index file."""
+    os.makedirs(os.path.dirname(indexfn), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(indexfn), suffix=".npz", delete=False
+    ) as fh:
+        np.savez(fh, **{col: df[col].to_numpy() for col in df.columns})
+    os.replace(fh.name, indexfn)
+
+
+def read_index(indexfn: str) -> pd.DataFrame:
+    """Read the index file."""
+    with np.load(indexfn) as npz:
+        return pd.DataFrame({col: npz[col] for col in npz.files})
+
+
+def get_mtime(slpdir: str) -> float:
+    """Return the newest mtime of the slp directory and its slp files.
+
+    The directory mtime only changes when files are added or removed, so
+    the files are checked as well, catching slp files rewritten in place.
+    """
+    mtime = os.stat(slpdir).st_mtime
+    with os.scandir(slpdir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".slp"):
+                mtime = max(mtime, entry.stat().st_mtime)
+    return mtime
+
+
+def is_stale(slpdir: str, indexfn: str) -> bool:
+    """Is the index missing or older than any slp file."""
+    try:
+        return os.stat(indexfn).st_mtime < get_mtime(slpdir)
+    except FileNotFoundError:
+        return True
+
+
+def get_slopes(huc12: str, scenario: int) -> pd.DataFrame:
+    """Return the slope summary of this HUC12, rebuilding a stale index.
+
+    See ``summarize_slopes`` for the columns.
+    """
+    slpdir, indexfn = _paths(huc12, scenario)
+    if not os.path.isdir(slpdir):
+        raise NoDataFound("No data found for this scenario")
+    if not is_stale(slpdir, indexfn):
+        return read_index(indexfn)
+    df = summarize_slopes(slpdir)
+    try:
+        write_index(df, indexfn)
+    except OSError as exp:
+        LOG.warning("Failed to write %s: %s", indexfn, exp)
+    return df
+
+
+def refresh(scenario: int, force: bool = False):
+    """Build the indices of any stale HUC12s within this scenario."""
+    rebuilt = 0
+    for slpdir in sorted(
+        glob.glob(SLPDIR.format(scenario=scenario, huc8="*", huc4="*"))
+    ):
+        if not os.path.isdir(slpdir):
+            continue
+        huc12 = "".join(slpdir.split(os.sep)[-2:])
+        indexfn = _paths(huc12, scenario)[1]
+        if force or is_stale(slpdir, indexfn):
+            write_index(summarize_slopes(slpdir), indexfn)
+            rebuilt += 1
+    LOG.info("Rebuilt %s slope indices for scenario %s", rebuilt, scenario)
+
+
+def main(argv):
+    """Go Main Go."""
+    refresh(int(argv[1]), force="--force" in argv[2:])
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,194 @@
+"""Helpers for streaming responses.
+
+``file_response`` serves a file from disk in blocks, rather than reading it
+all into memory, with ``Content-Length``, ``ETag`` and ``Last-Modified``
+headers taken from ``os.stat``.  Conditional ``If-None-Match`` and
+``If-Modified-Since`` requests get a ``304 Not Modified`` and a single
+``Range`` gets a ``206 Partial Content``, so interrupted downloads can be
+resumed.
+
+``stream_zip`` yields a zip file as each member is added, so that large
+archives are never held in memory.
+"""
+
+import os
+import re
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from email.utils import formatdate, parsedate_to_datetime
+
+BLOCKSIZE = 65536
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def iter_file(fh, start: int, length: int) -> Iterator[bytes]:
+    """Yield ``length`` bytes of the open file from ``start``, then close."""
+    try:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(BLOCKSIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def get_etag(st: os.stat_result) -> str:
+    """Compute a strong ETag from the file's stat."""
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def is_not_modified(environ: dict, etag: str, mtime: float) -> bool:
+    """Evaluate the conditional request headers."""
+    inm = environ.get("HTTP_IF_NONE_MATCH")
+    if inm is not None:
+        # If-None-Match takes precedence and uses the weak comparison
+        tags = [tag.strip().removeprefix("W/") for tag in inm.split(",")]
+        return "*" in tags or etag in tags
+    ims = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if ims is None:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range(environ: dict, size: int, etag: str, lastmod: str):
+    """Parse a single byte Range header.
+
+    Returns:
+        None to send the whole file, an inclusive ``(start, end)`` tuple or
+        ``False`` when the range is not satisfiable.
+    """
+    value = environ.get("HTTP_RANGE")
+    if value is None:
+        return None
+    # Only honour the range when the client has the same version
+    ifrange = environ.get("HTTP_IF_RANGE")
+    if ifrange is not None and ifrange not in (etag, lastmod):
+        return None
+    match = RANGE_RE.match(value.strip())
+    if match is None or match.groups() == ("", ""):
+        # Multiple ranges or nonsense, which we are free to ignore
+        return None
+    first, last = match.groups()
+    if first == "":
+        # The final N bytes
+        if int(last) == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = size - 1 if last == "" else min(int(last), size - 1)
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def file_response(
+    environ: dict,
+    start_response: Callable,
+    path: str,
+    content_type: str = "application/octet-stream",
+    filename: str | None = None,
+) -> Iterable[bytes]:
+    """Serve the file, handling conditional and range requests.
+
+    Args:
+        environ: the WSGI environ.
+        start_response: the WSGI start_response.
+        path: the file to serve.
+        content_type: the Content-Type header.
+        filename: when provided, sent as an attachment with this name.
+    """
+    fh = open(path, "rb")
+    st = os.fstat(fh.fileno())
+    etag = get_etag(st)
+    lastmod = formatdate(st.st_mtime, usegmt=True)
+    headers = [
+        ("ETag", etag),
+        ("Last-Modified", lastmod),
+        ("Accept-Ranges", "bytes"),
+    ]
+    if is_not_modified(environ, etag, st.st_mtime):
+        fh.close()
+        start_response("304 Not Modified", headers)
+        return [b""]
+    headers.append(("Content-type", content_type))
+    if filename is not None:
+        headers.append(
+            ("Content-Disposition", f"attachment; filename={filename}")
+        )
+    byterange = parse_range(environ, st.st_size, etag, lastmod)
+    if byterange is False:
+        fh.close()
+        headers.append(("Content-Range", f"bytes */{st.st_size}"))
+        start_response("416 Range Not Satisfiable", headers)
+        return [b""]
+    if byterange is not None:
+        start, end = byterange
+        headers.append(("Content-Range", f"bytes {start}-{end}/{st.st_size}"))
+        headers.append(("Content-Length", str(end - start + 1)))
+        start_response("206 Partial Content", headers)
+        return iter_file(fh, start, end - start + 1)
+    headers.append(("Content-Length", str(st.st_size)))
+    start_response("200 OK", headers)
+    # Not wsgi.file_wrapper, as iemapp re-yields the response without ever
+    # calling its close(), which would leave the file open
+    return iter_file(fh, 0, st.st_size)
+
+
+class _ZipSink:
+    """Non-seekable file object collecting what zipfile writes."""
+
+    def __init__(self):
+        """Constructor."""
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        """Collect the data."""
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """Bytes written so far."""
+        return self._pos
+
+    def flush(self):
+        """Nothing to do."""
+
+    def drain(self) -> bytes:
+        """Return and forget what has been collected."""
+        res = b"".join(self._chunks)
+        self._chunks = []
+        return res
+
+
+def stream_zip(
+    members: Iterable[tuple[str, bytes | str | os.PathLike]],
+) -> Iterator[bytes]:
+    """Yield a deflated zip file of the ``(name, data)`` members.
+
+    The members are consumed lazily, so only one is in memory at a time.
+    Data given as a path is copied from disk in blocks.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            if not isinstance(data, os.PathLike):
+                zf.writestr(name, data)
+                yield sink.drain()
+                continue
+            zinfo = zipfile.ZipInfo.from_file(data, name)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open(data, "rb") as src, zf.open(zinfo, "w") as dst:
+                while chunk := src.read(BLOCKSIZE):
+                    dst.write(chunk)
+                    if payload := sink.drain():
+                        yield payload
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,69 @@
+"""Process-wide pool of worker processes.
+
+matplotlib is not thread safe and the climate file writers hold the GIL, so
+CPU bound work that should run concurrently is handed to this pool of
+processes.  The pool is created on first use and replaced if a worker dies.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+MAX_WORKERS = 6
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Return the process-wide pool of workers."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # forkserver, since forking a threaded mod_wsgi process is unsafe
+            ctx = multiprocessing.get_context("forkserver")
+            # Under mod_wsgi, sys.executable is not the python interpreter
+            if not os.path.basename(sys.executable).startswith("python"):
+                ctx.set_executable(
+                    os.path.join(sys.exec_prefix, "bin", "python")
+                )
+            _POOL = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=ctx
+            )
+        return _POOL
+
+
+def discard_pool(pool: ProcessPoolExecutor):
+    """Forget about a broken pool, so the next use starts a new one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+
+
+def pool_map(func, *iterables, window: int = 2 * MAX_WORKERS):
+    """Like ``Executor.map`` on the pool, yielding results in order.
+
+    Only ``window`` calls are submitted ahead of the results yielded, so
+    results do not pile up when consumed slowly, nor does one caller fill
+    the pool ahead of the others.  Calls not yet started are cancelled when
+    the generator is closed.
+    """
+    pool = get_pool()
+    pending = deque()
+    try:
+        for args in zip(*iterables, strict=True):
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(pool.submit(func, *args))
+        while pending:
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        discard_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
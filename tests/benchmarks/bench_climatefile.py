@@ -0,0 +1,40 @@
+"""Benchmark the per-day and columnar climate file writers.
+
+Run with ``python tests/benchmarks/bench_climatefile.py [clifn]``, which
+defaults to the ~19 year test file.
+"""
+
+import os
+import sys
+import timeit
+
+from depbackend.dl.climatefile import convert_to_ntt, convert_to_weps
+
+# The original writers are kept within the tests as the reference
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from test_climatefile import legacy_ntt, legacy_weps_body  # noqa: E402
+
+
+def main(argv):
+    """Go Main Go."""
+    clifn = (
+        argv[1]
+        if len(argv) > 1
+        else os.path.join(
+            os.path.dirname(__file__), "..", "data", "097.50x035.50.cli"
+        )
+    )
+    for label, old, new in [
+        ("weps", legacy_weps_body, convert_to_weps),
+        ("ntt", legacy_ntt, convert_to_ntt),
+    ]:
+        told = min(timeit.repeat(lambda f=old: f(clifn), number=1, repeat=3))
+        tnew = min(timeit.repeat(lambda f=new: f(clifn), number=1, repeat=3))
+        print(
+            f"{label:4s}: per-day {told:6.3f}s columnar {tnew:6.3f}s "
+            f"speedup {told / tnew:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
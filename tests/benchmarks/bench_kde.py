@@ -0,0 +1,53 @@
+"""Benchmark the seaborn and binned KDE slope plots.
+
+Run with ``python tests/benchmarks/bench_kde.py [counts...]``.
+"""
+
+import sys
+import timeit
+from functools import partial
+
+import matplotlib
+import numpy as np
+import seaborn as sns
+
+from depbackend.auto.huc12_slopes import binned_kde, density_levels
+
+matplotlib.use("agg")
+
+
+def synthetic_slopes(count: int):
+    """Generate hill slope lengths [m] and bulk slopes [%]."""
+    rng = np.random.default_rng(0)
+    length = rng.gamma(2.0, 60.0, count)
+    slope = rng.gamma(1.5, 2.5, count) + 0.01 * length
+    return length, slope
+
+
+def render(kde, x, y):
+    """Draw the jointplot."""
+    g = sns.jointplot(x=x, y=y, s=40, zorder=1, color="tan")
+    if kde == "seaborn":
+        g.plot_joint(sns.kdeplot, n_levels=6)
+    else:
+        res = binned_kde(x, y)
+        g.ax_joint.contour(*res, levels=density_levels(res[2]), colors=["C0"])
+    g.figure.canvas.draw()
+    matplotlib.pyplot.close(g.figure)
+
+
+def main(argv):
+    """Go Main Go."""
+    counts = [int(x) for x in argv[1:]] or [100, 1000, 5000, 20000, 50000]
+    for count in counts:
+        x, y = synthetic_slopes(count)
+        old = timeit.timeit(partial(render, "seaborn", x, y), number=1)
+        new = timeit.timeit(partial(render, "binned", x, y), number=1)
+        print(
+            f"{count:6d} points: seaborn {old:7.2f}s "
+            f"binned {new:7.2f}s speedup {old / new:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,77 @@
+"""Benchmark one Polygon patch per HUC12 versus a single PathCollection.
+
+Run with ``python tests/benchmarks/bench_mapper.py``.
+"""
+
+import sys
+import timeit
+from functools import partial
+from io import BytesIO
+
+import matplotlib.colors as mpcolors
+import numpy as np
+import shapely
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Polygon
+from pyiem.plot.colormaps import dep_erosion
+
+from depbackend.auto.mapper import add_polygons
+
+
+def synthetic_hucs(count: int):
+    """Generate HUC12-ish polygons with ~100 vertices each."""
+    side = int(np.ceil(np.sqrt(count)))
+    idx = np.arange(count)
+    centers = shapely.points(idx % side * 10.0, idx // side * 10.0)
+    geoms = shapely.buffer(centers, 5.0, quad_segs=25)
+    data = np.random.default_rng(0).gamma(0.5, 2.0, count)
+    return geoms, data, side
+
+
+def render(draw, side) -> bytes:
+    """Render a PNG."""
+    fig = Figure(figsize=(10.24, 7.68))
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    draw(ax)
+    ax.set_xlim(-10, side * 10)
+    ax.set_ylim(-10, side * 10)
+    ram = BytesIO()
+    fig.savefig(ram, format="png", dpi=100)
+    return ram.getvalue()
+
+
+def main(argv):
+    """Go Main Go."""
+    counts = [int(x) for x in argv[1:]] or [1000, 10000, 30000]
+    cmap = dep_erosion()
+    norm = mpcolors.BoundaryNorm([0, 0.1, 0.5, 1, 2, 5, 10], cmap.N)
+    for count in counts:
+        geoms, data, side = synthetic_hucs(count)
+
+        def legacy(ax, geoms=geoms, data=data):
+            for geom, val in zip(geoms, data, strict=True):
+                ax.add_patch(
+                    Polygon(
+                        geom.exterior.coords,
+                        fc=cmap(norm([val]))[0],
+                        ec="k",
+                        zorder=5,
+                        lw=0.1,
+                    )
+                )
+
+        def vectorized(ax, geoms=geoms, data=data):
+            add_polygons(ax, geoms, cmap(norm(data)), zorder=5)
+
+        old = timeit.timeit(partial(render, legacy, side), number=1)
+        new = timeit.timeit(partial(render, vectorized, side), number=1)
+        print(
+            f"{count:6d} polygons: patches {old:7.2f}s "
+            f"collection {new:7.2f}s speedup {old / new:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
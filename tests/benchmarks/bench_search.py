@@ -0,0 +1,44 @@
+"""Benchmark HUC12 search index build and autocomplete query times.
+
+Run with ``python tests/benchmarks/bench_search.py``.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from depbackend.search import HUC12SearchIndex
+
+WORDS = (
+    "big little north south east west fork branch creek river run lake "
+    "skunk raccoon cedar iowa des moines boone squaw walnut headwaters "
+    "town of upper lower middle mud sugar turkey buffalo beaver"
+).split()
+
+
+def synthetic(count: int):
+    """Generate HUC12 codes and names."""
+    rng = np.random.default_rng(0)
+    codes = [f"{code:012d}" for code in rng.choice(10**12, count, False)]
+    names = [
+        " ".join(rng.choice(WORDS, rng.integers(2, 5))) for _ in range(count)
+    ]
+    return codes, names
+
+
+def main(argv):
+    """Go Main Go."""
+    count = int(argv[1]) if len(argv) > 1 else 100_000
+    codes, names = synthetic(count)
+    build = timeit.timeit(lambda: HUC12SearchIndex(codes, names), number=1)
+    index = HUC12SearchIndex(codes, names)
+    print(f"{count} HUC12s, index built in {build:.2f}s")
+    for q in ["1", "0714", "s", "sk", "skunk", "skunk riv", "cedr crek"]:
+        number = 100
+        took = timeit.timeit(lambda q=q: index.search(q), number=number)
+        print(f"{q!r:12s} {took / number * 1000:7.3f}ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
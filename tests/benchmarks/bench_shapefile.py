@@ -0,0 +1,87 @@
+"""Benchmark the temporary directory shapefile zip versus streaming it.
+
+Run with ``python tests/benchmarks/bench_shapefile.py``.
+"""
+
+import sys
+import tempfile
+import timeit
+import zipfile
+from functools import partial
+from io import BytesIO
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from depbackend.shpwriter import write_shapefile
+from depbackend.streaming import stream_zip
+
+
+def synthetic_hucs(count: int) -> gpd.GeoDataFrame:
+    """Generate HUC12-ish polygons with ~100 vertices each and attributes."""
+    side = int(np.ceil(np.sqrt(count)))
+    idx = np.arange(count)
+    centers = shapely.points(idx % side * 10.0, idx // side * 10.0)
+    rng = np.random.default_rng(0)
+    return gpd.GeoDataFrame(
+        {
+            "HUC12_ID": idx,
+            "NAME": [f"Watershed {i}" for i in idx],
+            "PREC_MM": rng.gamma(0.5, 2.0, count),
+            "LOS_KGM2": rng.gamma(0.5, 2.0, count),
+            "VERSION": "2.1",
+        },
+        geometry=shapely.buffer(centers, 5.0, quad_segs=25),
+        crs="EPSG:5070",
+    )
+
+
+def legacy(df) -> bytes:
+    """Write to a temporary directory, zip to disk and read it back."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        fn = f"{tempdir}/bench"
+        df.to_file(f"{fn}.shp")
+        df.drop(columns="geometry").to_csv(f"{fn}.csv", index=False)
+        with zipfile.ZipFile(f"{fn}.zip", "w", zipfile.ZIP_DEFLATED) as zfp:
+            for suffix in ["shp", "shx", "dbf", "csv"]:
+                zfp.write(f"{fn}.{suffix}", f"bench.{suffix}")
+        with open(f"{fn}.zip", "rb") as fh:
+            return fh.read()
+
+
+def streamed(df) -> bytes:
+    """Stream the in-memory parts into a zip."""
+
+    def members():
+        for suffix, payload in write_shapefile(df).items():
+            yield f"bench.{suffix}", payload
+        yield "bench.csv", df.drop(columns="geometry").to_csv(index=False)
+
+    return b"".join(stream_zip(members()))
+
+
+def single_file(df, driver) -> bytes:
+    """Write a single file format to memory."""
+    bio = BytesIO()
+    df.to_file(bio, driver=driver, layer="bench", engine="pyogrio")
+    return bio.getvalue()
+
+
+def main(argv):
+    """Go Main Go."""
+    counts = [int(x) for x in argv[1:]] or [1000, 10000, 30000]
+    for count in counts:
+        df = synthetic_hucs(count)
+        old = timeit.timeit(partial(legacy, df), number=1)
+        new = timeit.timeit(partial(streamed, df), number=1)
+        gpkg = timeit.timeit(partial(single_file, df, "GPKG"), number=1)
+        fgb = timeit.timeit(partial(single_file, df, "FlatGeobuf"), number=1)
+        print(
+            f"{count:6d} hucs: tempdir {old:6.2f}s streamed {new:6.2f}s "
+            f"gpkg {gpkg:6.2f}s fgb {fgb:6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,86 @@
+"""Test the period aggregation helpers."""
+
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import simplejson as json
+
+from depbackend.aggregate import decompose, english_numeric, to_numeric
+
+
+def test_decompose_without_rollups():
+    """Test that everything is daily when there are no rollups."""
+    days, months, years = decompose(date(2010, 1, 5), date(2015, 3, 1), None)
+    assert days == [(date(2010, 1, 5), date(2015, 3, 1))]
+    assert not months
+    assert not years
+
+
+def test_decompose_multiyear():
+    """Test splitting a multi-year period."""
+    days, months, years = decompose(
+        date(2010, 11, 15), date(2015, 3, 4), date(2024, 1, 1)
+    )
+    assert days == [
+        (date(2010, 11, 15), date(2010, 11, 30)),
+        (date(2015, 3, 1), date(2015, 3, 4)),
+    ]
+    assert months == [
+        (date(2010, 12, 1), date(2010, 12, 1)),
+        (date(2015, 1, 1), date(2015, 2, 1)),
+    ]
+    assert years == [(date(2011, 1, 1), date(2014, 1, 1))]
+
+
+def test_decompose_beyond_rollups():
+    """Test that days after the rollups were built come from daily."""
+    days, months, years = decompose(
+        date(2023, 1, 1), date(2024, 5, 20), date(2024, 3, 10)
+    )
+    assert years == [(date(2023, 1, 1), date(2023, 1, 1))]
+    assert months == [(date(2024, 1, 1), date(2024, 2, 1))]
+    assert days == [(date(2024, 3, 1), date(2024, 5, 20))]
+
+
+def test_decompose_single_day():
+    """Test a single day."""
+    assert decompose(date(2024, 2, 1), date(2024, 2, 1), date(2025, 1, 1)) == (
+        [(date(2024, 2, 1), date(2024, 2, 1))],
+        [],
+        [],
+    )
+
+
+def test_to_numeric():
+    """Test rounding like PostgreSQL round(x::numeric, 2)."""
+    assert str(to_numeric(0.125)) == "0.13"
+    assert str(to_numeric(-0.125)) == "-0.13"
+    assert str(to_numeric(2.675)) == "2.68"
+    assert str(to_numeric(0.1)) == "0.10"
+    assert str(to_numeric(3.0)) == "3.00"
+    assert str(to_numeric(1e-7)) == "0.00"
+
+
+def test_english_numeric():
+    """Test the JSON of converted sums matches what SQL returned."""
+    obs = pd.DataFrame(
+        {
+            "avg_loss_kgm2": [0.0, np.nan],
+            "qc_precip_mm": [25.4, 3.175],
+            "avg_delivery_kgm2": [0.0, 0.0],
+            "avg_runoff_mm": [2.54, 0.0],
+        },
+        index=pd.Index([1, 2], name="huc12_id"),
+    )
+    df = english_numeric(obs, pd.Index([2, 3, 1], name="huc12_id"))
+    assert df.index.tolist() == [2, 3, 1]
+    assert df.loc[3, "avg_loss"] == Decimal(0)
+    res = json.dumps(df.to_dict(orient="records"))
+    assert res == (
+        '[{"avg_loss": 0.00, "qc_precip": 0.13, "avg_delivery": 0.00, '
+        '"avg_runoff": 0.00}, {"avg_loss": 0, "qc_precip": 0, '
+        '"avg_delivery": 0, "avg_runoff": 0}, {"avg_loss": 0.00, '
+        '"qc_precip": 1.00, "avg_delivery": 0.00, "avg_runoff": 0.10}]'
+    )
@@ -0,0 +1,338 @@
+"""Test the depbackend caching helpers."""
+
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymemcache.test.utils import MockMemcacheClient
+
+from depbackend import cache as cachemod
+from depbackend.cache import (
+    FileCache,
+    MemcacheCache,
+    MemcachePool,
+    RevalidatingCache,
+    VersionedCache,
+    parse_servers,
+)
+
+
+def test_versioned_cache_reloads_on_version_change():
+    """Test that the loader only runs when the probe changes."""
+    state = {"version": 1, "loads": 0}
+
+    def probe(_conn, _key):
+        return state["version"]
+
+    def load(_conn, key):
+        state["loads"] += 1
+        return f"{key}{state['version']}"
+
+    cache = VersionedCache(probe, load, recheck=0)
+    assert cache.get(None, "a") == "a1"
+    assert cache.get(None, "a") == "a1"
+    assert state["loads"] == 1
+    state["version"] = 2
+    assert cache.get(None, "a") == "a2"
+    assert cache.get(None, "b") == "b2"
+    assert state["loads"] == 3
+
+
+def test_versioned_cache_recheck_interval():
+    """Test that the probe is not run within the recheck interval."""
+    calls = []
+    cache = VersionedCache(
+        lambda _conn, _key: calls.append(1), lambda _c, _k: "v", recheck=60
+    )
+    cache.get(None, 0)
+    cache.get(None, 0)
+    assert len(calls) == 1
+    cache.clear()
+    cache.get(None, 0)
+    assert len(calls) == 2
+
+
+def test_file_cache_roundtrip(tmp_path):
+    """Test storing and fetching bytes."""
+    cache = FileCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("abcdef") is None
+    cache.set("abcdef", b"png")
+    assert cache.get("abcdef") == b"png"
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path):
+    """Test that eviction removes the oldest read entries first."""
+    cache = FileCache(str(tmp_path), max_bytes=300, low_water=0.7)
+    for i, key in enumerate(["aa1", "bb2", "cc3"]):
+        cache.set(key, b"x" * 100)
+        # Make the access times deterministic
+        os.utime(cache._path(key), (i, i))
+    # Reading aa1 makes it the most recently used
+    assert cache.get("aa1") is not None
+    cache.set("dd4", b"x" * 100)
+    cache.evict()
+    assert cache.get("bb2") is None
+    assert cache.get("cc3") is None
+    assert cache.get("aa1") == b"x" * 100
+    assert cache.get("dd4") == b"x" * 100
+
+
+def test_file_cache_unwritable_directory(tmp_path):
+    """Test that a broken directory is just a cache miss."""
+    target = tmp_path / "file"
+    target.write_bytes(b"")
+    cache = FileCache(str(target), max_bytes=1000)
+    cache.set("abcdef", b"png")
+    assert cache.get("abcdef") is None
+
+
+class FailingClient:
+    """Fake memcached client that can not connect."""
+
+    def __init__(self):
+        """Constructor."""
+        self.calls = 0
+
+    def get(self, _key):
+        """Fail."""
+        self.calls += 1
+        raise ConnectionRefusedError("nope")
+
+    def set(self, _key, _value, _expire):
+        """Fail."""
+        self.calls += 1
+        raise ConnectionRefusedError("nope")
+
+    def close(self):
+        """Nothing to close."""
+
+
+def test_parse_servers():
+    """Test parsing the memcached endpoints."""
+    assert parse_servers("a:1, b") == [("a", 1), ("b", 11211)]
+    assert parse_servers("") == []
+
+
+def test_memcache_cache_counters():
+    """Test the roundtrip and hit/miss counters with a fake backend."""
+    backend = MockMemcacheClient()
+    pool = MemcachePool(client_factory=lambda: backend)
+    cache = MemcacheCache(expire=60, pool=pool)
+    assert cache.get("/a") is None
+    cache.set("/a", b"json")
+    assert cache.get("/a") == b"json"
+    assert cache.get("/a") == b"json"
+    assert backend.get("/a") == b"json"
+    assert cache.stats() == {"hits": 2, "misses": 1}
+
+
+def test_memcache_pool_unreachable():
+    """Test that failures are misses and skip memcached for a while."""
+    backend = FailingClient()
+    pool = MemcachePool(client_factory=lambda: backend, retry=60)
+    cache = MemcacheCache(pool=pool)
+    assert cache.get("/a") is None
+    cache.set("/a", b"json")
+    assert cache.get("/a") is None
+    assert backend.calls == 1
+    assert cache.stats() == {"hits": 0, "misses": 2}
+    pool.retry = 0
+    pool._down_until = 0
+    assert cache.get("/a") is None
+    assert backend.calls == 2
+
+
+def test_memcache_pool_no_servers():
+    """Test that configuring no endpoints disables memcached."""
+    pool = MemcachePool(servers="")
+    pool.set("/a", b"json")
+    assert pool.get("/a") is None
+
+
+def test_configure_memcache(monkeypatch):
+    """Test that the process-wide pool is replaced and shared."""
+    monkeypatch.setattr(cachemod, "_POOL", {})
+    monkeypatch.setenv("DEP_MEMCACHE_SERVERS", "mc1:11212,mc2:11213")
+    pool = cachemod.get_memcache_pool()
+    assert pool.servers == [("mc1", 11212), ("mc2", 11213)]
+    assert cachemod.get_memcache_pool() is pool
+    backend = MockMemcacheClient()
+    cachemod.configure_memcache(client_factory=lambda: backend)
+    cache = MemcacheCache()
+    cache.set("/b", b"xlsx")
+    assert backend.get("/b") == b"xlsx"
+
+
+def _revalidating(backend, **kwargs) -> RevalidatingCache:
+    """Build a cache, like each process would, over the shared backend."""
+    pool = MemcachePool(client_factory=lambda: backend)
+    kwargs = {"ttl": 60, "stale": 60, "poll": 0.01, **kwargs}
+    return RevalidatingCache(MemcacheCache(pool=pool), **kwargs)
+
+
+def _concurrently(caches: list, key: str, generate, workers: int = 16):
+    """Fetch the key from all the workers at once."""
+    barrier = threading.Barrier(workers)
+
+    def _fetch(i):
+        barrier.wait()
+        return caches[i % len(caches)].fetch(key, generate)
+
+    with ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(_fetch, range(workers)))
+
+
+def _slow_generator(calls: list):
+    """Generate a new value, slowly, counting the calls."""
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)
+        return f"v{len(calls)}".encode("ascii")
+
+    return generate
+
+
+def test_revalidating_coalesces_misses():
+    """Test that concurrent misses within a process generate once."""
+    calls = []
+    cache = _revalidating(MockMemcacheClient())
+    res = _concurrently([cache], "/k", _slow_generator(calls))
+    assert calls == [1]
+    assert res == [b"v1"] * 16
+    assert cache.lookup("/k") == (b"v1", True)
+
+
+def test_revalidating_misses_across_processes():
+    """Test that other processes wait for the lock holder's value."""
+    calls = []
+    backend = MockMemcacheClient()
+    caches = [_revalidating(backend) for _ in range(4)]
+    res = _concurrently(caches, "/k", _slow_generator(calls))
+    assert calls == [1]
+    assert res == [b"v1"] * 16
+
+
+def test_revalidating_serves_stale():
+    """Test that one worker regenerates while the others serve stale."""
+    calls = []
+    backend = MockMemcacheClient()
+    caches = [_revalidating(backend) for _ in range(4)]
+    # A value that became stale a second ago
+    backend.set("/k", struct.pack(">d", time.time() - 1) + b"v0", 120)
+    res = _concurrently(caches, "/k", _slow_generator(calls))
+    assert calls == [1]
+    assert res.count(b"v1") == 1
+    assert res.count(b"v0") == 15
+    assert caches[0].lookup("/k") == (b"v1", True)
+    assert caches[0].fetch("/k", _slow_generator(calls)) == b"v1"
+    assert calls == [1]
+
+
+def test_revalidating_error():
+    """Test that a failed generation is raised to the waiting threads."""
+    cache = _revalidating(MockMemcacheClient())
+
+    def generate():
+        time.sleep(0.1)
+        raise ValueError("database is down")
+
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def _fetch():
+        barrier.wait()
+        try:
+            cache.fetch("/k", generate)
+        except ValueError as exp:
+            errors.append(exp)
+
+    threads = [threading.Thread(target=_fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4
+    # The lock was released, so the next request tries again
+    assert cache.fetch("/k", lambda: b"v1") == b"v1"
+
+
+def test_revalidating_memcache_down():
+    """Test that generation happens without memcached."""
+    cache = _revalidating(FailingClient())
+    assert cache.fetch("/k", lambda: b"v1") == b"v1"
+    assert cache.fetch("/k", lambda: b"v2") == b"v2"
+
+
+def _pieces(calls: list, count: int = 3):
+    """Generate the value in pieces, counting the calls."""
+
+    def generate():
+        calls.append(1)
+        for i in range(count):
+            time.sleep(0.05)
+            yield f"p{i}".encode("ascii")
+
+    return generate
+
+
+def test_revalidating_stream():
+    """Test that a miss is streamed piece by piece, then stored."""
+    calls = []
+    backend = MockMemcacheClient()
+    cache = _revalidating(backend)
+    res = cache.stream("/k", _pieces(calls))
+    # Nothing is generated until the response is sent
+    assert calls == []
+    assert list(res) == [b"p0", b"p1", b"p2"]
+    assert cache.lookup("/k") == (b"p0p1p2", True)
+    assert backend.get("/k/lock") is None
+    assert cache.stream("/k", _pieces(calls)) == [b"p0p1p2"]
+    assert calls == [1]
+
+
+def test_revalidating_stream_waiters():
+    """Test that concurrent misses wait for the streamed value."""
+    calls = []
+    cache = _revalidating(MockMemcacheClient())
+    barrier = threading.Barrier(8)
+
+    def _fetch(_i):
+        barrier.wait()
+        return b"".join(cache.stream("/k", _pieces(calls)))
+
+    with ThreadPoolExecutor(8) as executor:
+        res = list(executor.map(_fetch, range(8)))
+    assert calls == [1]
+    assert res == [b"p0p1p2"] * 8
+
+
+def test_revalidating_stream_too_large(monkeypatch):
+    """Test that an oversized stream is sent but not stored."""
+    monkeypatch.setattr(cachemod, "MAX_ITEM_SIZE", 12)
+    calls = []
+    cache = _revalidating(MockMemcacheClient())
+    assert list(cache.stream("/k", _pieces(calls, 4))) == [
+        b"p0",
+        b"p1",
+        b"p2",
+        b"p3",
+    ]
+    assert cache.lookup("/k") == (None, False)
+    assert b"".join(cache.stream("/k", _pieces(calls, 1))) == b"p0"
+    assert calls == [1, 1]
+
+
+def test_revalidating_stream_closed():
+    """Test that a client going away releases the lock without storing."""
+    calls = []
+    backend = MockMemcacheClient()
+    cache = _revalidating(backend)
+    res = cache.stream("/k", _pieces(calls))
+    assert next(res) == b"p0"
+    res.close()
+    assert backend.get("/k/lock") is None
+    assert cache.lookup("/k") == (None, False)
+    assert list(cache.stream("/k", _pieces(calls))) == [b"p0", b"p1", b"p2"]
@@ -0,0 +1,94 @@
+"""Test the cached climate file parsing."""
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from depbackend import climate
+from depbackend.cache import FileCache
+
+CLIFN = os.path.join(os.path.dirname(__file__), "data", "097.50x035.50.cli")
+
+
+@pytest.fixture
+def counted(tmp_path, monkeypatch):
+    """Count read_cli calls with an empty cache."""
+    calls = []
+    read_cli = climate.read_cli
+
+    def _read_cli(*args, **kwargs):
+        calls.append(args)
+        return read_cli(*args, **kwargs)
+
+    monkeypatch.setattr(climate, "read_cli", _read_cli)
+    monkeypatch.setattr(
+        climate, "CLI_CACHE", FileCache(str(tmp_path / "cache"), 10**8)
+    )
+    return calls
+
+
+def test_roundtrip(counted):
+    """Test that a cache hit matches the parsed file."""
+    first = climate.read_cli_cached(CLIFN)
+    second = climate.read_cli_cached(CLIFN)
+    assert len(counted) == 1
+    pd.testing.assert_frame_equal(first, second, check_index_type=False)
+    # Callers may modify what they get
+    second["rad"] = 0
+    assert climate.read_cli_cached(CLIFN)["rad"].max() > 0
+
+
+def test_mtime_invalidates(counted, tmp_path):
+    """Test that a rewritten file is parsed again."""
+    clifn = str(tmp_path / "test.cli")
+    shutil.copy(CLIFN, clifn)
+    climate.read_cli_cached(clifn)
+    os.utime(clifn, ns=(0, 0))
+    climate.read_cli_cached(clifn)
+    climate.read_cli_cached(clifn)
+    assert len(counted) == 2
+
+
+def test_levels_are_keyed():
+    """Test that intensity levels are part of the key."""
+    assert climate.get_cache_key(CLIFN, [10, 30]) == climate.get_cache_key(
+        CLIFN, [30, 10]
+    )
+    assert climate.get_cache_key(CLIFN, [10]) != climate.get_cache_key(
+        CLIFN, None
+    )
+    assert climate.get_cache_key("/nonexistent.cli", None) is None
+
+
+def _index(lons, lats):
+    """Build an index of some climate files."""
+    return climate.ClimateFileIndex(
+        pd.DataFrame(
+            {
+                "climate_file_id": range(1, len(lons) + 1),
+                "filepath": [f"/{i}.cli" for i in range(1, len(lons) + 1)],
+                "lon": lons,
+                "lat": lats,
+            }
+        )
+    )
+
+
+def test_nearest():
+    """Test the nearest lookup and its planar degree distance."""
+    index = _index([-93.0, -92.0], [42.0, 42.0])
+    assert index.nearest(-93.1, 42.0) == (1, "/1.cli", pytest.approx(0.1))
+    assert index.nearest(-95.0, 42.0) == (None, None, None)
+    assert _index([], []).nearest(-93, 42) == (None, None, None)
+
+
+def test_nearest_within_envelope():
+    """Test that a nearer file outside of the envelope is skipped."""
+    # The first file is exactly one degree east, so not within the
+    # envelope, while the second is further away but inside a corner
+    index = _index([-92.0, -93.9], [41.0, 41.9])
+    res = index.nearest(-93.0, 41.0)
+    assert res[:2] == (2, "/2.cli")
+    assert res[2] == pytest.approx((0.9**2 + 0.9**2) ** 0.5)
@@ -0,0 +1,159 @@
+"""Test the climate file format writers."""
+
+import os
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from dailyerosion.io.wepp import read_cli
+from pyiem.exceptions import IncompleteWebRequest
+from werkzeug.test import Client
+
+from depbackend.dl import climatefile
+from depbackend.dl.climatefile import (
+    Schema,
+    batch_members,
+    convert_to_ntt,
+    convert_to_weps,
+    format_rows,
+    get_download_name,
+)
+from depbackend.streaming import stream_zip
+
+CLIFN = os.path.join(os.path.dirname(__file__), "data", "097.50x035.50.cli")
+
+
+def legacy_weps_body(clifn: str) -> str:
+    """The original per-day WEPS writer, without the header."""
+    sio = StringIO()
+    for dt, row in read_cli(clifn).iterrows():
+        tpeak = 0.0
+        duration = 0.0
+        if row["pcpn"] > 0:
+            tpeak = 0.5
+            duration = max(1.0, min(12.0, row["pcpn"] / (row["maxr"] * 4.0)))
+        sio.write(
+            f" {dt.strftime('%-2d %-2m %Y')} {row['pcpn']:5.1f} "
+            f"{duration:5.2f}  "
+            f"{tpeak:.2f} {row['maxr']:5.1f} "
+            f"{row['tmax']:5.1f} {row['tmin']:5.1f}   {row['rad']:3.0f}"
+            f"{row['wvl']:5.1f} {row['wdir']:5.1f} {row['tdew']:5.1f}"
+            "\n"
+        )
+    return sio.getvalue()
+
+
+def legacy_ntt(clifn: str) -> str:
+    """The original per-day NTT writer."""
+    df = read_cli(clifn)
+    payload = StringIO()
+    df["rad"] = df["rad"] * 0.04184
+    for dt, row in df.iterrows():
+        payload.write(
+            f"  {dt.strftime('%Y %-2m %-2d')}  {row['rad']:3.0f}"
+            f"{row['tmax']:6.1f} {row['tmin']:6.1f} {row['pcpn']:6.2f}"
+            "\r\n"
+        )
+    return payload.getvalue()
+
+
+def test_weps_byte_identical():
+    """Test that the WEPS output has not changed."""
+    res = convert_to_weps(CLIFN)
+    lines = res.splitlines(keepends=True)
+    assert lines[0] == " 5.20\n"
+    assert "".join(lines[15:]) == legacy_weps_body(CLIFN)
+
+
+def test_ntt_byte_identical():
+    """Test that the NTT output has not changed."""
+    assert convert_to_ntt(CLIFN) == legacy_ntt(CLIFN)
+
+
+def test_format_rows_rounding():
+    """Test that awkward values format like an f-string would."""
+    vals = np.array([0.25, 0.35, -0.0, 2.675, np.nan, np.inf, -1e-9])
+    expected = "".join(f"{val:5.1f}|{val:.2f}\n" for val in vals)
+    assert format_rows("%5.1f|%.2f\n", [vals, vals]) == expected
+    assert format_rows("%5.1f\n", [np.array([])]) == ""
+
+
+def test_points_parsing():
+    """Test the lon,lat pairs with a header and mixed separators."""
+    query = Schema(points="lon,lat\n-93.5,42.0;-93.6, 42.1\r\n\n")
+    assert query.points == [(-93.5, 42.0), (-93.6, 42.1)]
+    assert Schema(lat=42, lon=-93.5).points is None
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"lat": 42.0},
+        {"points": "lon,lat"},
+        {"points": "-93.5"},
+        {"points": "-93.5,42.0", "intensity": "15"},
+        {"points": "-193.5,42.0"},
+        {"points": ";".join(["-93.5,42"] * 5001)},
+    ],
+)
+def test_points_invalid(kwargs):
+    """Test what is rejected."""
+    with pytest.raises(IncompleteWebRequest):
+        Schema(**kwargs)
+
+
+def test_download_name():
+    """Test the filename given to each format."""
+    fn = "/i/0/cli/097x035/097.50x035.50.cli"
+    assert get_download_name(fn, "wepp") == "097.50x035.50.cli"
+    assert get_download_name(fn, "ntt") == "097_50x035_50.wth"
+
+
+def test_points_form_post(monkeypatch):
+    """Test sending a CSV file's contents as the points form field."""
+    seen = []
+
+    def batch_application(_environ, start_response, query):
+        seen.append(query.points)
+        start_response("200 OK", [("Content-type", "text/plain")])
+        return [b"ok"]
+
+    monkeypatch.setattr(climatefile, "batch_application", batch_application)
+    client = Client(climatefile.application)
+    csv = "lon,lat\n-93.5,42.0\n-93.6,42.1\n"
+    expected = [(-93.5, 42.0), (-93.6, 42.1)]
+    assert client.post("/", data={"points": csv}).status_code == 200
+    res = client.post(
+        "/", data={"points": csv}, content_type="multipart/form-data"
+    )
+    assert res.status_code == 200
+    assert seen == [expected, expected]
+    # A raw CSV body is not a form, so is never seen
+    res = client.post("/", data=csv, content_type="text/csv")
+    assert res.status_code == 422
+    assert len(seen) == 2
+
+
+def test_batch_members_wepp():
+    """Test that WEPP files are given as paths to be copied in blocks."""
+    df = pd.DataFrame(
+        {
+            "lon": [-97.5, -97.51, 0.0],
+            "lat": [35.5, 35.5, 0.0],
+            "filepath": [CLIFN, CLIFN, None],
+            "distance": [0.0, 0.01, np.nan],
+        }
+    )
+    members = list(batch_members(df, "wepp"))
+    assert members[0] == ("097.50x035.50.cli", Path(CLIFN))
+    assert [name for name, _ in members] == [
+        "097.50x035.50.cli",
+        "points.csv",
+    ]
+    payload = b"".join(stream_zip(members))
+    with zipfile.ZipFile(BytesIO(payload)) as zf, open(CLIFN, "rb") as fh:
+        assert zf.read("097.50x035.50.cli") == fh.read()
@@ -0,0 +1,175 @@
+"""Test serving gzip compressed cache values."""
+
+import gzip
+
+import pytest
+from pymemcache.test.utils import MockMemcacheClient
+from werkzeug.test import Client
+
+from depbackend.cache import MemcacheCache, MemcachePool, RevalidatingCache
+from depbackend.compression import (
+    accepts_gzip,
+    get_compressed,
+    gzip_chunks,
+    gzip_compress,
+    gzip_stream,
+    respond,
+    respond_stream,
+)
+from depbackend.geojson import huc12_static
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, gzip;q=0.8", True),
+        ("x-gzip", True),
+        ("*", True),
+        ("gzip;q=0, *", False),
+        ("identity", False),
+        ("deflate", False),
+        (None, False),
+    ],
+)
+def test_accepts_gzip(header, expected):
+    """Test parsing Accept-Encoding."""
+    environ = {} if header is None else {"HTTP_ACCEPT_ENCODING": header}
+    assert accepts_gzip(environ) is expected
+
+
+def test_get_compressed():
+    """Test that the payload is generated once and stored compressed."""
+    backend = MockMemcacheClient()
+    cache = RevalidatingCache(
+        MemcacheCache(pool=MemcachePool(client_factory=lambda: backend)),
+        ttl=60,
+        stale=60,
+    )
+    calls = []
+
+    def generate():
+        calls.append(1)
+        return '{"data": []}'
+
+    for _ in range(2):
+        payload = get_compressed(cache, "/k", generate)
+        assert gzip.decompress(payload) == b'{"data": []}'
+    assert len(calls) == 1
+    assert backend.get("/k")[8:] == payload
+
+
+def test_gzip_chunks():
+    """Test compressing the chunks as they are generated."""
+    chunks = ["{", '"a": "\u00e9"', b", ", '"b": 1}']
+    res = gzip.decompress(gzip_chunks(iter(chunks)))
+    assert res == '{"a": "\u00e9", "b": 1}'.encode("utf-8")
+
+
+def test_respond():
+    """Test sending the payload as is or decompressed."""
+    payload = gzip_compress(b"{}")
+    started = []
+
+    def start_response(status, headers):
+        started.append(dict(headers))
+
+    ctype = [("Content-Type", "application/json")]
+    gz = {"HTTP_ACCEPT_ENCODING": "gzip"}
+    assert respond(gz, start_response, payload, ctype) == [payload]
+    assert started[-1]["Content-Encoding"] == "gzip"
+    assert started[-1]["Vary"] == "Accept-Encoding"
+    assert started[-1]["Content-Length"] == str(len(payload))
+    assert respond({}, start_response, payload, ctype) == [b"{}"]
+    assert "Content-Encoding" not in started[-1]
+    assert started[-1]["Vary"] == "Accept-Encoding"
+    res = respond(gz, start_response, payload, ctype, "cb")
+    assert res == [b"cb({})"]
+    assert "Content-Encoding" not in started[-1]
+
+
+def test_gzip_stream():
+    """Test yielding the compressed pieces as the chunks are generated."""
+    chunks = ["{", '"a": "\u00e9"', b", ", '"b": 1}']
+    pieces = list(gzip_stream(iter(chunks)))
+    assert b"".join(pieces) == gzip_chunks(chunks)
+
+
+def test_respond_stream():
+    """Test sending the pieces as is or decompressed one at a time."""
+    pieces = list(gzip_stream([b"{", b"}"]))
+    started = []
+
+    def start_response(status, headers):
+        started.append(dict(headers))
+
+    ctype = [("Content-Type", "application/json")]
+    gz = {"HTTP_ACCEPT_ENCODING": "gzip"}
+    res = respond_stream(gz, start_response, iter(pieces), ctype)
+    assert list(res) == pieces
+    assert started[-1]["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in started[-1]
+    payload = gzip_compress(b"{}")
+    assert respond_stream(gz, start_response, [payload], ctype) == [payload]
+    assert started[-1]["Content-Length"] == str(len(payload))
+    res = respond_stream({}, start_response, iter(pieces), ctype)
+    assert b"".join(res) == b"{}"
+    assert "Content-Encoding" not in started[-1]
+    assert started[-1]["Vary"] == "Accept-Encoding"
+    res = respond_stream(gz, start_response, [payload], ctype, "cb")
+    assert b"".join(res) == b"cb({})"
+
+
+@pytest.mark.parametrize("callback", [None, "cb"])
+def test_respond_stream_disconnect(callback):
+    """Test that a client going away releases the generation."""
+    backend = MockMemcacheClient()
+    cache = RevalidatingCache(
+        MemcacheCache(pool=MemcachePool(client_factory=lambda: backend)),
+        ttl=60,
+        stale=60,
+        wait=0.1,
+    )
+
+    def generate():
+        return gzip_stream([b"{", b"}"])
+
+    def start_response(status, headers):
+        """Nothing to do."""
+
+    # Closed before being sent at all
+    body = respond_stream({}, start_response, cache.stream("/k", generate), [])
+    body.close()
+    assert not cache._flights
+    # Closed after sending the first bytes
+    body = respond_stream(
+        {}, start_response, cache.stream("/k", generate), [], callback
+    )
+    next(body)
+    assert "/k" in cache._flights
+    body.close()
+    assert not cache._flights
+    assert backend.get("/k/lock") is None
+    body = cache.stream("/k", generate)
+    res = respond_stream({}, start_response, body, [], callback)
+    assert b"".join(res) == (b"{}" if callback is None else b"cb({})")
+    assert cache.lookup("/k")[1]
+
+
+def test_huc12_static_callback(monkeypatch):
+    """Test that huc12.geojson wraps hits and misses within the callback."""
+    backend = MockMemcacheClient()
+    cache = RevalidatingCache(
+        MemcacheCache(pool=MemcachePool(client_factory=lambda: backend)),
+        ttl=60,
+        stale=60,
+    )
+    monkeypatch.setattr(huc12_static, "CACHE", cache)
+    monkeypatch.setattr(huc12_static, "do", lambda: '{"features": []}')
+    client = Client(huc12_static.application)
+    for _ in range(2):
+        res = client.get("/?callback=foo", headers={"Accept-Encoding": "gzip"})
+        assert res.get_data() == b'foo({"features": []})'
+        assert "Content-Encoding" not in res.headers
+    res = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert gzip.decompress(res.get_data()) == b'{"features": []}'
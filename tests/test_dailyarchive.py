@@ -0,0 +1,132 @@
+"""Test the nightly single day shapefile archive."""
+
+from datetime import date
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from depbackend import dailyarchive
+from depbackend.aggregate import COLUMNS
+from depbackend.dailyarchive import (
+    get_attributes,
+    get_day_members,
+    write_days,
+    write_static,
+)
+from depbackend.dl.shapefile import shapefile_members
+
+DT = date(2025, 7, 1)
+
+
+@pytest.fixture
+def hucs(monkeypatch):
+    """Provide the HUC12 geometries and results without a database."""
+    idx = pd.Index([3, 5, 8], name="huc12_id")
+    df = gpd.GeoDataFrame(
+        {
+            "name": ["One", None, "Trois"],
+            "dominant_tillage": ["1", "2", None],
+            "avg_slope_ratio": [0.01, np.nan, 0.03],
+        },
+        geometry=shapely.buffer(shapely.points([0, 10, 20], 0), 4),
+        index=idx,
+        crs="EPSG:5070",
+    ).rename_geometry("geom")
+    daily = pd.DataFrame(
+        {
+            "valid": [DT, DT, date(2025, 7, 2)],
+            "huc12_id": [3, 8, 5],
+            "row_count": [1, 1, 1],
+            "qc_precip_mm": [10.0, 20.0, 1.0],
+            "avg_runoff_mm": [1.0, None, 0.1],
+            "avg_loss_kgm2": [0.5, 0.25, 0.0],
+            "avg_delivery_kgm2": [0.4, 0.2, 0.0],
+        }
+    )
+    monkeypatch.setattr(
+        dailyarchive, "get_huc12_geometries", lambda _conn, _s: df
+    )
+    monkeypatch.setattr(dailyarchive, "get_version_label", lambda _c: "2.1")
+    monkeypatch.setattr(dailyarchive, "get_prj", lambda: b"PROJCS")
+    monkeypatch.setattr(
+        dailyarchive,
+        "get_daily_sums",
+        lambda _conn, sts, ets: daily[
+            (daily["valid"] >= sts) & (daily["valid"] <= ets)
+        ],
+    )
+    monkeypatch.setattr(
+        dailyarchive,
+        "get_day_version",
+        lambda _conn, dt: dailyarchive._day_version(
+            daily[daily["valid"] == dt]
+        ),
+    )
+    return df, daily
+
+
+@pytest.mark.parametrize("conv", ["metric", "english"])
+def test_matches_live(hucs, tmp_path, monkeypatch, conv):
+    """Test that the archive assembles the same zip members as live."""
+    df, daily = hucs
+    monkeypatch.setattr("depbackend.dl.shapefile.get_prj", lambda: b"PROJCS")
+    write_static(None, str(tmp_path))
+    write_days(None, date(2024, 12, 31), date(2025, 7, 3), str(tmp_path))
+    assert (tmp_path / "daily" / "2024" / "20241231.npz").is_file()
+    members = get_day_members(None, DT, conv, str(tmp_path))
+    obs = daily[daily["valid"] == DT].set_index("huc12_id")[COLUMNS]
+    live = gpd.GeoDataFrame(
+        get_attributes(df, obs, "2.1", conv), geometry=df["geom"].values
+    ).rename_geometry("geo")
+    expected = list(shapefile_members(live, "idepv2_20250701"))
+    assert [m[0] for m in members] == [m[0] for m in expected]
+    for (name, payload), (_, ref) in zip(members, expected, strict=True):
+        assert payload == ref, name
+
+
+def test_static_rewritten_on_change(hucs, tmp_path):
+    """Test that a geometry change gets a new stamp, removing the old."""
+    df, _daily = hucs
+    stamp = write_static(None, str(tmp_path))
+    assert write_static(None, str(tmp_path)) == stamp
+    df.loc[3, "name"] = "Uno"
+    stamp2 = write_static(None, str(tmp_path))
+    assert stamp2 != stamp
+    assert [p.name for p in (tmp_path / "static").iterdir()] == [stamp2]
+    assert (tmp_path / "CURRENT").read_text() == stamp2
+
+
+def test_missing(tmp_path):
+    """Test that the lack of an archive means falling back."""
+    assert get_day_members(None, DT, "metric", str(tmp_path)) is None
+
+
+def test_reprocessed(hucs, tmp_path):
+    """Test that a date reprocessed since being archived falls back."""
+    _df, daily = hucs
+    write_static(None, str(tmp_path))
+    write_days(None, DT, DT, str(tmp_path))
+    assert get_day_members(None, DT, "metric", str(tmp_path)) is not None
+    daily.loc[0, "avg_loss_kgm2"] = 0.75
+    assert get_day_members(None, DT, "metric", str(tmp_path)) is None
+    write_days(None, DT, DT, str(tmp_path))
+    assert get_day_members(None, DT, "metric", str(tmp_path)) is not None
+    # A HUC12 gaining results for the date
+    daily.loc[3] = [DT, 5, 1, 0.0, 0.0, 0.0, 0.0]
+    assert get_day_members(None, DT, "metric", str(tmp_path)) is None
+
+
+def test_unversioned(hucs, tmp_path):
+    """Test that a date archived without a version falls back."""
+    write_static(None, str(tmp_path))
+    path = tmp_path / "daily" / "2025" / "20250701.npz"
+    path.parent.mkdir(parents=True)
+    np.savez(
+        path,
+        huc12_id=np.array([3]),
+        **{col: np.array([1.0]) for col in COLUMNS},
+    )
+    assert get_day_members(None, DT, "metric", str(tmp_path)) is None
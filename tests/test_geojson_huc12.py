@@ -0,0 +1,172 @@
+"""Test the streaming GeoJSON encoder of geojson/huc12.
+
+The expected output within ``data/huc12_geojson_baseline*.json`` was written
+by the service's previous ``do()``, which parsed the PostGIS GeoJSON and
+serialized the whole FeatureCollection, given the same database rows.
+"""
+
+import contextlib
+import gzip
+import os
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from dailyerosion.reference import KG_M2_TO_TON_ACRE
+from pymemcache.test.utils import MockMemcacheClient
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from depbackend.aggregate import english_numeric
+from depbackend.cache import MemcacheCache, MemcachePool, RevalidatingCache
+from depbackend.geojson import huc12 as service
+from depbackend.geometry import normalize_geojson
+
+DATADIR = os.path.join(os.path.dirname(__file__), "data")
+POSTGIS = [
+    '{"type":"MultiPolygon","coordinates":[[[[-93.1,42],[-93,42.0001],'
+    "[-93.0001,41.9],[-93.1,42]]]]}",
+    '{"type":"Polygon","coordinates":[[[-95.25,40.5],[-95,40.5],'
+    "[-95,40.75],[-95.25,40.5]]]}",
+    '{"type":"Polygon","coordinates":[[[-91,43],[-90.5,43],'
+    "[-90.5,43.5],[-91,43]]]}",
+]
+RAMPS = {"english": [[0, 0.1, 1], [0, 1, 10], [0, 10, 100]]}
+
+
+def _baseline(name: str) -> str:
+    """Read the frozen output of the previous implementation."""
+    with open(os.path.join(DATADIR, name), encoding="utf-8") as fh:
+        return fh.read()
+
+
+def _hucs():
+    """The HUC12 store frame."""
+    return pd.DataFrame(
+        {
+            "huc12_code": ["070801050306", "102300070211", "070600040601"],
+            "states": ["IA", "IA,NE", "MN"],
+            "geojson": [normalize_geojson(val) for val in POSTGIS],
+        },
+        index=pd.Index([1, 2, 3], name="huc12_id"),
+    )
+
+
+def _sums(factor: float):
+    """Metric period sums, with the third HUC12 having no results."""
+    return pd.DataFrame(
+        {
+            "avg_loss_kgm2": [0.12 / factor, 1.5 / factor],
+            "qc_precip_mm": [1.01 * 25.4, 0.5 * 25.4],
+            "avg_delivery_kgm2": [0.0, 0.125 / factor],
+            "avg_runoff_mm": [0.33 * 25.4, 0.34 * 25.4],
+        },
+        index=pd.Index([1, 2], name="huc12_id"),
+    )
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Stand in for the database and clock."""
+
+    class Result:
+        """Result of the version label query."""
+
+        def fetchone(self):
+            """Return the row."""
+            return ("v2025",)
+
+    class FakeConn:
+        """Answers the version label query."""
+
+        def execute(self, *_args):
+            """Run the query."""
+            return Result()
+
+    conn = FakeConn()
+    monkeypatch.setattr(
+        service,
+        "get_sqlalchemy_conn",
+        lambda _db: contextlib.nullcontext(conn),
+    )
+    monkeypatch.setattr(
+        service, "get_huc12_geometries", lambda _conn, _scenario: _hucs()
+    )
+    calls = []
+
+    def get_period_sums(_conn, _scenario, _sts, _ets, ids=None):
+        """Count the queries."""
+        calls.append(ids)
+        return _sums(KG_M2_TO_TON_ACRE) if ids is None else _sums(1).iloc[:0]
+
+    monkeypatch.setattr(service, "get_period_sums", get_period_sums)
+    monkeypatch.setattr(service, "utc", lambda: datetime(2024, 5, 2, 12))
+    monkeypatch.setattr(service, "RAMPS", RAMPS)
+    return calls
+
+
+def test_do_matches_baseline(database):
+    """Test that the streamed output is byte identical to the old one."""
+    res = "".join(service.do(date(2024, 5, 1), None, None))
+    assert res == _baseline("huc12_geojson_baseline.json")
+
+
+def test_do_empty_matches_baseline(database):
+    """Test a domain without HUC12s."""
+    res = "".join(service.do(date(2024, 5, 1), date(2024, 6, 30), "ZZ"))
+    assert res == _baseline("huc12_geojson_baseline_empty.json")
+
+
+def test_stream_chunks():
+    """Test that splitting the output into chunks changes nothing."""
+    hucs = _hucs()
+    obs = english_numeric(_sums(KG_M2_TO_TON_ACRE), hucs.index)
+    header = {
+        "type": "FeatureCollection",
+        "dep_version_label": "v2025",
+        "date": "2024-05-01",
+        "date2": None,
+    }
+    footer = {
+        "generation_time": "2024-05-02T12:00:00Z",
+        "count": 3,
+        "jenks": dict.fromkeys(
+            ["avg_loss", "qc_precip", "avg_delivery", "avg_runoff"],
+            RAMPS["english"][0],
+        ),
+    }
+    chunks = list(
+        service.stream_featurecollection(header, footer, hucs, obs, 100)
+    )
+    assert len(chunks) > 1
+    assert "".join(chunks) == _baseline("huc12_geojson_baseline.json")
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "identity"])
+def test_application_streams_miss(database, monkeypatch, encoding):
+    """Test that a miss is streamed and its gzip output cached."""
+    backend = MockMemcacheClient()
+    pool = MemcachePool(client_factory=lambda: backend)
+    monkeypatch.setattr(
+        service,
+        "CACHE",
+        RevalidatingCache(MemcacheCache(pool=pool), ttl=60, stale=60),
+    )
+    expected = _baseline("huc12_geojson_baseline.json").encode("utf-8")
+    builder = EnvironBuilder(
+        query_string="date=2024-05-01",
+        headers={"Accept-Encoding": encoding},
+    )
+    for _ in range(2):
+        app_iter, status, headers = run_wsgi_app(
+            service.application, builder.get_environ()
+        )
+        body = b"".join(app_iter)
+        assert status == "200 OK"
+        if encoding == "gzip":
+            assert headers["Content-Encoding"] == "gzip"
+            body = gzip.decompress(body)
+        assert body == expected
+    # The second request was a cache hit
+    assert database == [None]
+    cached = backend.get("/geojson/huc12.gz/20240501//")
+    assert gzip.decompress(cached[8:]) == expected
@@ -0,0 +1,69 @@
+"""Test the HUC12 geometry store helpers."""
+
+import gc
+import weakref
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from depbackend import geometry
+from depbackend.geometry import (
+    build_state_index,
+    filter_states,
+    get_state_index,
+)
+
+
+def make_hucs() -> gpd.GeoDataFrame:
+    """A few HUC12s, with some spanning states."""
+    return gpd.GeoDataFrame(
+        {"states": ["IA", "IA,MN", "mn", None, "KS, NE"]},
+        geometry=shapely.points(np.arange(5), 0),
+        index=pd.Index([10, 20, 30, 40, 50], name="huc12_id"),
+    )
+
+
+def test_build_state_index():
+    """Test the inverted index."""
+    index = build_state_index(make_hucs()["states"])
+    assert sorted(index) == ["IA", "KS", "MN", "NE"]
+    np.testing.assert_array_equal(index["MN"], [1, 2])
+    np.testing.assert_array_equal(index["NE"], [4])
+
+
+def test_filter_states():
+    """Test that results match the former regex filter, in order."""
+    hucs = make_hucs()
+    for states in [["IA"], ["mn", "IA"], ["NE"], ["XX"], []]:
+        res = filter_states(hucs, states)
+        if states:
+            pattern = "|".join(states)
+            expected = hucs[
+                hucs["states"].str.contains(pattern, case=False, na=False)
+            ]
+        else:
+            expected = hucs.iloc[:0]
+        pd.testing.assert_frame_equal(res, expected)
+
+
+def test_state_index_cached_by_identity():
+    """Test that the index is reused for the same frame only."""
+    hucs = make_hucs()
+    assert get_state_index(hucs) is get_state_index(hucs)
+    other = make_hucs()
+    assert get_state_index(other) is not get_state_index(hucs)
+
+
+def test_state_index_freed():
+    """Test that the index does not keep its frame alive."""
+    hucs = make_hucs()
+    get_state_index(hucs)
+    ref = weakref.ref(hucs)
+    key = id(hucs)
+    assert key in geometry._STATE_INDEX
+    del hucs
+    gc.collect()
+    assert ref() is None
+    assert key not in geometry._STATE_INDEX
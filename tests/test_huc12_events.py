@@ -0,0 +1,159 @@
+"""Test the columnar rollups and caching of geojson/huc12_events."""
+
+import contextlib
+import json
+import re
+import zipfile
+from datetime import date, datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from werkzeug.test import Client
+
+from depbackend.geojson import huc12_events
+from depbackend.geojson.huc12_events import summarize, to_json, to_xlsx
+
+GENERATED = datetime(2024, 5, 2, 12)
+
+
+def _daily():
+    """Build some daily results spanning two years."""
+    rng = np.random.default_rng(0)
+    valid = pd.date_range("2023-11-15", "2024-02-10")
+    df = pd.DataFrame({"valid": valid})
+    for col in huc12_events.COLUMNS:
+        df[col] = np.where(
+            rng.random(len(valid)) < 0.3, rng.gamma(1, 2, len(valid)), 0
+        )
+    return df
+
+
+def _legacy(df) -> str:
+    """Encode the way the service used to, one row at a time."""
+    res = {"results": [], "huc12": "102300070211"}
+    res["generation_time"] = GENERATED.strftime("%Y-%m-%dT%H:%M:%SZ")
+    for _, row in df.iterrows():
+        res["results"].append(
+            dict(
+                date=row["valid"].strftime("%Y-%m-%d"),
+                avg_loss=row["avg_loss"],
+                avg_loss_events=row["avg_loss_events"],
+                avg_delivery=row["avg_delivery"],
+                avg_delivery_events=row["avg_delivery_events"],
+                qc_precip=row["qc_precip"],
+                qc_precip_events=row["qc_precip_events"],
+                avg_runoff=row["avg_runoff"],
+                avg_runoff_events=row["avg_runoff_events"],
+            )
+        )
+    return json.dumps(res)
+
+
+def test_json_matches_legacy():
+    """Test that the columnar encoding matches the iterrows one."""
+    for mode in ["daily", "monthly", "yearly"]:
+        df = summarize(_daily(), mode)
+        assert to_json(df, "102300070211", GENERATED) == _legacy(df)
+
+
+def _xlsx_header(payload: bytes) -> list[str]:
+    """The workbook's column names, which are its first strings."""
+    with zipfile.ZipFile(BytesIO(payload)) as zf:
+        strings = zf.read("xl/sharedStrings.xml").decode("utf-8")
+    return re.findall(r"<t>(.*?)</t>", strings)
+
+
+def test_xlsx_columns():
+    """Test that the workbooks keep their legacy columns."""
+    daily = _daily()
+    variables = ["avg_loss", "avg_delivery", "qc_precip", "avg_runoff"]
+    events = [f"{col}_events" for col in variables]
+    res = _xlsx_header(to_xlsx(summarize(daily, "daily"), "1", "daily"))
+    assert res == ["valid", *variables]
+    res = _xlsx_header(to_xlsx(summarize(daily, "yearly"), "1", "yearly"))
+    assert res == ["yr", *variables, *events, "valid"]
+    res = _xlsx_header(to_xlsx(summarize(daily, "monthly"), "1", "monthly"))
+    assert res == ["valid", *variables, *events]
+
+
+def test_rollups():
+    """Test the monthly and yearly sums and event counts."""
+    daily = _daily()
+    monthly = summarize(daily, "monthly")
+    assert monthly["valid"].dt.strftime("%Y-%m").tolist() == [
+        "2023-11",
+        "2023-12",
+        "2024-01",
+        "2024-02",
+    ]
+    yearly = summarize(daily, "yearly")
+    assert yearly["valid"].dt.strftime("%Y-%m-%d").tolist() == [
+        "2023-01-01",
+        "2024-01-01",
+    ]
+    ones = daily[daily["valid"].dt.year == 2024]
+    assert np.isclose(
+        yearly["qc_precip"].iloc[1], ones["qc_precip_mm"].sum() / 25.4
+    )
+    assert (
+        yearly["avg_loss_events"].iloc[1] == (ones["avg_loss_kgm2"] > 0).sum()
+    )
+    assert monthly["avg_runoff_events"].sum() == (
+        (daily["avg_runoff_mm"] > 0).sum()
+    )
+    assert (summarize(daily, "daily")["qc_precip_events"] == 1).all()
+
+
+def test_empty():
+    """Test a HUC12 or window without results."""
+    daily = _daily().iloc[:0]
+    for mode in ["daily", "monthly", "yearly"]:
+        df = summarize(daily, mode)
+        res = json.loads(to_json(df, "102300070211", GENERATED))
+        assert res["results"] == []
+        assert to_xlsx(df, "102300070211", mode)[:2] == b"PK"
+
+
+def test_application_cached(monkeypatch):
+    """Test that both formats are cached for the model day."""
+    store = {}
+    calls = []
+
+    class FakeCache:
+        """Dictionary backed cache."""
+
+        def get(self, key):
+            """Fetch."""
+            return store.get(key)
+
+        def set(self, key, value):
+            """Store."""
+            store[key] = value
+
+    def get_daily(_conn, huc12, sdate, edate):
+        """Count the database queries."""
+        calls.append((huc12, sdate, edate))
+        return _daily()
+
+    monkeypatch.setattr(huc12_events, "MEMCACHE", FakeCache())
+    monkeypatch.setattr(huc12_events, "get_daily", get_daily)
+    monkeypatch.setattr(
+        huc12_events,
+        "get_sqlalchemy_conn",
+        lambda _db: contextlib.nullcontext(None),
+    )
+    monkeypatch.setattr(
+        huc12_events, "get_last_date", lambda _conn, _s: "2024-02-10"
+    )
+    client = Client(huc12_events.application)
+    url = "/?huc12=102300070211&mode=monthly&sdate=2024-01-01&callback=cb"
+    first = client.get(url).get_data()
+    assert first.startswith(b"cb(") and first.endswith(b")")
+    assert client.get(url).get_data() == first
+    assert calls == [("102300070211", date(2024, 1, 1), None)]
+    for _ in range(2):
+        res = client.get(url.replace("callback=cb", "format=xlsx"))
+        assert res.get_data()[:2] == b"PK"
+    assert len(calls) == 2
+    assert len(store) == 2
@@ -0,0 +1,114 @@
+"""Test the HUC12 vector tiles."""
+
+import contextlib
+from datetime import date
+
+import geopandas as gpd
+import mapbox_vector_tile
+import pandas as pd
+import pytest
+import shapely
+from pyiem.exceptions import IncompleteWebRequest
+
+from depbackend.geojson import huc12_mvt
+from depbackend.geojson.huc12_mvt import (
+    WORLD,
+    Schema,
+    make_tile,
+    mercator_to_lonlat,
+    tile_bounds,
+    tile_hucs,
+)
+
+
+def _store():
+    """Build a small HUC12 store over central Iowa."""
+    geoms = gpd.GeoSeries(
+        [
+            shapely.box(-93.7, 41.5, -93.6, 41.6),
+            shapely.box(-93.6, 41.5, -93.5, 41.6),
+            shapely.box(-80.1, 35.0, -80.0, 35.1),
+        ],
+        index=pd.Index([10, 11, 12], name="huc12_id"),
+        crs=4326,
+    )
+    return gpd.GeoDataFrame(
+        {
+            "huc12_code": ["070801050306", "070801050307", "030401010101"],
+            "geom": geoms.to_crs(5070),
+            "geom_4326": geoms,
+        },
+        geometry="geom",
+    )
+
+
+def test_tile_bounds():
+    """Test the web mercator tile math."""
+    assert tile_bounds(0, 0, 0) == (-WORLD, -WORLD, WORLD, WORLD)
+    assert tile_bounds(1, 1, 0) == (0, 0, WORLD, WORLD)
+    lon, lat = mercator_to_lonlat(WORLD, WORLD)
+    assert lon == 180
+    assert abs(lat - 85.0511) < 1e-4
+
+
+def test_make_tile():
+    """Test that only the HUC12s within the tile are encoded."""
+    hucs = _store()
+    obs = pd.DataFrame(
+        {"avg_loss": [1.5, 0.25], "qc_precip": [1.0, 2.0]},
+        index=pd.Index([10, 11], name="huc12_id"),
+    )
+    obs = obs.reindex(hucs.index).fillna(0)
+    # z7 tile over central Iowa
+    hits = tile_hucs(hucs, 7, 30, 47)
+    assert hits.index.tolist() == [10, 11]
+    tile = mapbox_vector_tile.decode(make_tile(hits, obs, 7, 30, 47))
+    features = tile["huc12"]["features"]
+    assert sorted(feat["id"] for feat in features) == [10, 11]
+    props = {feat["id"]: feat["properties"] for feat in features}
+    assert props[10]["huc_12"] == "070801050306"
+    assert props[10]["avg_loss"] == 1.5
+    assert props[11]["qc_precip"] == 2.0
+    hits = tile_hucs(hucs, 7, 0, 0)
+    assert hits.empty
+    empty = mapbox_vector_tile.decode(make_tile(hits, obs, 7, 0, 0))
+    assert not empty.get("huc12", {}).get("features")
+
+
+def test_schema_tile_range():
+    """Test that tiles outside the zoom level's grid are rejected."""
+    with pytest.raises(IncompleteWebRequest):
+        Schema(z=1, x=2, y=0, date="2024-01-01")
+
+
+def test_do_rounding(monkeypatch):
+    """Test that values are rounded half up, like the GeoJSON services."""
+    monkeypatch.setattr(
+        huc12_mvt,
+        "get_sqlalchemy_conn",
+        lambda _db: contextlib.nullcontext(None),
+    )
+    monkeypatch.setattr(
+        huc12_mvt, "get_huc12_geometries", lambda _conn, _s: _store()
+    )
+    obs = pd.DataFrame(
+        {
+            "qc_precip_mm": [0.125 * 25.4],
+            "avg_runoff_mm": [None],
+            "avg_loss_kgm2": [0.0],
+            "avg_delivery_kgm2": [0.0],
+        },
+        index=pd.Index([10], name="huc12_id"),
+    )
+    monkeypatch.setattr(
+        huc12_mvt, "get_period_sums", lambda _conn, _s, _a, _b, _ids: obs
+    )
+    tile = mapbox_vector_tile.decode(
+        huc12_mvt.do(7, 30, 47, date(2024, 5, 1), None)
+    )
+    props = {
+        feat["id"]: feat["properties"] for feat in tile["huc12"]["features"]
+    }
+    assert props[10]["qc_precip"] == pytest.approx(0.13)
+    assert props[10]["avg_runoff"] == 0
+    assert props[11]["qc_precip"] == 0
@@ -0,0 +1,46 @@
+"""Test the binned kernel density estimate of the slope plot."""
+
+import numpy as np
+
+from depbackend.auto.huc12_slopes import binned_kde, density_levels
+
+
+def _direct_kde(x, y, xx, yy):
+    """Evaluate the Gaussian KDE directly at every grid point."""
+    cov = np.cov(x, y) * len(x) ** (-1.0 / 3.0)
+    inv = np.linalg.inv(cov)
+    dx = xx.ravel()[:, np.newaxis] - x
+    dy = yy.ravel()[:, np.newaxis] - y
+    dist = inv[0, 0] * dx**2 + 2 * inv[0, 1] * dx * dy + inv[1, 1] * dy**2
+    norm = 2 * np.pi * np.sqrt(np.linalg.det(cov)) * len(x)
+    return (np.exp(-0.5 * dist).sum(axis=1) / norm).reshape(xx.shape)
+
+
+def test_binned_kde_matches_direct():
+    """Test that binning does not materially change the estimate."""
+    rng = np.random.default_rng(0)
+    x = rng.gamma(2.0, 50.0, 300)
+    y = rng.gamma(2.0, 2.0, 300) + 0.05 * x
+    xx, yy, density = binned_kde(x, y, gridsize=100)
+    direct = _direct_kde(x, y, xx, yy)
+    assert np.abs(density - direct).max() < 0.03 * direct.max()
+    cell = (xx[0, 1] - xx[0, 0]) * (yy[1, 0] - yy[0, 0])
+    assert abs(density.sum() * cell - 1) < 0.01
+
+
+def test_binned_kde_degenerate():
+    """Test that singular inputs are skipped, like seaborn does."""
+    assert binned_kde(np.array([1.0, 2.0]), np.array([1.0, 2.0])) is None
+    x = np.arange(10.0)
+    assert binned_kde(x, np.ones(10)) is None
+    assert binned_kde(x, x * 2) is None
+
+
+def test_density_levels():
+    """Test that levels increase and span the density."""
+    rng = np.random.default_rng(1)
+    res = binned_kde(rng.normal(size=500), rng.normal(size=500))
+    levels = density_levels(res[2])
+    assert len(levels) == 6
+    assert np.all(np.diff(levels) > 0)
+    assert levels[-1] <= res[2].max()
@@ -0,0 +1,62 @@
+"""Test the HUC12 report pipeline."""
+
+import pandas as pd
+
+from depbackend.auto.huc12report import (
+    compute_crop_mix,
+    generate_summary_table,
+    run_stages,
+    server_timing,
+)
+
+
+def test_run_stages():
+    """Test that stages run within the pool and are timed."""
+    results, timings = run_stages(
+        {"square": (pow, 3, 2), "total": (sum, [1, 2, 3])}
+    )
+    assert results == {"square": 9, "total": 6}
+    assert set(timings) == {"square", "total"}
+    assert all(val >= 0 for val in timings.values())
+
+
+def test_server_timing():
+    """Test the header formatting."""
+    assert server_timing({"a": 0.5, "b": 0.0012}) == "a;dur=500.0, b;dur=1.2"
+
+
+def test_generate_summary_table():
+    """Test that the yearly table is built from a summary frame."""
+    df = pd.DataFrame(
+        {
+            "precip": [30.0, 20.0],
+            "runoff": [2.0, 1.0],
+            "loss": [1.5, 0.5],
+            "delivery": [1.0, 0.2],
+            "pdays": [2.0, 1.0],
+            "events": [20.0, 10.0],
+        },
+        index=pd.Index([2008, 2009], name="year"),
+    )
+    table = generate_summary_table(df)
+    # Two header rows, the years and the average
+    assert len(table._cellvalues) == 5
+    assert table._cellvalues[3][0] == "2009*"
+    assert table._cellvalues[4][1] == "30.00"
+
+
+def test_compute_crop_mix():
+    """Test the pivot of landuse strings into yearly crop fractions."""
+    landuse = pd.DataFrame(
+        {"landuse": ["CBP", "BBC", "CB", None], "count": [2, 1, 1, 5]}
+    )
+    mix = compute_crop_mix(landuse)
+    assert mix.index.tolist() == [2007, 2008, 2009]
+    assert mix.at[2007, "C"] == 0.75
+    assert mix.at[2007, "B"] == 0.25
+    assert mix.at[2008, "B"] == 1.0
+    assert mix.at[2009, "P"] == 0.5
+    assert mix.at[2009, "C"] == 0.25
+    # The short string has no code for 2009, so is other
+    assert mix.at[2009, "other"] == 0.25
+    assert compute_crop_mix(landuse.iloc[3:]).empty
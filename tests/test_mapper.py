@@ -0,0 +1,97 @@
+"""Test the vectorized HUC12 polygon rendering in the mapper."""
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.path import Path
+from matplotlib.patches import Polygon
+from shapely.geometry import MultiPolygon, box
+from shapely.geometry import Polygon as ShapelyPolygon
+
+from depbackend.auto.mapper import (
+    Schema,
+    add_polygons,
+    geometries_to_paths,
+    get_render_key,
+)
+
+
+def _grid(count):
+    """Generate some adjacent, slightly irregular polygons."""
+    rng = np.random.default_rng(42)
+    side = int(np.ceil(np.sqrt(count)))
+    geoms = []
+    for idx in range(count):
+        x, y = idx % side, idx // side
+        jitter = rng.uniform(-0.2, 0.2, size=2)
+        geoms.append(
+            ShapelyPolygon(
+                [
+                    (x, y),
+                    (x + 1 + jitter[0], y),
+                    (x + 1, y + 1 + jitter[1]),
+                    (x, y + 1),
+                ]
+            )
+        )
+    return geoms, rng.random((count, 4)), side
+
+
+def _render(draw, side) -> np.ndarray:
+    """Render to an RGBA array."""
+    fig = Figure(figsize=(4, 4), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    draw(ax)
+    ax.set_xlim(-1, side + 1)
+    ax.set_ylim(-1, side + 1)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def test_pixel_equivalent_to_patches():
+    """Test that the collection renders like one Polygon patch per geom."""
+    geoms, colors, side = _grid(100)
+
+    def legacy(ax):
+        for geom, color in zip(geoms, colors, strict=True):
+            ax.add_patch(
+                Polygon(geom.exterior.coords, fc=color, ec="k", lw=0.1)
+            )
+
+    def vectorized(ax):
+        add_polygons(ax, geoms, colors)
+
+    np.testing.assert_array_equal(
+        _render(legacy, side), _render(vectorized, side)
+    )
+
+
+def test_multipolygon_and_interiors():
+    """Test that parts and holes are retained."""
+    holey = box(0, 0, 10, 10).difference(box(4, 4, 6, 6))
+    multi = MultiPolygon([box(20, 0, 22, 2), box(30, 0, 32, 2)])
+    paths = geometries_to_paths([holey, multi, box(0, 20, 1, 21)])
+    assert len(paths) == 3
+    assert (paths[0].codes == Path.MOVETO).sum() == 2
+    assert (paths[1].codes == Path.MOVETO).sum() == 2
+    assert len(paths[2].vertices) == 5
+    # The hole should not be painted
+    img = _render(lambda ax: add_polygons(ax, [holey], ["red"]), 10)
+    fig_white = np.array([255, 255, 255, 255])
+    np.testing.assert_array_equal(img[200, 200], fig_white)
+    assert img[300, 100][0] == 255 and img[300, 100][1] == 0
+
+
+def test_render_key_normalizes_dates():
+    """Test that equivalent date forms share a render cache key."""
+    bydate = Schema(sdate="2024-05-01", edate="2024-05-03")
+    byparts = Schema(year=2024, month=5, day=1, year2=2024, month2=5, day2=3)
+    assert get_render_key(bydate, "2024-06-01") == get_render_key(
+        byparts, "2024-06-01"
+    )
+    assert get_render_key(bydate, "2024-06-01") != get_render_key(
+        bydate, "2024-06-02"
+    )
+    other = Schema(sdate="2024-05-01", edate="2024-05-03", v="qc_precip")
+    assert get_render_key(other, None) != get_render_key(bydate, None)
@@ -0,0 +1,53 @@
+"""Test the multi-point request helpers."""
+
+import numpy as np
+import pytest
+from pyiem.iemre import get_gid
+
+from depbackend.points import (
+    check_points,
+    get_bbox_gids,
+    get_gids,
+    parse_points,
+)
+
+
+def test_parse_points():
+    """Test the lon,lat pairs with a header and mixed separators."""
+    res = parse_points("lon,lat\n-93.5,42.0;-93.6, 42.1\r\n\n-93\t41")
+    assert res == [(-93.5, 42.0), (-93.6, 42.1), (-93.0, 41.0)]
+    assert parse_points([(1, 2)]) == [(1, 2)]
+    with pytest.raises(ValueError):
+        parse_points("-93.5,42,1")
+
+
+def test_check_points():
+    """Test what is rejected."""
+    check_points([(-93.5, 42.0)], 1)
+    for points in [[], [(-93.5, 42.0)] * 2, [(-193.5, 42.0)]]:
+        with pytest.raises(ValueError):
+            check_points(points, 1)
+
+
+def test_get_gids_matches_pyiem():
+    """Test the vectorized grid ids against get_gid."""
+    rng = np.random.default_rng(0)
+    lons = rng.uniform(-130, -60, 1000)
+    lats = rng.uniform(20, 55, 1000)
+    gids = get_gids(lons, lats)
+    for lon, lat, gid in zip(lons, lats, gids, strict=True):
+        expected = get_gid(lon, lat)
+        assert gid == (-1 if expected is None else expected)
+
+
+def test_get_bbox_gids():
+    """Test that the cells overlapping the bbox are found."""
+    gids, lons, lats = get_bbox_gids(-93.70, 41.86, -93.23, 42.21)
+    assert len(gids) == 5 * 4
+    assert len(np.unique(gids)) == len(gids)
+    for lon, lat, gid in zip(lons, lats, gids, strict=True):
+        assert get_gid(lon, lat) == gid
+    for lon, lat in [(-93.70, 41.86), (-93.23, 42.21), (-93.5, 42.0)]:
+        assert get_gid(lon, lat) in gids
+    gids, _, _ = get_bbox_gids(0, 0, 1, 1)
+    assert len(gids) == 0
@@ -0,0 +1,58 @@
+"""Test the buffered request log writer."""
+
+import threading
+
+from depbackend.requestlog import BufferedWriter
+
+
+class Recorder:
+    """Collect what gets written."""
+
+    def __init__(self):
+        """Constructor."""
+        self.batches = []
+        self.written = threading.Event()
+
+    def __call__(self, key, records):
+        """Record the batch."""
+        self.batches.append((key, list(records)))
+        self.written.set()
+
+
+def test_size_threshold_writes_in_background():
+    """Test that reaching max_records wakes the writer."""
+    rec = Recorder()
+    writer = BufferedWriter(rec, max_records=3, interval=60)
+    for i in range(3):
+        writer.add("dep", {"i": i})
+    assert rec.written.wait(5)
+    assert rec.batches == [("dep", [{"i": 0}, {"i": 1}, {"i": 2}])]
+
+
+def test_interval_writes_by_key():
+    """Test that the interval flushes each key separately."""
+    rec = Recorder()
+    writer = BufferedWriter(rec, max_records=100, interval=0.05)
+    writer.add("dep", {"i": 0})
+    writer.add("dep_europe", {"i": 1})
+    writer.add("dep", {"i": 2})
+    assert rec.written.wait(5)
+    writer.flush()
+    merged = {}
+    for key, records in rec.batches:
+        merged.setdefault(key, []).extend(records)
+    assert merged == {"dep": [{"i": 0}, {"i": 2}], "dep_europe": [{"i": 1}]}
+
+
+def test_failures_and_overflow_are_dropped():
+    """Test that write errors and a full queue do not raise."""
+
+    def _fail(_key, _records):
+        raise ValueError("database down")
+
+    writer = BufferedWriter(_fail, max_records=100, interval=60, max_queued=2)
+    for i in range(5):
+        writer.add("dep", {"i": i})
+    assert writer._count == 2
+    writer.flush()
+    assert writer._count == 0
@@ -0,0 +1,69 @@
+"""Test the HUC12 search index."""
+
+from depbackend.search import HUC12SearchIndex, normalize, trigrams
+
+CODES = [
+    "101400010101",
+    "101400010102",
+    "070801050302",
+    "070801050303",
+    "071000040501",
+]
+NAMES = [
+    "Headwaters Skunk River",
+    "Town of Ames-Skunk River",
+    "Squaw Creek",
+    "Ioway Creek",
+    None,
+]
+
+
+def test_normalize_and_trigrams():
+    """Test the pg_trgm style trigrams."""
+    assert normalize("Town of Ames-Skunk  River") == "town of ames skunk river"
+    assert trigrams("cat") == {"  c", " ca", "cat", "at "}
+    assert trigrams("cat", partial=True) == {"  c", " ca", "cat"}
+
+
+def test_prefix():
+    """Test that code prefixes come first, in order."""
+    index = HUC12SearchIndex(CODES, NAMES)
+    res = index.search("1014")
+    assert [r["huc_12"] for r in res] == CODES[:2]
+    assert index.search("0708010503")[1]["name"] == "Ioway Creek"
+
+
+def test_fuzzy_ranking():
+    """Test that names starting with the query rank first."""
+    index = HUC12SearchIndex(CODES, NAMES)
+    res = [r["name"] for r in index.search("skunk")]
+    assert res == ["Headwaters Skunk River", "Town of Ames-Skunk River"]
+    res = [r["name"] for r in index.search("Ioway Cr")]
+    assert res[0] == "Ioway Creek"
+    # A typo is still found
+    assert index.search("Squaw Creak")[0]["name"] == "Squaw Creek"
+    # Partial words, as typed into an autocomplete
+    assert index.search("Hea")[0]["name"] == "Headwaters Skunk River"
+
+
+def test_no_regex():
+    """Test that regex characters are just text."""
+    index = HUC12SearchIndex(CODES, NAMES)
+    assert index.search(".*") == []
+    assert index.search("") == []
+    assert index.search("zzzz") == []
+
+
+def test_short_queries():
+    """Test that short queries only match names and words starting so."""
+    index = HUC12SearchIndex(CODES, NAMES)
+    res = [r["name"] for r in index.search("s")]
+    assert res == [
+        "Squaw Creek",
+        "Headwaters Skunk River",
+        "Town of Ames-Skunk River",
+    ]
+    assert index.fuzzy("s", limit=2) == [2, 0]
+    assert index.fuzzy("cr") == [2, 3]
+    # No trigram matching, so no typos allowed
+    assert index.fuzzy("sx") == []
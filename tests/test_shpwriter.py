@@ -0,0 +1,76 @@
+"""Test the in-memory shapefile writer against GDAL."""
+
+from datetime import date
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from depbackend.shpwriter import write_dbf, write_shapefile, write_shp
+
+
+@pytest.fixture
+def gdf():
+    """A frame with the geometry and attribute types we write."""
+    geoms = list(
+        shapely.buffer(shapely.points(np.arange(5) * 10.0, 0), 4, quad_segs=4)
+    )
+    # Counter clockwise exterior, to check it gets reoriented
+    geoms[1] = shapely.Polygon([(0, 0), (1, 0), (1, 1), (0, 0)])
+    geoms[2] = shapely.MultiPolygon(
+        [
+            shapely.box(0, 0, 1, 1),
+            shapely.box(2, 2, 3, 3).difference(
+                shapely.box(2.2, 2.2, 2.5, 2.5)
+            ),
+        ]
+    )
+    return gpd.GeoDataFrame(
+        {
+            "HUC12_ID": np.arange(5),
+            "NAME": ["Abc", "Défg", "x" * 100, "", "e"],
+            "AVG_SLP1": [0.1, np.nan, 123456789.123456789, -1e-20, 5],
+            "VERSION": "2.1",
+        },
+        geometry=geoms,
+        crs="EPSG:5070",
+    )
+
+
+def test_matches_gdal(gdf, tmp_path):
+    """Test that the parts are byte identical to what GDAL writes."""
+    gdf.to_file(tmp_path / "ref.shp")
+    parts = write_shapefile(gdf)
+    for suffix in ["shp", "shx", "dbf", "cpg"]:
+        ref = (tmp_path / f"ref.{suffix}").read_bytes()
+        if suffix == "dbf":
+            # Skip the last modified date
+            assert parts[suffix][4:] == ref[4:]
+        else:
+            assert parts[suffix] == ref
+
+
+def test_roundtrip(gdf, tmp_path):
+    """Test that GDAL reads back what we wrote, including nulls."""
+    gdf.loc[3, "geometry"] = None
+    for suffix, payload in write_shapefile(gdf).items():
+        (tmp_path / f"res.{suffix}").write_bytes(payload)
+    res = gpd.read_file(tmp_path / "res.shp")
+    assert res["NAME"].tolist()[:2] == ["Abc", "Défg"]
+    assert res["HUC12_ID"].tolist() == list(range(5))
+    assert res.geometry.isna().tolist() == [False, False, False, True, False]
+    assert res.geometry[2].equals(gdf.geometry[2])
+
+
+def test_empty(tmp_path):
+    """Test writing no records."""
+    shp, shx = write_shp([])
+    assert len(shp) == 100
+    assert len(shx) == 100
+    dbf = write_dbf(
+        gpd.pd.DataFrame({"A": np.array([], dtype=int)}),
+        today=date(2026, 1, 2),
+    )
+    assert dbf[:4] == bytes([3, 126, 1, 2])
+    assert dbf[-1:] == b"\x1a"
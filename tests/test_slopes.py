@@ -0,0 +1,104 @@
+"""Test the HUC12 slope index."""
+
+import os
+
+import pytest
+from pyiem.exceptions import IncompleteWebRequest
+
+from depbackend import slopes
+from depbackend.auto.huc12_slopes import Schema
+
+SLP = """97.5
+#
+# comment
+1
+100.0 1.0
+2
+0.0 0.0
+3 50.0
+0.00, 0.10 0.50, 0.10 1.00, 0.10
+3 50.0
+0.00, 0.20 0.50, 0.20 1.00, 0.20
+"""
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """Provide a fake slp tree."""
+    monkeypatch.setattr(
+        slopes, "SLPDIR", str(tmp_path / "{scenario}/slp/{huc8}/{huc4}")
+    )
+    monkeypatch.setattr(
+        slopes, "INDEXFN", str(tmp_path / "{scenario}/idx/{huc8}/{huc12}.npz")
+    )
+    slpdir = tmp_path / "0/slp/07060004/0601"
+    slpdir.mkdir(parents=True)
+    for fpath in [1, 2]:
+        (slpdir / f"0601_{fpath}.slp").write_text(SLP)
+    (slpdir / "0601_3.slp").write_text("garbage")
+    return tmp_path
+
+
+def test_get_slopes_builds_index(tree):
+    """Test that the index is built and then reused."""
+    df = slopes.get_slopes("070600040601", 0)
+    assert df["flowpath"].tolist() == [1, 2]
+    assert df["length"].tolist() == [100.0, 100.0]
+    assert abs(df["bulk_slope"].iloc[0] + 0.15) < 1e-9
+    indexfn = tree / "0/idx/07060004/070600040601.npz"
+    assert indexfn.exists()
+    # Make the slp files older, so the index is fresh and used
+    slpdir = tree / "0/slp/07060004/0601"
+    (slpdir / "0601_1.slp").write_text("garbage")
+    for path in [slpdir, *slpdir.iterdir()]:
+        os.utime(path, (0, 0))
+    assert len(slopes.get_slopes("070600040601", 0).index) == 2
+
+
+def test_get_slopes_rewritten_in_place(tree):
+    """Test that rewriting a slp file, which keeps the directory mtime,
+    rebuilds the index."""
+    slpdir = tree / "0/slp/07060004/0601"
+    for path in [slpdir, *slpdir.iterdir()]:
+        os.utime(path, (0, 0))
+    assert len(slopes.get_slopes("070600040601", 0).index) == 2
+    dirmtime = os.stat(slpdir).st_mtime
+    with open(slpdir / "0601_3.slp", "w") as fh:
+        fh.write(SLP)
+    assert os.stat(slpdir).st_mtime == dirmtime
+    assert len(slopes.get_slopes("070600040601", 0).index) == 3
+
+
+def test_refresh_rebuilds_stale(tree):
+    """Test the offline refresh only rebuilds stale indices."""
+    slopes.refresh(0)
+    indexfn = tree / "0/idx/07060004/070600040601.npz"
+    assert slopes.read_index(str(indexfn))["flowpath"].tolist() == [1, 2]
+    (tree / "0/slp/07060004/0601/0601_4.slp").write_text(SLP)
+    os.utime(indexfn, (0, 0))
+    slopes.refresh(0)
+    assert len(slopes.read_index(str(indexfn)).index) == 3
+
+
+def test_get_slopes_missing():
+    """Test that a missing HUC12 raises."""
+    with pytest.raises(slopes.NoDataFound):
+        slopes.get_slopes("999999999999", 0)
+
+
+@pytest.mark.parametrize(
+    "huc12,scenario", [("../../etc/x", 0), ("0706000406", 0), ("1" * 12, -1)]
+)
+def test_get_slopes_invalid(huc12, scenario):
+    """Test that paths are never built from invalid input."""
+    with pytest.raises(ValueError):
+        slopes.get_slopes(huc12, scenario)
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"huc12": "../../etc/x"}, {"scenario": -1}, {"scenario": 10**6}]
+)
+def test_schema_invalid(kwargs):
+    """Test that the service validates the HUC12 and scenario."""
+    with pytest.raises(IncompleteWebRequest):
+        Schema(**kwargs)
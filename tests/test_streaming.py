@@ -0,0 +1,124 @@
+"""Test the streaming file response helper."""
+
+import os
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from depbackend.streaming import file_response, stream_zip
+
+DATA = bytes(range(256)) * 1000
+
+
+class Response:
+    """Capture a WSGI response."""
+
+    def __init__(self, path, **environ):
+        """Call file_response with these HTTP_ headers."""
+        self.status = None
+        self.headers = {}
+        self.body = b"".join(
+            file_response(environ, self.start_response, str(path), "text/x")
+        )
+
+    def start_response(self, status, headers):
+        """WSGI start_response."""
+        self.status = status
+        self.headers = dict(headers)
+
+
+@pytest.fixture
+def path(tmp_path):
+    """Provide a file to serve."""
+    fn = tmp_path / "data.bin"
+    fn.write_bytes(DATA)
+    os.utime(fn, (1_700_000_000, 1_700_000_000))
+    return fn
+
+
+def test_full(path):
+    """Test a plain request."""
+    res = Response(path)
+    assert res.status == "200 OK"
+    assert res.body == DATA
+    assert res.headers["Content-Length"] == str(len(DATA))
+    assert res.headers["Last-Modified"] == "Tue, 14 Nov 2023 22:13:20 GMT"
+    assert res.headers["Accept-Ranges"] == "bytes"
+
+
+def test_file_closed(path, monkeypatch):
+    """Test that the file is closed once sent, even with a file wrapper."""
+    opened = []
+    real_open = open
+
+    def tracking_open(*args, **kwargs):
+        opened.append(real_open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    res = Response(
+        path, **{"wsgi.file_wrapper": lambda fh, _size: iter([fh.read()])}
+    )
+    assert res.body == DATA
+    assert len(opened) == 1
+    assert opened[0].closed
+
+
+def test_not_modified(path):
+    """Test the conditional requests."""
+    etag = Response(path).headers["ETag"]
+    res = Response(path, HTTP_IF_NONE_MATCH=f'"x", W/{etag}')
+    assert res.status == "304 Not Modified"
+    assert res.body == b""
+    assert Response(path, HTTP_IF_NONE_MATCH='"x"').status == "200 OK"
+    res = Response(
+        path, HTTP_IF_MODIFIED_SINCE="Tue, 14 Nov 2023 22:13:20 GMT"
+    )
+    assert res.status == "304 Not Modified"
+    res = Response(
+        path, HTTP_IF_MODIFIED_SINCE="Tue, 14 Nov 2023 22:13:19 GMT"
+    )
+    assert res.status == "200 OK"
+    assert Response(path, HTTP_IF_MODIFIED_SINCE="junk").status == "200 OK"
+
+
+@pytest.mark.parametrize(
+    "value,start,end",
+    [
+        ("bytes=0-99", 0, 99),
+        ("bytes=1000-", 1000, len(DATA) - 1),
+        ("bytes=-10", len(DATA) - 10, len(DATA) - 1),
+        ("bytes=5-9999999", 5, len(DATA) - 1),
+    ],
+)
+def test_range(path, value, start, end):
+    """Test partial content."""
+    res = Response(path, HTTP_RANGE=value)
+    assert res.status == "206 Partial Content"
+    assert res.body == DATA[start : end + 1]
+    assert res.headers["Content-Length"] == str(end - start + 1)
+    assert res.headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+
+
+def test_range_edge_cases(path):
+    """Test unsatisfiable, ignored and stale ranges."""
+    res = Response(path, HTTP_RANGE=f"bytes={len(DATA)}-")
+    assert res.status == "416 Range Not Satisfiable"
+    assert res.headers["Content-Range"] == f"bytes */{len(DATA)}"
+    assert Response(path, HTTP_RANGE="bytes=0-1,5-6").status == "200 OK"
+    res = Response(path, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"old"')
+    assert res.status == "200 OK"
+    assert res.body == DATA
+
+
+def test_stream_zip():
+    """Test that the streamed zip is readable and yields per member."""
+    members = [("a.txt", "hello"), ("b.bin", DATA)]
+    chunks = list(stream_zip(iter(members)))
+    assert len(chunks) == 3
+    with zipfile.ZipFile(BytesIO(b"".join(chunks))) as zf:
+        assert zf.namelist() == ["a.txt", "b.bin"]
+        assert zf.read("a.txt") == b"hello"
+        assert zf.read("b.bin") == DATA
+        assert zf.testzip() is None
@@ -0,0 +1,71 @@
+"""Test the WEPS hourly wind region mode."""
+
+import zipfile
+from io import BytesIO
+
+import pytest
+from pyiem.exceptions import IncompleteWebRequest
+
+from depbackend.dl import weps_hourly_wind
+from depbackend.dl.weps_hourly_wind import (
+    Schema,
+    get_region_manifest,
+    region_members,
+)
+from depbackend.streaming import stream_zip
+
+
+@pytest.fixture
+def winddir(tmp_path, monkeypatch):
+    """Provide wind files for a couple of grid ids."""
+
+    def get_wind_path(gid):
+        return tmp_path / f"{gid:06.0f}.win"
+
+    monkeypatch.setattr(weps_hourly_wind, "get_wind_path", get_wind_path)
+    return get_wind_path
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"lat": 42.0},
+        {"lat": 42.0, "lon": -93.5, "bbox": "-94,41,-93,42"},
+        {"bbox": "-94,41,-93"},
+        {"bbox": "-93,41,-94,42"},
+        {"points": "lon,lat"},
+    ],
+)
+def test_schema_invalid(kwargs):
+    """Test what is rejected."""
+    with pytest.raises(IncompleteWebRequest):
+        Schema(**kwargs)
+
+
+def test_points_zip(winddir):
+    """Test that points sharing a cell yield one file."""
+    query = Schema(points="-93.501,42.0;-93.499,42.0;-93.0,42.0;0,0")
+    manifest = get_region_manifest(query)
+    gids = manifest["gid"].tolist()
+    assert gids[0] == gids[1]
+    assert gids[3] == -1
+    winddir(gids[0]).write_bytes(b"wind" * 100_000)
+    manifest = get_region_manifest(query)
+    assert manifest["filename"].notna().tolist() == [True, True, False, False]
+    payload = b"".join(stream_zip(region_members(manifest)))
+    with zipfile.ZipFile(BytesIO(payload)) as zf:
+        assert zf.namelist() == [f"{gids[0]:06.0f}.win", "manifest.csv"]
+        assert zf.read(f"{gids[0]:06.0f}.win") == b"wind" * 100_000
+        assert (
+            zf.read("manifest.csv")
+            .decode()
+            .startswith("lon,lat,gid,filename\n-93.5010,42.0000,")
+        )
+
+
+def test_bbox_manifest(winddir):
+    """Test that a bbox maps to its grid cells."""
+    manifest = get_region_manifest(Schema(bbox="-93.70,41.86,-93.23,42.21"))
+    assert len(manifest.index) == 20
+    assert manifest["filename"].isna().all()
@@ -0,0 +1,35 @@
+"""Test the process-wide pool of workers."""
+
+from concurrent.futures import Future
+
+from depbackend import workers
+
+
+class FakePool:
+    """Runs the calls on submit, recording them."""
+
+    def __init__(self):
+        """Constructor."""
+        self.submitted = []
+
+    def submit(self, func, *args):
+        """Run it now."""
+        future = Future()
+        future.set_result(func(*args))
+        self.submitted.append(future)
+        return future
+
+
+def test_pool_map_window(monkeypatch):
+    """Test that only the window of calls is submitted ahead."""
+    pool = FakePool()
+    monkeypatch.setattr(workers, "get_pool", lambda: pool)
+    res = workers.pool_map(str, range(100), window=4)
+    assert next(res) == "0"
+    assert len(pool.submitted) == 4
+    assert next(res) == "1"
+    assert len(pool.submitted) == 5
+    res.close()
+    assert len(pool.submitted) == 5
+    res = workers.pool_map(str, range(10), window=4)
+    assert list(res) == [str(i) for i in range(10)]